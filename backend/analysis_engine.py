@@ -0,0 +1,180 @@
+"""
+Rule-based competence analysis (no LLM call)
+
+Port of the recommendation engine in simple_main.get_advanced_analysis. The
+wording lives in per-language tables that are resolved once at startup, so
+an analysis is a sort of five scores plus string formatting. /analyze uses
+it for mode=local and as the instant base of mode=hybrid, where the AI
+narrative is merged in when it arrives within the time budget.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+AREAS = ["strategy", "tech", "marketing", "logistics", "analytics"]
+
+# Upper bound of the average score for each level (same cut-offs as GPTAnalyzer)
+LEVELS = [
+    (2.6, {"tr": "Temel", "en": "Basic"}),
+    (4.0, {"tr": "Orta", "en": "Intermediate"}),
+    (float("inf"), {"tr": "İleri", "en": "Advanced"})
+]
+
+SECTOR_AVERAGE = 3.2
+
+TRAINING_RECOMMENDATIONS = {
+    "strategy": {
+        "tr": ["Dijital strateji geliştirme", "Pazar araştırması", "Rekabet analizi"],
+        "en": ["Digital strategy development", "Market research", "Competitive analysis"]
+    },
+    "tech": {
+        "tr": ["E-ticaret platform eğitimi", "API entegrasyonları", "Mobil uygulama geliştirme"],
+        "en": ["E-commerce platform training", "API integrations", "Mobile app development"]
+    },
+    "marketing": {
+        "tr": ["SEO optimizasyonu", "Sosyal medya pazarlama", "Google Ads eğitimi"],
+        "en": ["SEO optimization", "Social media marketing", "Google Ads training"]
+    },
+    "logistics": {
+        "tr": ["Depo yönetim sistemi", "Kargo entegrasyonları", "Stok optimizasyonu"],
+        "en": ["Warehouse management system", "Shipping integrations", "Inventory optimization"]
+    },
+    "analytics": {
+        "tr": ["Google Analytics kurulumu", "Veri analizi eğitimi", "KPI takibi"],
+        "en": ["Google Analytics setup", "Data analysis training", "KPI tracking"]
+    }
+}
+
+# {weak}/{strong} are area ids, {Weak}/{Strong} their title-cased form
+TEMPLATES = {
+    "tr": {
+        "performance_summary": "En güçlü alan: {Strong} ({strong_score}/5), En zayıf alan: {Weak} ({weak_score}/5)",
+        "major_gap": "{Weak} alanında {gap} puan eksiklik var",
+        "priority_focus": "Önce {weak} alanını güçlendirin",
+        "strengths": ["{Strong} alanında iyi performans", "Mevcut iş deneyimi"],
+        "weaknesses": ["{Weak} alanında gelişim gerekli", "Dijital dönüşüm eksiklikleri"],
+        "opportunities": ["Dijital pazarda büyüme potansiyeli", "E-ihracat destekleri", "Teknoloji çözümleri"],
+        "threats": ["Rekabet artışı", "Teknoloji değişimi hızı", "Müşteri beklentileri"],
+        "immediate": ["{Weak} alanı için acil eğitim planla", "Mevcut sistemi analiz et"],
+        "mid_term": ["Teknoloji yatırımları yap", "{strong} avantajını geliştir"],
+        "long_term": ["Tüm alanları entegre et", "Sürekli iyileştirme kur"],
+        "general_training": "E-ihracat genel eğitimi",
+        "above_average": "ortalama üstü",
+        "below_average": "ortalama altı",
+        "improvement_potential": "{potential:.0f}% iyileştirme potansiyeli"
+    },
+    "en": {
+        "performance_summary": "Strongest area: {Strong} ({strong_score}/5), Weakest area: {Weak} ({weak_score}/5)",
+        "major_gap": "{Weak} area has {gap} point gap",
+        "priority_focus": "Focus on strengthening {weak} first",
+        "strengths": ["Good performance in {strong}", "Existing business experience"],
+        "weaknesses": ["{Weak} needs development", "Digital transformation gaps"],
+        "opportunities": ["Digital market growth potential", "E-export incentives", "Technology solutions"],
+        "threats": ["Increasing competition", "Rapid technology change", "Customer expectations"],
+        "immediate": ["Plan urgent training for {weak}", "Analyze current systems"],
+        "mid_term": ["Make technology investments", "Develop {strong} advantage"],
+        "long_term": ["Integrate all areas", "Establish continuous improvement"],
+        "general_training": "General e-export training",
+        "above_average": "above average",
+        "below_average": "below average",
+        "improvement_potential": "{potential:.0f}% improvement potential"
+    }
+}
+
+# Sections an AI analysis contributes in hybrid mode; scores and levels stay local
+AI_NARRATIVE_FIELDS = ["gap_analysis", "swot_analysis", "action_plan", "training_recommendations"]
+
+
+class LocalAnalysisEngine:
+    """Table-driven analysis of the five area scores"""
+
+    def __init__(self, templates: Dict[str, Dict] = TEMPLATES,
+                 training: Dict[str, Dict[str, List[str]]] = TRAINING_RECOMMENDATIONS):
+        # Resolve everything that does not depend on the scores once
+        self._languages = {
+            language: (
+                table,
+                [(upper, names[language]) for upper, names in LEVELS],
+                {area: courses[language] + [table["general_training"]] for area, courses in training.items()}
+            )
+            for language, table in templates.items()
+        }
+
+    def _level(self, levels: List[Tuple[float, str]], avg_score: float) -> str:
+        for upper, name in levels:
+            if avg_score < upper:
+                return name
+        return levels[-1][1]
+
+    def analyze(self, scores: Dict[str, float], language: str = "tr") -> Dict[str, Any]:
+        """Same structure as the AI analysis, plus performance_summary and sector_benchmark"""
+        table, levels, training = self._languages.get(language) or self._languages["en"]
+
+        avg_score = sum(scores.values()) / len(scores)
+        sorted_scores = sorted(scores.items(), key=lambda item: item[1])
+        weak, weak_score = sorted_scores[0]
+        strong, strong_score = sorted_scores[-1]
+        fields = {
+            "weak": weak, "Weak": weak.title(), "weak_score": weak_score,
+            "strong": strong, "Strong": strong.title(), "strong_score": strong_score,
+            "gap": 5 - weak_score
+        }
+
+        def fill(key: str) -> List[str]:
+            return [text.format(**fields) for text in table[key]]
+
+        return {
+            "competence_level": self._level(levels, avg_score),
+            "competence_report": {
+                "overall_score": round(avg_score, 1),
+                "category_scores": scores,
+                "performance_summary": table["performance_summary"].format(**fields)
+            },
+            "gap_analysis": {
+                "major_gaps": [table["major_gap"].format(**fields)],
+                "improvement_areas": [area for area, _ in sorted_scores[:2]],
+                "priority_focus": table["priority_focus"].format(**fields),
+                "strength_areas": [area for area, _ in sorted_scores[-2:]]
+            },
+            "swot_analysis": {
+                "strengths": fill("strengths"),
+                "weaknesses": fill("weaknesses"),
+                "opportunities": list(table["opportunities"]),
+                "threats": list(table["threats"])
+            },
+            "action_plan": {
+                "immediate": fill("immediate"),
+                "mid_term": fill("mid_term"),
+                "long_term": list(table["long_term"])
+            },
+            "training_recommendations": list(training[weak]),
+            "sector_benchmark": {
+                "average_score": SECTOR_AVERAGE,
+                "your_position": table["above_average"] if avg_score > SECTOR_AVERAGE else table["below_average"],
+                "improvement_potential": table["improvement_potential"].format(potential=(5 - avg_score) * 20)
+            }
+        }
+
+
+def merge_ai_narrative(local: Dict[str, Any], ai: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Local analysis with the AI's narrative laid over it, field by field
+
+    Sections are merged key by key, so anything the AI leaves out or empty
+    (e.g. gap_analysis.strength_areas, which only the local engine fills)
+    keeps its local value. List sections are replaced when the AI filled them.
+    """
+    if not ai:
+        return local
+    merged = dict(local)
+    for field in AI_NARRATIVE_FIELDS:
+        section = ai.get(field)
+        if not section:
+            continue
+        if isinstance(local.get(field), dict):
+            if isinstance(section, dict):
+                merged[field] = {**local[field], **{key: value for key, value in section.items() if value}}
+        else:
+            merged[field] = section
+    return merged
+
+# Global instance
+analysis_engine = LocalAnalysisEngine()
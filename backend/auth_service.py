@@ -5,15 +5,14 @@ Handles user authentication, JWT tokens, and password management
 import os
 from datetime import datetime, timedelta
 from typing import Optional
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from db_models import User, UserRole, PlanType, SubscriptionStatus
+from password_hasher import password_hasher, pwd_context
+from principal_cache import principal_cache
+from last_login_buffer import LAST_LOGIN_UPDATE, last_login_buffer
 import uuid
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # JWT settings
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
@@ -33,6 +32,16 @@ class AuthService:
         """Verify a password against hash"""
         return pwd_context.verify(plain_password, hashed_password)
     
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        """hash_password on the bcrypt thread pool (raises PasswordHasherBusy when it is full)"""
+        return await password_hasher.hash(password)
+    
+    @staticmethod
+    async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+        """verify_password on the bcrypt thread pool (raises PasswordHasherBusy when it is full)"""
+        return await password_hasher.verify(plain_password, hashed_password)
+    
     @staticmethod
     def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
         """Create JWT access token"""
@@ -73,9 +82,10 @@ class AuthService:
         password: str,
         name: str,
         company_name: Optional[str] = None,
-        phone: Optional[str] = None
+        phone: Optional[str] = None,
+        password_hash: Optional[str] = None
     ) -> User:
-        """Create a new user"""
+        """Create a new user (pass password_hash if it was already computed off the event loop)"""
         
         # Check if user already exists
         existing_user = AuthService.get_user_by_email(db, email)
@@ -86,7 +96,7 @@ class AuthService:
         user = User(
             id=str(uuid.uuid4()),
             email=email,
-            password_hash=AuthService.hash_password(password),
+            password_hash=password_hash or AuthService.hash_password(password),
             name=name,
             company_name=company_name,
             phone=phone,
@@ -117,12 +127,50 @@ class AuthService:
         if not AuthService.verify_password(password, user.password_hash):
             return None
         
-        # Update last login
-        user.last_login = datetime.utcnow()
-        db.commit()
+        AuthService.record_login(db, user)
         
         return user
     
+    @staticmethod
+    async def authenticate_user_async(db: Session, email: str, password: str) -> Optional[User]:
+        """authenticate_user with the bcrypt check on the thread pool"""
+        user = AuthService.get_user_by_email(db, email)
+        
+        if not user:
+            return None
+        
+        password_hash = user.password_hash
+        # Keep the loaded row and end the read transaction so the pooled
+        # connection isn't held while bcrypt runs
+        db.expunge(user)
+        db.rollback()
+        
+        if not await AuthService.verify_password_async(password, password_hash):
+            return None
+        
+        AuthService.record_login(db, user)
+        
+        return user
+    
+    @staticmethod
+    def record_login(db: Session, user: User) -> None:
+        """
+        Set last_login on the returned user. The row is updated by the
+        write-behind buffer, or right away when LAST_LOGIN_FLUSH_SECONDS=0
+        """
+        seen_at = datetime.utcnow()
+        if user in db:
+            db.expunge(user)
+        user.last_login = seen_at
+        
+        if last_login_buffer.enabled:
+            last_login_buffer.record(user.id, seen_at)
+            return
+        
+        db.execute(LAST_LOGIN_UPDATE, {"user_id": user.id, "seen_at": seen_at})
+        db.commit()
+        principal_cache.invalidate(user.id)
+    
     @staticmethod
     def create_admin_user(
         db: Session,
@@ -140,6 +188,7 @@ class AuthService:
             existing_user.plan = PlanType.COMBINED
             existing_user.subscription_status = SubscriptionStatus.ACTIVE
             db.commit()
+            principal_cache.invalidate(existing_user.id)
             return existing_user
         
         # Create new admin user
@@ -190,6 +239,22 @@ class AuthService:
             user.role = UserRole.USER
         
         db.commit()
+        principal_cache.invalidate(user.id)
+        db.refresh(user)
+        
+        return user
+    
+    @staticmethod
+    def deactivate_user(db: Session, user_id: str) -> User:
+        """Deactivate a user account; its tokens stop working immediately"""
+        user = AuthService.get_user_by_id(db, user_id)
+        
+        if not user:
+            raise ValueError("User not found")
+        
+        user.is_active = False
+        db.commit()
+        principal_cache.invalidate(user.id)
         db.refresh(user)
         
         return user
@@ -0,0 +1,88 @@
+"""
+Check: /analyze cache sharing between nearby score vectors
+
+Two score vectors that round to the same ANALYSIS_SCORE_STEP bucket share
+one LLM analysis, both from the cache (one after the other) and through
+SingleFlight (at the same time). The stub LLM echoes the scores of the
+request that reached it, so the script can check that each caller still
+gets its own level, overall score and category scores and that only the
+narrative is shared.
+
+Usage:
+    cd backend
+    python benchmarks/bench_analysis_cache.py
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpt_engine import GPTAnalyzer
+from llm_cache import InsightsCache, LRUTTLCache
+
+# Same bucket at step 0.1; averages 2.56 (Temel) and 2.58 (Temel)
+FIRST = {"strategy": 2.56, "tech": 2.61, "marketing": 2.54, "logistics": 2.52, "analytics": 2.57}
+SECOND = {"strategy": 2.59, "tech": 2.64, "marketing": 2.55, "logistics": 2.53, "analytics": 2.59}
+
+
+class StubLLM:
+    """Answers like the real prompt asks: the scores it was sent plus a narrative"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+
+    async def chat(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        prompt = messages[-1]["content"]
+        scores = dict(re.findall(r'"(strategy|tech|marketing|logistics|analytics)": ([0-9.]+)', prompt))
+        content = json.dumps({
+            "competence_level": re.search(r'"competence_level": "([^"]+)"', prompt).group(1),
+            "competence_report": {
+                "overall_score": float(re.search(r'"overall_score": ([0-9.]+)', prompt).group(1)),
+                "category_scores": {name: float(value) for name, value in scores.items()}
+            },
+            "gap_analysis": {"major_gaps": ["Lojistik"], "improvement_areas": [], "priority_focus": "Lojistik"},
+            "training_recommendations": [f"narrative #{self.calls}"]
+        })
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def check(result, scores, label: str):
+    report = result["competence_report"]
+    assert report["category_scores"] == scores, f"{label}: got another vector's category scores"
+    assert report["overall_score"] == round(sum(scores.values()) / len(scores), 1), f"{label}: overall score"
+    assert result["competence_level"] == "Temel", f"{label}: level"
+
+
+async def main():
+    delay = 0.2
+    for scenario in ("cached", "coalesced"):
+        llm = StubLLM(delay)
+        analyzer = GPTAnalyzer(cache=InsightsCache(LRUTTLCache()), score_step=0.1, llm=llm)
+        started = time.perf_counter()
+        if scenario == "cached":
+            first = await analyzer.analyze_competence(FIRST)
+            second = await analyzer.analyze_competence(SECOND)
+        else:
+            first, second = await asyncio.gather(
+                analyzer.analyze_competence(FIRST), analyzer.analyze_competence(SECOND)
+            )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        check(first, FIRST, f"{scenario} first")
+        check(second, SECOND, f"{scenario} second")
+        assert llm.calls == 1, f"{scenario}: expected one shared LLM call, got {llm.calls}"
+        assert first["training_recommendations"] == second["training_recommendations"], "narrative not shared"
+        print(f"  {scenario:9}  {llm.calls} LLM call for 2 analyses in {elapsed_ms:.0f} ms, "
+              f"overall {first['competence_report']['overall_score']} / {second['competence_report']['overall_score']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
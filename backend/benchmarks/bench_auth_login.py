@@ -0,0 +1,126 @@
+"""
+Load test: login throughput and event-loop responsiveness
+
+Runs the API under uvicorn, creates one user and fires a burst of
+concurrent /auth/login requests while polling /health. Each scenario runs
+in its own process so PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE take
+effect:
+
+- one bcrypt worker, then one per core: logins/s should scale with the
+  number of cores while /health keeps answering in milliseconds
+- a queue limit smaller than the burst: the excess gets immediate 503s
+  instead of waiting
+
+Usage:
+    cd backend
+    python benchmarks/bench_auth_login.py [logins]
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = "bench-password"
+
+
+async def burst(api_url: str, logins: int):
+    import httpx
+    from bench_report_concurrency import percentile
+
+    health_ms = []
+    async with httpx.AsyncClient(base_url=api_url, timeout=120) as client:
+        async def login():
+            sent = time.perf_counter()
+            response = await client.post("/auth/login", json={"email": "bench@example.com", "password": PASSWORD})
+            return response.status_code, (time.perf_counter() - sent) * 1000
+
+        started = time.perf_counter()
+        pending = asyncio.gather(*(login() for _ in range(logins)))
+        while not pending.done():
+            sent = time.perf_counter()
+            (await client.get("/health")).raise_for_status()
+            health_ms.append((time.perf_counter() - sent) * 1000)
+            await asyncio.sleep(0.02)
+        results = await pending
+        elapsed = time.perf_counter() - started
+
+    ok = [ms for status, ms in results if status == 200]
+    busy = [ms for status, ms in results if status == 503]
+    assert len(ok) + len(busy) == logins, f"unexpected statuses: {[s for s, _ in results]}"
+    return {
+        "elapsed": elapsed,
+        "ok": len(ok),
+        "busy": len(busy),
+        "busy_p50_ms": statistics.median(busy) if busy else None,
+        "health_p50_ms": statistics.median(health_ms),
+        "health_p95_ms": percentile(health_ms, 95),
+        "health_checks": len(health_ms)
+    }
+
+
+def run_scenario(logins: int):
+    """Inner process: API with the PASSWORD_HASH_* settings from the environment"""
+    from bench_report_concurrency import configure_app, free_port, serve
+    llm_port, api_port = free_port(), free_port()
+    api = configure_app(llm_port)
+
+    import uuid
+    from database import SessionLocal
+    from db_models import User
+    from auth_service import auth_service
+    with SessionLocal() as db:
+        db.add(User(id=str(uuid.uuid4()), email="bench@example.com", name="Bench",
+                    password_hash=auth_service.hash_password(PASSWORD)))
+        db.commit()
+
+    serve(api.app, api_port)
+    result = asyncio.run(burst(f"http://127.0.0.1:{api_port}", logins))
+    print("RESULT " + json.dumps(result))
+
+
+def scenario(logins: int, workers: int, queue: int) -> dict:
+    env = {**os.environ, "PASSWORD_HASH_WORKERS": str(workers), "PASSWORD_HASH_QUEUE": str(queue)}
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--scenario", str(logins)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    line = next(line for line in output.splitlines() if line.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--scenario":
+        run_scenario(int(sys.argv[2]))
+        return
+
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    cores = os.cpu_count() or 1
+    print(f"{logins} concurrent logins, {cores} CPU cores")
+
+    throughput = {}
+    for workers in sorted({1, cores}):
+        r = scenario(logins, workers, queue=logins)
+        throughput[workers] = r["ok"] / r["elapsed"]
+        print(f"  {workers} bcrypt worker(s): {throughput[workers]:5.1f} logins/s, "
+              f"/health p50 {r['health_p50_ms']:.1f} ms, p95 {r['health_p95_ms']:.1f} ms "
+              f"({r['health_checks']} checks)")
+        assert r["ok"] == logins
+        assert r["health_p95_ms"] < 100, "health checks were blocked by bcrypt"
+
+    queue = max(1, logins // 4)
+    r = scenario(logins, cores, queue=queue)
+    print(f"  queue limit {queue}: {r['ok']} logged in, {r['busy']} got 503 "
+          f"(median {r['busy_p50_ms']:.1f} ms)" if r["busy"] else f"  queue limit {queue}: no 503s")
+    assert r["busy"] > 0, "queue limit did not reject the excess logins"
+
+    if cores > 1:
+        print(f"  scaling: {throughput[cores] / throughput[1]:.1f}x with {cores} workers")
+
+
+if __name__ == "__main__":
+    main()
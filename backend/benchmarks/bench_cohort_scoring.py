@@ -0,0 +1,130 @@
+"""
+Benchmark: re-scoring a cohort of assessments
+
+Scores every assessment with the per-assessment ReportService functions
+(_calculate_overall_score / _calculate_channel_scores /
+_calculate_category_scores) and with the vectorized score_assessments()
+batch API, asserts the results are identical (scores, levels, ordering and
+running totals) and reports the timings. "totals only" is the batch mode
+used by the admin rescore endpoint (details=False).
+
+Assessments answer a random subset of the questions in random order and
+include a few answers to questions missing from the catalog, which only
+count towards the overall score.
+
+Usage:
+    cd backend
+    python benchmarks/bench_cohort_scoring.py [assessments] [questions]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.pop("OPENAI_API_KEY", None)
+
+from report_service import ReportService
+
+CATEGORIES = ["strategy", "tech", "marketing", "logistics", "analytics"]
+CHANNEL_SETS = [["ecommerce", "combined"], ["eexport", "combined"], ["ecommerce", "eexport", "combined"]]
+
+
+def make_cohort(assessments: int, questions: int, seed: int = 42):
+    rng = random.Random(seed)
+    question_list = [
+        {
+            "id": f"q{i}",
+            "text": {"tr": f"Soru {i}", "en": f"Question {i}"},
+            "categoryId": CATEGORIES[i % len(CATEGORIES)],
+            "channels": CHANNEL_SETS[i % len(CHANNEL_SETS)],
+            "order": i
+        }
+        for i in range(questions)
+    ]
+
+    cohort = []
+    for a in range(assessments):
+        question_ids = rng.sample([q["id"] for q in question_list], rng.randint(0, questions))
+        question_ids += [f"retired-{a}-{k}" for k in range(rng.randint(0, 2))]
+        rng.shuffle(question_ids)
+        cohort.append({
+            "user_id": f"user-{a}",
+            "assessment_id": f"assessment-{a}",
+            "package_type": "combined",
+            "question_ids": question_ids,
+            "answers": [rng.randint(1, 5) for _ in question_ids]
+        })
+    return question_list, cohort
+
+
+def score_one_by_one(service: ReportService, cohort, questions):
+    results = []
+    for assessment in cohort:
+        responses = [
+            {"question_id": qid, "answer": answer}
+            for qid, answer in zip(assessment["question_ids"], assessment["answers"])
+        ]
+        results.append({
+            "overall_score": service._calculate_overall_score(responses),
+            "channel_scores": service._calculate_channel_scores(responses, questions, "combined"),
+            "category_scores": service._calculate_category_scores(responses, questions)
+        })
+    return results
+
+
+def replayed_totals(service: ReportService, cohort, questions):
+    question_map = {q["id"]: q for q in questions}
+    return [
+        service._score_responses(
+            [{"question_id": qid, "answer": answer}
+             for qid, answer in zip(a["question_ids"], a["answers"])],
+            question_map
+        )["totals"]
+        for a in cohort
+    ]
+
+
+def assert_identical(expected, totals, actual):
+    assert len(expected) == len(actual)
+    for one, replayed, batch in zip(expected, totals, actual):
+        assert one["overall_score"] == batch["overall_score"], (one, batch)
+        assert one["channel_scores"] == batch["channel_scores"], (one, batch)
+        assert list(one["category_scores"].items()) == list(batch["category_scores"].items())
+        assert replayed.to_dict() == batch["totals"].to_dict()
+        assert list(replayed.channels) == list(batch["totals"].channels)
+
+
+def main():
+    assessments = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    questions = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    service = ReportService()
+    question_list, cohort = make_cohort(assessments, questions)
+
+    started = time.perf_counter()
+    expected = score_one_by_one(service, cohort, question_list)
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = service.score_assessments(cohort, question_list)
+    batch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    service.score_assessments(cohort, question_list, details=False)
+    totals_seconds = time.perf_counter() - started
+
+    assert_identical(expected, replayed_totals(service, cohort, question_list), actual)
+
+    print(f"{assessments} assessments x {questions} questions "
+          f"({sum(len(a['answers']) for a in cohort)} answers)")
+    print(f"  per-assessment functions: {loop_seconds * 1000:9.1f} ms")
+    print(f"  vectorized batch:         {batch_seconds * 1000:9.1f} ms  "
+          f"({loop_seconds / batch_seconds:.1f}x)")
+    print(f"  vectorized, totals only:  {totals_seconds * 1000:9.1f} ms  "
+          f"({loop_seconds / totals_seconds:.1f}x)")
+    print("  results identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Load test: login latency with and without the last_login write-behind buffer
+
+Runs the API under uvicorn on a SQLite file and fires a storm of
+concurrent /auth/login requests spread over a few hundred users. Password
+hashes use bcrypt's minimum cost so the database write, not bcrypt, is what
+the requests compete for. Each scenario runs in its own process so
+LAST_LOGIN_FLUSH_SECONDS takes effect:
+
+- 0: every login UPDATEs and commits users.last_login inline
+- 1: logins are buffered and written in one bulk UPDATE per second
+
+After the storm the server is shut down and the script checks that every
+user's last_login reached the database (the shutdown flush).
+
+Usage:
+    cd backend
+    python benchmarks/bench_last_login.py [logins] [concurrency] [users]
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = "bench-password"
+
+
+async def storm(api_url: str, logins: int, concurrency: int, users: int):
+    import httpx
+
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(logins):
+        queue.put_nowait(i % users)
+
+    async with httpx.AsyncClient(base_url=api_url, timeout=120) as client:
+        async def worker():
+            while not queue.empty():
+                n = queue.get_nowait()
+                sent = time.perf_counter()
+                response = await client.post("/auth/login", json={"email": f"user-{n}@example.com",
+                                                                  "password": PASSWORD})
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - sent) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, elapsed
+
+
+def run_scenario(logins: int, concurrency: int, users: int):
+    """Inner process: API with LAST_LOGIN_FLUSH_SECONDS from the environment"""
+    from bench_report_concurrency import configure_app, free_port, percentile, serve
+    api_port = free_port()
+    api = configure_app(free_port())
+
+    import uuid
+    from passlib.hash import bcrypt
+    from database import SessionLocal
+    from db_models import User
+    password_hash = bcrypt.using(rounds=4).hash(PASSWORD)
+    with SessionLocal() as db:
+        db.add_all(User(id=str(uuid.uuid4()), email=f"user-{n}@example.com", name=f"User {n}",
+                        password_hash=password_hash) for n in range(users))
+        db.commit()
+
+    server = serve(api.app, api_port)
+    latencies, elapsed = asyncio.run(storm(f"http://127.0.0.1:{api_port}", logins, concurrency, users))
+    stats = api.last_login_buffer.stats()
+
+    # Shutting down flushes whatever is still buffered
+    server.should_exit = True
+    deadline = time.monotonic() + 30
+    while True:
+        with SessionLocal() as db:
+            stored = db.query(User).filter(User.last_login.isnot(None)).count()
+        if stored == users or time.monotonic() > deadline:
+            break
+        time.sleep(0.1)
+
+    print("RESULT " + json.dumps({
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "logins_per_s": len(latencies) / elapsed,
+        "stored": stored,
+        "flushes": stats["flushes"]
+    }))
+
+
+def scenario(logins: int, concurrency: int, users: int, flush_seconds: float) -> dict:
+    # Queue limit above the concurrency so no login is turned away with 503
+    env = {**os.environ, "LAST_LOGIN_FLUSH_SECONDS": str(flush_seconds), "PASSWORD_HASH_QUEUE": str(concurrency * 2)}
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--scenario", str(logins), str(concurrency), str(users)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    line = next(line for line in output.splitlines() if line.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def main():
+    if len(sys.argv) > 4 and sys.argv[1] == "--scenario":
+        run_scenario(int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))
+        return
+
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    users = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    print(f"{logins} logins, concurrency {concurrency}, {users} users")
+
+    results = {}
+    for label, flush_seconds in (("inline", 0), ("buffered", 1)):
+        r = scenario(logins, concurrency, users, flush_seconds)
+        results[label] = r
+        print(f"  {label:8}  p50 {r['p50_ms']:6.1f} ms  p95 {r['p95_ms']:6.1f} ms  p99 {r['p99_ms']:6.1f} ms  "
+              f"{r['logins_per_s']:6.1f} logins/s  ({r['stored']}/{users} last_login stored, "
+              f"{r['flushes']} flushes)")
+        assert r["stored"] == users, "last_login updates were lost"
+
+    inline, buffered = results["inline"]["p95_ms"], results["buffered"]["p95_ms"]
+    print(f"  p95 {inline:.1f} ms -> {buffered:.1f} ms ({inline / buffered:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: tail latency of LLM calls with and without hedging
+
+Starts a local stub of the chat completions API whose latency is heavy
+tailed: most completions take ~100 ms (log-normal), a small share
+(`tail_share`) takes 1-4 s (Pareto). The same stream of insights calls is
+sent through an LLMGateway with hedging off and on (hedge at the p95
+latency, at most 5% of calls) and the latency percentiles are compared.
+
+Usage:
+    cd backend
+    python benchmarks/bench_llm_hedging.py [calls] [concurrency] [tail_share]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from bench_report_concurrency import INSIGHTS, free_port, percentile, serve
+from llm_gateway import LLMGateway
+
+
+def make_heavy_tailed_llm(tail_share: float, seed: int = 7) -> FastAPI:
+    """Chat completions stub with log-normal latency plus a Pareto tail"""
+    stub = FastAPI()
+    rng = random.Random(seed)
+    stub.state.calls = 0
+
+    @stub.post("/v1/chat/completions")
+    async def chat_completions():
+        stub.state.calls += 1
+        if rng.random() < tail_share:
+            delay = min(4.0, rng.paretovariate(1.5))
+        else:
+            delay = rng.lognormvariate(-2.3, 0.25)  # median ~100 ms
+        await asyncio.sleep(delay)
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": INSIGHTS},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }
+
+    return stub
+
+
+async def run(gateway: LLMGateway, calls: int, concurrency: int):
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(calls):
+        queue.put_nowait(i)
+
+    async def client():
+        while not queue.empty():
+            i = queue.get_nowait()
+            sent = time.perf_counter()
+            response = await gateway.chat(
+                hedge="insights",
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": f"context {i}"}],
+                timeout=10
+            )
+            assert response.choices[0].message.content == INSIGHTS
+            latencies.append((time.perf_counter() - sent) * 1000)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    tail_share = float(sys.argv[3]) if len(sys.argv) > 3 else 0.02
+
+    print(f"{calls} insights calls, concurrency {concurrency}, {tail_share:.0%} slow completions")
+    results = {}
+    for hedging in (False, True):
+        port = free_port()
+        stub = make_heavy_tailed_llm(tail_share)
+        server = serve(stub, port)
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+        gateway = LLMGateway(api_key="sk-bench", max_concurrency=concurrency * 2, hedging=hedging)
+
+        latencies = asyncio.run(run(gateway, calls, concurrency))
+        results[hedging] = latencies
+        server.should_exit = True
+
+        label = "hedged" if hedging else "plain "
+        print(f"  {label}  p50 {percentile(latencies, 50):7.1f} ms  p95 {percentile(latencies, 95):7.1f} ms  "
+              f"p99 {percentile(latencies, 99):7.1f} ms  max {max(latencies):7.1f} ms  "
+              f"({stub.state.calls} LLM requests, {gateway.hedges} hedges, {gateway.hedge_wins} won)")
+
+    plain, hedged = results[False], results[True]
+    print(f"  p99 {percentile(plain, 99):.0f} ms -> {percentile(hedged, 99):.0f} ms "
+          f"({percentile(plain, 99) / percentile(hedged, 99):.1f}x)")
+
+    assert percentile(hedged, 99) < percentile(plain, 99), "hedging did not improve p99"
+
+
+if __name__ == "__main__":
+    main()
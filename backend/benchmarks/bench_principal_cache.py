@@ -0,0 +1,121 @@
+"""
+Query count per authenticated endpoint, with and without the principal cache
+
+Runs the API under uvicorn, creates an admin and a regular user and calls
+each authenticated endpoint `repeat` times with a bearer token. Every SQL
+statement the engine sends is counted (SQLAlchemy before_cursor_execute),
+so the table shows how many queries each request needs for
+get_current_user and how many for its real work. Afterwards it checks that
+a plan upgrade and a deactivation are visible on the very next request.
+
+Usage:
+    cd backend
+    python benchmarks/bench_principal_cache.py [repeat]
+"""
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy import event
+from bench_report_concurrency import configure_app, free_port, make_questions, serve
+
+ENDPOINTS = [
+    ("user", "GET", "/auth/me"),
+    ("user", "GET", "/responses/{user_id}"),
+    ("user", "GET", "/responses/{user_id}/assessment-0"),
+    ("user", "GET", "/responses/{user_id}/assessment-0/progress"),
+    ("admin", "GET", "/admin/questions"),
+]
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.total = 0
+        self.users = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.total += 1
+        if "FROM users" in statement:
+            self.users += 1
+
+    def snapshot(self):
+        return self.total, self.users
+
+
+def measure(client, counter, tokens, user_ids, repeat: int):
+    """Average (all queries, users queries) per request for each endpoint"""
+    result = {}
+    for who, method, path in ENDPOINTS:
+        url = path.format(user_id=user_ids[who])
+        headers = {"Authorization": f"Bearer {tokens[who]}"}
+        total, users = counter.snapshot()
+        for _ in range(repeat):
+            client.request(method, url, headers=headers).raise_for_status()
+        after_total, after_users = counter.snapshot()
+        result[f"{method} {path}"] = ((after_total - total) / repeat, (after_users - users) / repeat)
+    return result
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    api_port = free_port()
+    api = configure_app(free_port())
+
+    from database import SessionLocal, engine
+    from db_models import PlanType, User, UserRole
+    from auth_service import auth_service
+    from principal_cache import principal_cache
+    from database_service import db_service
+
+    user_ids = {"user": str(uuid.uuid4()), "admin": str(uuid.uuid4())}
+    with SessionLocal() as db:
+        for who, user_id in user_ids.items():
+            db.add(User(id=user_id, email=f"{who}@example.com", name=who.title(), password_hash="x",
+                        role=UserRole.ADMIN if who == "admin" else UserRole.FREE_TRIAL))
+        db.commit()
+    db_service.save_responses_batch(
+        user_ids["user"], "user@example.com", "assessment-0",
+        [{"question_id": q["id"], "answer": n % 5 + 1} for n, q in enumerate(make_questions())],
+        "combined"
+    )
+    tokens = {who: auth_service.create_access_token(data={"sub": user_id}) for who, user_id in user_ids.items()}
+
+    counter = QueryCounter(engine)
+    serve(api.app, api_port)
+
+    with httpx.Client(base_url=f"http://127.0.0.1:{api_port}", timeout=30) as client:
+        principal_cache.enabled = False
+        uncached = measure(client, counter, tokens, user_ids, repeat)
+        principal_cache.enabled = True
+        cached = measure(client, counter, tokens, user_ids, repeat)
+
+        print(f"SQL statements per request ({repeat} requests each), users-table lookups in brackets")
+        print(f"  {'endpoint':48} {'no cache':>14} {'cache':>14}")
+        for name in uncached:
+            (total_off, users_off), (total_on, users_on) = uncached[name], cached[name]
+            print(f"  {name:48} {total_off:6.2f} [{users_off:4.2f}] {total_on:6.2f} [{users_on:4.2f}]")
+        stats = principal_cache.stats()
+        print(f"  principal cache: {stats['hits']} hits, {stats['misses']} misses")
+
+        # Changes made through auth_service show up on the next request
+        me = {"Authorization": f"Bearer {tokens['user']}"}
+        with SessionLocal() as db:
+            auth_service.update_user_plan(db, user_ids["user"], PlanType.COMBINED,
+                                          subscription_start=None, subscription_end=None)
+        assert client.get("/auth/me", headers=me).json()["user"]["plan"] == PlanType.COMBINED.value, \
+            "plan upgrade not visible"
+        with SessionLocal() as db:
+            auth_service.deactivate_user(db, user_ids["user"])
+        assert client.get("/auth/me", headers=me).status_code == 403, "deactivated user still accepted"
+        print("  plan upgrade and deactivation visible on the next request")
+
+    for name in cached:
+        assert cached[name][1] < 0.1, f"{name} still looks the user up on every request"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: package filtering in Python vs the indexed question_channels table
+
+Fills a throwaway SQLite database with `questions` rows (channels only in
+the JSON column, as before migration 0003), times the 0003 backfill, then
+compares the two ways of answering "active questions of package X":
+
+- python: load every active question and test `package in q.channels`
+  (what /admin/questions used to do)
+- sql: join question_channels on the (channel, question_id) index
+
+Packages range from broad (half the questions) to rare (about 1%).
+
+Usage:
+    cd backend
+    python benchmarks/bench_question_channels.py [questions] [repeat]
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+workdir = tempfile.mkdtemp(prefix="bench-channels-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+from sqlalchemy import text
+import db_models  # noqa: F401  (registers the tables)
+from database import SessionLocal, engine, init_db
+from db_models import Question, QuestionChannel
+from migrations import _question_channels
+
+PACKAGES = ["combined", "ecommerce", "eexport", "free_trial"]
+
+
+def make_channels(rng: random.Random):
+    channels = [rng.choice(["ecommerce", "eexport"]), "combined"] if rng.random() < 0.5 else ["combined"]
+    if rng.random() < 0.01:
+        channels.append("free_trial")
+    return channels
+
+
+def seed(count: int):
+    rng = random.Random(42)
+    rows = [{
+        "id": f"q{i}",
+        "text_tr": f"Soru {i}",
+        "text_en": f"Question {i}",
+        "category": ["strategy", "tech", "marketing", "logistics", "analytics"][i % 5],
+        "channels": json.dumps(make_channels(rng)),
+        "order": i,
+        "is_active": rng.random() < 0.95
+    } for i in range(count)]
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO questions (id, question_text_tr, question_text_en, category, channels, "
+            "is_free_trial_question, \"order\", is_active) "
+            "VALUES (:id, :text_tr, :text_en, :category, :channels, 0, :order, :is_active)"
+        ), rows)
+
+
+def python_filter(package: str):
+    with SessionLocal() as db:
+        questions = db.query(Question).filter(Question.is_active == True).order_by(Question.order).all()
+        return [q.id for q in questions if package in (q.channels or [])]
+
+
+def sql_filter(package: str):
+    with SessionLocal() as db:
+        questions = db.query(Question).filter(Question.is_active == True).join(QuestionChannel).filter(
+            QuestionChannel.channel == package
+        ).order_by(Question.order).all()
+        return [q.id for q in questions]
+
+
+def timed(fn, package: str, repeat: int):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(package)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    init_db()
+    seed(count)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        _question_channels(conn)
+    with engine.connect() as conn:
+        links = conn.execute(text("SELECT COUNT(*) FROM question_channels")).scalar()
+    print(f"{count} questions; 0003 backfill wrote {links} question_channels rows "
+          f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    print(f"  {'package':12} {'matches':>8} {'python':>11} {'sql':>11}")
+    for package in PACKAGES:
+        python_ms, expected = timed(python_filter, package, repeat)
+        sql_ms, actual = timed(sql_filter, package, repeat)
+        assert actual == expected, f"{package}: SQL filter returned different questions"
+        print(f"  {package:12} {len(actual):8d} {python_ms:8.1f} ms {sql_ms:8.1f} ms  ({python_ms / sql_ms:.1f}x)")
+
+        if package == "free_trial":
+            assert sql_ms < python_ms, "indexed filter was not faster for a rare package"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Concurrency check: health checks while reports wait on the LLM
+
+Starts a local stub of the OpenAI chat completions API that answers after a
+fixed delay, runs the real API app with uvicorn pointed at it, fires 50
+/report/generate requests at once and polls /health until they finish.
+
+With non-blocking LLM calls the health checks keep answering in
+milliseconds and the 50 reports finish in roughly one LLM delay; a blocking
+client would serialize them and stall /health for the whole run. The LLM
+gateway's concurrency limit is raised to the number of reports so it does
+not queue them.
+
+Usage:
+    cd backend
+    python benchmarks/bench_report_concurrency.py [reports] [llm_delay_seconds]
+"""
+import asyncio
+import json
+import os
+import re
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+QUESTIONS = 40
+CATEGORIES = ["strategy", "tech", "marketing", "logistics", "analytics"]
+
+INSIGHTS = """GÜÇLÜ YÖNLER:
+- Güçlü strateji
+
+ZAYIF YÖNLER:
+- Lojistik
+
+ÖNERİLER:
+- Lojistiğe yatırım yapın
+
+AKSİYON PLANI:
+Kısa Vadeli (0-3 ay):
+- Süreçleri gözden geçirin"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_stub_llm(delay: float) -> FastAPI:
+    """
+    Minimal OpenAI chat-completions endpoint that answers after `delay` seconds
+
+    Streamed requests get the same text word by word, spread over the delay.
+    """
+    stub = FastAPI()
+    stub.state.calls = 0
+
+    @stub.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        stub.state.calls += 1
+        body = await request.json()
+        if body.get("stream"):
+            return StreamingResponse(stream_completion(delay), media_type="text/event-stream")
+
+        await asyncio.sleep(delay)
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": INSIGHTS},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }
+
+    return stub
+
+
+async def stream_completion(delay: float):
+    tokens = re.findall(r"\S+\s*", INSIGHTS)
+    for token in tokens:
+        await asyncio.sleep(delay / len(tokens))
+        chunk = {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def make_questions(count: int = QUESTIONS):
+    return [
+        {
+            "id": f"q{i}",
+            "text": {"tr": f"Soru {i}", "en": f"Question {i}"},
+            "categoryId": CATEGORIES[i % len(CATEGORIES)],
+            "channels": ["ecommerce", "combined"] if i % 2 else ["eexport", "combined"],
+            "order": i
+        }
+        for i in range(count)
+    ]
+
+
+def configure_app(llm_port: int):
+    """Point the API at the stub LLM and a throwaway SQLite file; returns the main module"""
+    workdir = tempfile.mkdtemp(prefix="bench-report-")
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "RESPONSE_STORE": "memory"
+    })
+    os.environ.pop("RESPONSE_WAL_DIR", None)
+    os.environ.pop("INSIGHTS_CACHE_DIR", None)
+
+    import main as api
+    from database import init_db
+    # Tables must exist before responses are seeded (the catalog reads them)
+    init_db()
+    return api
+
+
+async def run(api_url: str, questions, reports: int):
+    health_ms = []
+    async with httpx.AsyncClient(base_url=api_url, timeout=60) as client:
+        async def report(i: int):
+            response = await client.post("/report/generate", json={
+                "user_id": f"user-{i}",
+                "assessment_id": f"assessment-{i}",
+                "language": "tr",
+                "questions": questions
+            })
+            response.raise_for_status()
+            return response.json()["report"]
+
+        started = time.perf_counter()
+        pending = asyncio.gather(*(report(i) for i in range(reports)))
+        while not pending.done():
+            sent = time.perf_counter()
+            (await client.get("/health")).raise_for_status()
+            health_ms.append((time.perf_counter() - sent) * 1000)
+            await asyncio.sleep(0.02)
+        results = await pending
+        elapsed = time.perf_counter() - started
+
+    assert all(r["strengths"] == ["Güçlü strateji"] for r in results), "reports did not use the stub LLM"
+    return elapsed, health_ms
+
+
+def main():
+    reports = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    llm_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+    llm_port, api_port = free_port(), free_port()
+    # Let every report reach the stub at once (the gateway's default limit is lower)
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", str(reports))
+    api = configure_app(llm_port)
+    from database_service import db_service
+
+    questions = make_questions()
+    # Different answers per assessment
+    for i in range(reports):
+        db_service.save_responses_batch(
+            f"user-{i}", f"user-{i}@example.com", f"assessment-{i}",
+            [{"question_id": q["id"], "answer": (n * (i + 1)) % 5 + 1} for n, q in enumerate(questions)],
+            "combined"
+        )
+
+    serve(make_stub_llm(llm_delay), llm_port)
+    serve(api.app, api_port)
+
+    elapsed, health_ms = asyncio.run(run(f"http://127.0.0.1:{api_port}", questions, reports))
+
+    print(f"{reports} reports in flight, stub LLM delay {llm_delay:.1f}s")
+    print(f"  all reports done in {elapsed:.2f}s (serialized would be {reports * llm_delay:.0f}s)")
+    print(f"  /health during the run: {len(health_ms)} checks, "
+          f"p50 {statistics.median(health_ms):.1f} ms, p95 {percentile(health_ms, 95):.1f} ms, "
+          f"max {max(health_ms):.1f} ms")
+
+    assert elapsed < llm_delay * 3, "reports were serialized behind the LLM calls"
+    assert percentile(health_ms, 95) < 100, "health checks were blocked by report generation"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Instant reports: time to a complete report while the LLM is slow
+
+Runs the API under uvicorn against a stub LLM (see bench_report_concurrency)
+that takes `llm_delay` seconds per completion. For each assessment it
+requests /report/generate?instant=1, which must answer with a complete
+(fallback-insights, ai_pending) report right away, then polls
+GET /report/{user_id}/{assessment_id} until the AI version is stored.
+
+Usage:
+    cd backend
+    python benchmarks/bench_report_instant.py [reports] [llm_delay_seconds]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from bench_report_concurrency import (
+    configure_app, free_port, make_questions, make_stub_llm, percentile, serve
+)
+
+
+def main():
+    reports = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    llm_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    llm_port, api_port = free_port(), free_port()
+    api = configure_app(llm_port)
+    from database_service import db_service
+
+    questions = make_questions()
+    for i in range(reports):
+        db_service.save_responses_batch(
+            f"user-{i}", f"user-{i}@example.com", f"assessment-{i}",
+            [{"question_id": q["id"], "answer": (n * (i + 1)) % 5 + 1} for n, q in enumerate(questions)],
+            "combined"
+        )
+
+    stub = make_stub_llm(llm_delay)
+    serve(stub, llm_port)
+    serve(api.app, api_port)
+
+    instant_ms = []
+    started = time.perf_counter()
+    with httpx.Client(base_url=f"http://127.0.0.1:{api_port}", timeout=60) as client:
+        for i in range(reports):
+            sent = time.perf_counter()
+            response = client.post("/report/generate?instant=1", json={
+                "user_id": f"user-{i}",
+                "assessment_id": f"assessment-{i}",
+                "language": "tr",
+                "questions": questions
+            })
+            response.raise_for_status()
+            instant_ms.append((time.perf_counter() - sent) * 1000)
+            body = response.json()
+            assert body["ai_pending"] and body["report"]["ai_pending"], "expected a pending fallback report"
+            assert body["report"]["question_analyses"] and body["report"]["strengths"]
+
+        pending = set(range(reports))
+        while pending:
+            time.sleep(0.1)
+            for i in list(pending):
+                stored = client.get(f"/report/user-{i}/assessment-{i}").json()
+                if not stored["ai_pending"]:
+                    assert stored["report"]["strengths"] == ["Güçlü strateji"], "upgrade did not use the stub LLM"
+                    pending.discard(i)
+        upgraded = time.perf_counter() - started
+
+        # The follow-up request returns the stored AI report
+        again = client.post("/report/generate?instant=1", json={
+            "user_id": "user-0", "assessment_id": "assessment-0", "language": "tr", "questions": questions
+        }).json()
+        assert again["cached"] and not again["ai_pending"]
+
+    print(f"{reports} instant reports, stub LLM delay {llm_delay:.1f}s")
+    print(f"  complete report returned: p50 {statistics.median(instant_ms):.1f} ms, "
+          f"p95 {percentile(instant_ms, 95):.1f} ms, max {max(instant_ms):.1f} ms")
+    print(f"  all AI upgrades stored after {upgraded:.2f}s ({stub.state.calls} LLM calls)")
+
+    assert percentile(instant_ms, 95) < 100, "instant reports waited on the LLM"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Microbenchmark: report scoring for a 500-question assessment
+
+Compares the previous multi-pass scoring (question_map rebuilt by each
+calculator, then separate loops for overall, channel, category, question
+analyses and low-score context) with ReportService's single fused pass.
+Both produce the same scores; the benchmark asserts that first.
+
+Usage:
+    cd backend
+    python benchmarks/bench_report_scoring.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_service import ReportService
+
+QUESTIONS = 500
+CATEGORIES = ["strategy", "tech", "marketing", "logistics", "analytics"]
+CHANNEL_SETS = [["ecommerce", "combined"], ["eexport", "combined"], ["ecommerce", "eexport", "combined"]]
+
+
+def make_assessment():
+    questions = [
+        {
+            "id": f"q{i}",
+            "text": {"tr": f"Soru {i}", "en": f"Question {i}"},
+            "categoryId": CATEGORIES[i % len(CATEGORIES)],
+            "channels": CHANNEL_SETS[i % len(CHANNEL_SETS)],
+            "order": i
+        }
+        for i in range(QUESTIONS)
+    ]
+    responses = [{"question_id": f"q{i}", "answer": (i * 7) % 5 + 1} for i in range(QUESTIONS)]
+    return questions, responses
+
+
+def legacy_scoring(service: ReportService, responses, questions):
+    """The pre-fusion pipeline: one map per calculator and one loop per output"""
+    question_map = {q["id"]: q for q in questions}
+
+    # _calculate_channel_scores
+    channel_map = {q["id"]: q for q in questions}
+    channel_totals = {}
+    for resp in responses:
+        question = channel_map.get(resp["question_id"])
+        if not question:
+            continue
+        for channel in question.get("channels", ["general"]):
+            data = channel_totals.setdefault(channel, {"score": 0, "count": 0})
+            data["score"] += resp["answer"]
+            data["count"] += 1
+    channel_scores = [
+        service._make_channel_score(channel, data["score"], data["count"])
+        for channel, data in channel_totals.items()
+    ]
+
+    # _calculate_category_scores
+    category_map = {q["id"]: q for q in questions}
+    category_sums, category_counts = {}, {}
+    for resp in responses:
+        question = category_map.get(resp["question_id"])
+        if not question:
+            continue
+        category = question.get("categoryId", question.get("category", "general"))
+        category_sums[category] = category_sums.get(category, 0) + resp["answer"]
+        category_counts[category] = category_counts.get(category, 0) + 1
+    category_scores = {}
+    for category, score in category_sums.items():
+        max_score = category_counts[category] * 5
+        category_scores[service.category_names.get(category, category.title())] = (
+            round((score / max_score) * 100, 2) if max_score > 0 else 0
+        )
+
+    # _calculate_overall_score
+    overall = round((sum(r["answer"] for r in responses) / (len(responses) * 5)) * 100, 2)
+
+    # _generate_question_analyses and _prepare_insights_context each resolve again
+    resolved = [(r, question_map[r["question_id"]]) for r in responses if question_map.get(r["question_id"])]
+    low_scores = [
+        (question_map[r["question_id"]], r["answer"])
+        for r in responses
+        if r["answer"] <= 2 and question_map.get(r["question_id"])
+    ]
+    return overall, channel_scores, category_scores, resolved, low_scores
+
+
+def fused_scoring(service: ReportService, responses, questions):
+    """Current pipeline: one map, one pass"""
+    question_map = {q["id"]: q for q in questions}
+    scoring = service._score_responses(responses, question_map)
+    totals = scoring["totals"]
+    return (
+        service._overall_score_from_totals(totals),
+        service.channel_scores_from_totals(totals),
+        service.category_scores_from_totals(totals),
+        scoring["resolved"],
+        scoring["low_scores"]
+    )
+
+
+if __name__ == "__main__":
+    service = ReportService()
+    questions, responses = make_assessment()
+
+    assert legacy_scoring(service, responses, questions) == fused_scoring(service, responses, questions)
+
+    runs = 200
+    legacy = min(timeit.repeat(lambda: legacy_scoring(service, responses, questions), number=runs, repeat=5)) / runs
+    fused = min(timeit.repeat(lambda: fused_scoring(service, responses, questions), number=runs, repeat=5)) / runs
+    print(f"{QUESTIONS}-question assessment")
+    print(f"  multi-pass: {legacy * 1e6:8.1f} µs")
+    print(f"  fused:      {fused * 1e6:8.1f} µs")
+    print(f"  speedup:    {legacy / fused:8.2f}x")
@@ -0,0 +1,79 @@
+"""
+Latency: stored report vs full regeneration
+
+Runs the API under uvicorn against a stub LLM (see bench_report_concurrency)
+and times /report/generate for one 200-question assessment in three ways:
+
+- stored:      unchanged answers, the stored report is returned as is
+- regenerate:  force=true, strategic insights served from the insights cache
+- regenerate + LLM: force=true with the insights cache cleared first
+
+Usage:
+    cd backend
+    python benchmarks/bench_report_store.py [rounds] [llm_delay_seconds]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from bench_report_concurrency import (
+    configure_app, free_port, make_questions, make_stub_llm, percentile, serve
+)
+
+QUESTIONS = 200
+
+
+def timed(client: httpx.Client, body: dict, before=None):
+    samples = []
+    for _ in range(body.pop("rounds")):
+        if before:
+            before()
+        sent = time.perf_counter()
+        response = client.post("/report/generate", json=body)
+        samples.append((time.perf_counter() - sent) * 1000)
+        response.raise_for_status()
+        last = response.json()
+    return samples, last
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    llm_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    llm_port, api_port = free_port(), free_port()
+    api = configure_app(llm_port)
+    from database_service import db_service
+    from llm_cache import insights_cache
+
+    questions = make_questions(QUESTIONS)
+    db_service.save_responses_batch(
+        "user-1", "user-1@example.com", "assessment-1",
+        [{"question_id": q["id"], "answer": n % 5 + 1} for n, q in enumerate(questions)],
+        "combined"
+    )
+
+    stub = make_stub_llm(llm_delay)
+    serve(stub, llm_port)
+    serve(api.app, api_port)
+
+    body = {"user_id": "user-1", "assessment_id": "assessment-1", "language": "tr",
+            "questions": questions}
+    with httpx.Client(base_url=f"http://127.0.0.1:{api_port}", timeout=60) as client:
+        llm, last = timed(client, {**body, "force": True, "rounds": rounds}, insights_cache.clear)
+        assert last["cached"] is False and stub.state.calls == rounds
+        regenerated, last = timed(client, {**body, "force": True, "rounds": rounds})
+        assert last["cached"] is False and stub.state.calls == rounds
+        stored, last = timed(client, {**body, "rounds": rounds})
+        assert last["cached"] is True and stub.state.calls == rounds
+
+    print(f"/report/generate, {QUESTIONS} answers, {rounds} rounds, stub LLM delay {llm_delay:.1f}s")
+    for name, samples in (("regenerate + LLM", llm), ("regenerate", regenerated), ("stored", stored)):
+        print(f"  {name:17s} p50 {statistics.median(samples):8.1f} ms   "
+              f"p95 {percentile(samples, 95):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
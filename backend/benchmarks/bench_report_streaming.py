@@ -0,0 +1,94 @@
+"""
+Time to first byte: /report/generate vs /report/generate/stream
+
+Runs the API under uvicorn against a stub LLM (see bench_report_concurrency)
+whose completion takes `llm_delay` seconds, streamed word by word when asked.
+Each round clears the insights cache and forces regeneration, then records
+when the first byte, the scores and the complete report arrive.
+
+Usage:
+    cd backend
+    python benchmarks/bench_report_streaming.py [rounds] [llm_delay_seconds]
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from bench_report_concurrency import (
+    configure_app, free_port, make_questions, make_stub_llm, serve
+)
+
+
+def blocking_round(client: httpx.Client, body: dict) -> dict:
+    sent = time.perf_counter()
+    with client.stream("POST", "/report/generate", json=body) as response:
+        response.raise_for_status()
+        chunks = response.iter_bytes()
+        first = next(chunks)
+        first_byte = time.perf_counter()
+        report = json.loads(first + b"".join(chunks))["report"]
+    done = time.perf_counter()
+    assert report["strengths"], "report has no insights"
+    return {"first byte": first_byte - sent, "scores": done - sent, "full report": done - sent}
+
+
+def streaming_round(client: httpx.Client, body: dict) -> dict:
+    marks = {}
+    sent = time.perf_counter()
+    event = None
+    with client.stream("POST", "/report/generate/stream", json=body) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            marks.setdefault("first byte", time.perf_counter() - sent)
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event == "scores":
+                marks["scores"] = time.perf_counter() - sent
+            elif line.startswith("data: ") and event == "report":
+                marks["full report"] = time.perf_counter() - sent
+                assert json.loads(line[len("data: "):])["report"]["strengths"]
+    return marks
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    llm_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    llm_port, api_port = free_port(), free_port()
+    api = configure_app(llm_port)
+    from database_service import db_service
+    from llm_cache import insights_cache
+
+    questions = make_questions()
+    db_service.save_responses_batch(
+        "user-1", "user-1@example.com", "assessment-1",
+        [{"question_id": q["id"], "answer": n % 5 + 1} for n, q in enumerate(questions)],
+        "combined"
+    )
+    serve(make_stub_llm(llm_delay), llm_port)
+    serve(api.app, api_port)
+
+    body = {"user_id": "user-1", "assessment_id": "assessment-1", "language": "tr",
+            "questions": questions, "force": True}
+    results = {"blocking": [], "streaming": []}
+    with httpx.Client(base_url=f"http://127.0.0.1:{api_port}", timeout=60) as client:
+        for _ in range(rounds):
+            insights_cache.clear()
+            results["blocking"].append(blocking_round(client, body))
+            insights_cache.clear()
+            results["streaming"].append(streaming_round(client, body))
+
+    print(f"{rounds} rounds, stub LLM completion {llm_delay:.1f}s (median ms)")
+    print(f"  {'':10s} {'first byte':>12s} {'scores':>12s} {'full report':>12s}")
+    for name, rows in results.items():
+        medians = [statistics.median(row[mark] for row in rows) * 1000
+                   for mark in ("first byte", "scores", "full report")]
+        print(f"  {name:10s} " + " ".join(f"{m:12.1f}" for m in medians))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: memory per stored response, dict layout vs compact records
+
+Builds 100k assessments (10 answers each by default) twice: once in the
+previous layout (one seven-key dict with an ISO timestamp per answer) and
+once in DatabaseService's compact AssessmentRecord layout, and reports the
+traced allocation per response.
+
+Usage:
+    cd backend
+    python benchmarks/bench_response_memory.py [assessments] [questions_per_assessment]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_service import DatabaseService
+from question_catalog import QuestionCatalog
+
+USERS = 20000
+
+
+def build_dict_layout(assessments: int, questions: int, question_ids):
+    """Previous layout: {user_id: {assessment_id: {question_id: response_dict}}}"""
+    store = {}
+    for n in range(assessments):
+        user_id = f"user-{n % USERS}"
+        assessment_id = f"assessment-{n}"
+        responses = store.setdefault(user_id, {}).setdefault(assessment_id, {})
+        for i in range(questions):
+            responses[question_ids[i]] = {
+                "user_id": user_id,
+                "user_email": f"user{n % USERS}@example.com",
+                "assessment_id": assessment_id,
+                "question_id": question_ids[i],
+                "answer": (i % 5) + 1,
+                "timestamp": datetime.now().isoformat(),
+                "package_type": "combined"
+            }
+    return store
+
+
+def build_compact_layout(assessments: int, questions: int, question_ids):
+    """Current DatabaseService layout"""
+    store = DatabaseService(catalog=QuestionCatalog(loader=list))
+    for n in range(assessments):
+        for i in range(questions):
+            store._apply_save(
+                f"user-{n % USERS}", f"user{n % USERS}@example.com", f"assessment-{n}",
+                question_ids[i], (i % 5) + 1, datetime.now(), "combined"
+            )
+    return store
+
+
+def measure(builder, *args) -> int:
+    """Bytes still allocated after building (and keeping) the store"""
+    gc.collect()
+    tracemalloc.start()
+    store = builder(*args)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return current
+
+
+if __name__ == "__main__":
+    assessments = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    questions = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    # Question ids come from a shared catalog in practice
+    question_ids = [f"question-{i:04d}" for i in range(questions)]
+    total = assessments * questions
+
+    dict_bytes = measure(build_dict_layout, assessments, questions, question_ids)
+    compact_bytes = measure(build_compact_layout, assessments, questions, question_ids)
+
+    print(f"{assessments} assessments x {questions} answers = {total} responses")
+    print(f"{'layout':>8} {'MB':>8} {'bytes/response':>15}")
+    print(f"{'dict':>8} {dict_bytes / 1e6:>8.1f} {dict_bytes / total:>15.1f}")
+    print(f"{'compact':>8} {compact_bytes / 1e6:>8.1f} {compact_bytes / total:>15.1f}")
@@ -0,0 +1,79 @@
+"""
+Benchmark: restart recovery of the WAL-backed in-memory response store
+
+Fills a store with 1M responses (20k assessments x 50 questions), snapshots
+it, then appends log tails of different sizes and measures how long a fresh
+DatabaseService takes to recover. Snapshot load is a fixed cost; replay cost
+grows with the tail only.
+
+Usage:
+    cd backend
+    python benchmarks/bench_response_recovery.py [total_responses]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_service import DatabaseService
+from question_catalog import QuestionCatalog
+
+QUESTIONS_PER_ASSESSMENT = 50
+# Empty catalog: keeps the benchmark independent of the questions table
+CATALOG = QuestionCatalog(loader=list)
+TAIL_SIZES = [0, 10000, 100000]
+
+
+def fill(store: DatabaseService, total_responses: int):
+    """Save total_responses answers in assessment-sized batches"""
+    responses = [
+        {"question_id": f"q{i}", "answer": (i % 5) + 1}
+        for i in range(QUESTIONS_PER_ASSESSMENT)
+    ]
+    for n in range(total_responses // QUESTIONS_PER_ASSESSMENT):
+        store.save_responses_batch(
+            f"user-{n % 5000}", f"user{n % 5000}@example.com", f"assessment-{n}",
+            responses, "combined"
+        )
+
+
+def append_tail(store: DatabaseService, tail_size: int):
+    """Overwrite tail_size existing answers so the log grows but the data does not"""
+    for n in range(tail_size // QUESTIONS_PER_ASSESSMENT):
+        store.save_responses_batch(
+            f"user-{n % 5000}", f"user{n % 5000}@example.com", f"assessment-{n}",
+            [{"question_id": f"q{i}", "answer": 5} for i in range(QUESTIONS_PER_ASSESSMENT)],
+            "combined"
+        )
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    base_dir = tempfile.mkdtemp(prefix="exportiq-wal-")
+    try:
+        wal_dir = os.path.join(base_dir, "wal")
+        # Large threshold so the benchmark controls when snapshots happen
+        store = DatabaseService(wal_dir=wal_dir, snapshot_every=10 ** 9, catalog=CATALOG)
+        start = time.perf_counter()
+        fill(store, total)
+        print(f"Filled {store.counters.responses} responses in {time.perf_counter() - start:.1f}s")
+        store.snapshot()
+
+        print(f"{'log tail':>10} {'recovery s':>11}")
+        for tail in TAIL_SIZES:
+            store.wal.write_snapshot(store._export_state())
+            append_tail(store, tail)
+            store.wal.flush()
+
+            start = time.perf_counter()
+            recovered = DatabaseService(wal_dir=wal_dir, snapshot_every=10 ** 9, catalog=CATALOG)
+            elapsed = time.perf_counter() - start
+            assert recovered.counters.responses == store.counters.responses
+            recovered.wal.close()
+            print(f"{tail:>10} {elapsed:>11.2f}")
+        store.wal.close()
+    finally:
+        shutil.rmtree(base_dir)
@@ -0,0 +1,45 @@
+"""
+Benchmark: batch-save cost of DatabaseService as question counts grow
+
+Saves one assessment of n questions twice (insert, then overwrite every
+answer) and reports the time per answer. With the question_id-indexed store
+the per-answer cost stays flat instead of growing linearly with n.
+
+Usage:
+    cd backend
+    python benchmarks/bench_response_store.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_service import DatabaseService
+from question_catalog import QuestionCatalog
+
+QUESTION_COUNTS = [50, 200, 1000, 5000, 20000]
+REPEATS = 3
+
+
+def bench_batch(question_count: int) -> float:
+    """Return the best per-answer time (µs) for insert + overwrite of one assessment"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        store = DatabaseService(catalog=QuestionCatalog(loader=list))
+        responses = [
+            {"question_id": f"q{i}", "answer": (i % 5) + 1}
+            for i in range(question_count)
+        ]
+        start = time.perf_counter()
+        store.save_responses_batch("user-1", "user@example.com", "assessment-1", responses, "combined")
+        store.save_responses_batch("user-1", "user@example.com", "assessment-1", responses, "combined")
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed / (2 * question_count))
+    return best * 1e6
+
+
+if __name__ == "__main__":
+    print(f"{'questions':>10} {'µs/answer':>10}")
+    for n in QUESTION_COUNTS:
+        print(f"{n:>10} {bench_batch(n):>10.2f}")
@@ -0,0 +1,257 @@
+"""
+Vectorized scoring for many assessments at once
+
+Answers are laid out as an (assessment x question) matrix and questions are
+mapped to categories / channels with incidence matrices, so per-category and
+per-channel sums for a whole cohort are two matrix products instead of a
+Python loop per response.
+
+Percentages use the same float operations as score_aggregates.percentage and
+levels use cut-offs derived from Python's round(), so a cohort result is
+identical to scoring each assessment on its own with ReportService.
+"""
+import math
+from itertools import chain
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from score_aggregates import ScoreTotals, question_category, question_channels
+
+# Position stored for questions an assessment has not answered
+_UNANSWERED = np.iinfo(np.int64).max
+
+# Rounded percentage at which each level starts (see ReportService._score_level)
+LEVEL_THRESHOLDS = (40, 60, 80)
+
+
+def _round_cutoff(threshold: float) -> float:
+    """Smallest float x with round(x, 2) >= threshold"""
+    cutoff = threshold - 0.005
+    while round(cutoff, 2) >= threshold:
+        cutoff = math.nextafter(cutoff, -math.inf)
+    while round(cutoff, 2) < threshold:
+        cutoff = math.nextafter(cutoff, math.inf)
+    return cutoff
+
+
+_LEVEL_CUTOFFS = np.array([_round_cutoff(t) for t in LEVEL_THRESHOLDS])
+
+
+def _percentages(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Unrounded (sum / (count * 5)) * 100, 0 where there are no answers"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = (sums / (counts * 5)) * 100
+    return np.where(counts > 0, values, 0.0)
+
+
+def _levels(percentages: np.ndarray) -> np.ndarray:
+    """Level index (0 = lowest) of each percentage after rounding to 2 places"""
+    return (percentages[..., None] >= _LEVEL_CUTOFFS).sum(axis=-1)
+
+
+class _ColumnIndex(dict):
+    """{question_id: row} that answers -1 for unknown ids without storing them"""
+
+    def __missing__(self, key):
+        return -1
+
+
+class QuestionIncidence:
+    """Question -> category / channel incidence matrices for a question list"""
+
+    def __init__(self, questions: Sequence[Dict]):
+        # Later duplicates win, like the {id: question} maps built elsewhere
+        question_map = {q["id"]: q for q in questions}
+
+        self.question_index: Dict[str, int] = {}
+        category_index: Dict[str, int] = {}
+        channel_index: Dict[str, int] = {}
+        category_cells: List[Tuple[int, int, int]] = []
+        channel_cells: List[Tuple[int, int, int]] = []
+
+        for row, (question_id, question) in enumerate(question_map.items()):
+            self.question_index[question_id] = row
+            category = category_index.setdefault(question_category(question), len(category_index))
+            category_cells.append((row, category, 0))
+            for rank, channel_id in enumerate(question_channels(question)):
+                channel = channel_index.setdefault(channel_id, len(channel_index))
+                channel_cells.append((row, channel, rank))
+
+        # Column lookup for answers; unknown question ids map to -1
+        self.column_of = _ColumnIndex(self.question_index).__getitem__
+
+        self.category_ids = list(category_index)
+        self.channel_ids = list(channel_index)
+
+        # Stored as float64 so the products below run through BLAS; sums of
+        # 0-255 answers are exact far beyond any realistic cohort size.
+        self.categories, self.category_rank = self._matrices(category_cells, len(question_map),
+                                                             len(category_index))
+        self.channels, self.channel_rank = self._matrices(channel_cells, len(question_map),
+                                                          len(channel_index))
+
+    @staticmethod
+    def _matrices(cells: List[Tuple[int, int, int]], rows: int,
+                  columns: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Incidence matrix plus, per cell, where the column first appears in
+        the question's own list (breaks first-seen ties within one answer)
+        """
+        incidence = np.zeros((rows, columns))
+        rank = np.zeros((rows, columns), dtype=np.int64)
+        for row, column, position in reversed(cells):
+            # A channel listed twice counts the answer twice, as in ScoreTotals
+            incidence[row, column] += 1
+            rank[row, column] = position
+        return incidence, rank
+
+
+class AnswerMatrix:
+    """(assessment x question) answers plus the order they were given in"""
+
+    def __init__(self, assessments: Sequence[Tuple[Sequence[str], Sequence[int]]],
+                 incidence: QuestionIncidence):
+        """
+        assessments: one (question_ids, answers) pair per assessment, in the
+        order the answers were saved, with at most one answer per question
+        (the response stores guarantee this).
+        """
+        size = (len(assessments), len(incidence.question_index))
+        self.answers = np.zeros(size)
+        self.positions = np.full(size, _UNANSWERED, dtype=np.int64)
+
+        # Flatten every assessment and place the answers with one scatter
+        lengths = np.fromiter((len(ids) for ids, _ in assessments), dtype=np.int64,
+                              count=len(assessments))
+        columns = np.fromiter(
+            map(incidence.column_of, chain.from_iterable(ids for ids, _ in assessments)),
+            dtype=np.intp, count=int(lengths.sum())
+        )
+        values = np.fromiter(
+            chain.from_iterable(answers for _, answers in assessments),
+            dtype=np.float64, count=len(columns)
+        )
+        rows = np.repeat(np.arange(len(assessments)), lengths)
+        positions = np.arange(len(columns)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        # Answers to questions missing from the catalog only count overall
+        resolved = columns >= 0
+        self.unresolved_sum = np.bincount(rows[~resolved], weights=values[~resolved],
+                                          minlength=len(assessments))
+        self.unresolved_count = np.bincount(rows[~resolved], minlength=len(assessments))
+        self.answers[rows[resolved], columns[resolved]] = values[resolved]
+        self.positions[rows[resolved], columns[resolved]] = positions[resolved]
+
+    @property
+    def answered(self) -> np.ndarray:
+        return self.positions != _UNANSWERED
+
+
+class CohortScores:
+    """Sums, counts, percentages and levels for every assessment in a cohort"""
+
+    def __init__(self, matrix: AnswerMatrix, incidence: QuestionIncidence):
+        self.category_ids = incidence.category_ids
+        self.channel_ids = incidence.channel_ids
+
+        answered = matrix.answered.astype(np.float64)
+        self.resolved_count = answered.sum(axis=1).astype(np.int64)
+        self.overall_sum = (matrix.answers.sum(axis=1) + matrix.unresolved_sum).astype(np.int64)
+        self.overall_count = self.resolved_count + matrix.unresolved_count
+
+        self.category_sum = (matrix.answers @ incidence.categories).astype(np.int64)
+        self.category_count = (answered @ incidence.categories).astype(np.int64)
+        self.channel_sum = (matrix.answers @ incidence.channels).astype(np.int64)
+        self.channel_count = (answered @ incidence.channels).astype(np.int64)
+
+        # Position of the first answer per category / channel gives the
+        # first-seen order used by the per-assessment dicts
+        self.category_first = self._first_positions(matrix.positions, incidence.categories,
+                                                    incidence.category_rank)
+        self.channel_first = self._first_positions(matrix.positions, incidence.channels,
+                                                   incidence.channel_rank)
+
+        self.overall_percentage = _percentages(self.overall_sum, self.overall_count)
+        self.category_percentage = _percentages(self.category_sum, self.category_count)
+        self.channel_percentage = _percentages(self.channel_sum, self.channel_count)
+
+        self.overall_level = _levels(self.overall_percentage)
+        self.category_level = _levels(self.category_percentage)
+        self.channel_level = _levels(self.channel_percentage)
+
+        # Python-side views, built on first use
+        self._category_rows = None
+        self._channel_rows = None
+
+    @staticmethod
+    def _first_positions(positions: np.ndarray, incidence: np.ndarray,
+                         rank: np.ndarray) -> np.ndarray:
+        """Sort key per (assessment, column): first answer position, then rank in that question"""
+        width = int(rank.max()) + 1 if rank.size else 1
+        first = np.full((positions.shape[0], incidence.shape[1]), _UNANSWERED, dtype=np.int64)
+        for column in range(incidence.shape[1]):
+            members = incidence[:, column] > 0
+            if members.any():
+                member_positions = positions[:, members]
+                keys = np.where(
+                    member_positions == _UNANSWERED,
+                    _UNANSWERED,
+                    member_positions * width + rank[members, column]
+                )
+                first[:, column] = keys.min(axis=1)
+        return first
+
+    def __len__(self) -> int:
+        return len(self.overall_sum)
+
+    @staticmethod
+    def _ordered_rows(ids: List[str], first: np.ndarray, sums: np.ndarray, counts: np.ndarray,
+                      percentages: np.ndarray, levels: np.ndarray) -> List[List[Tuple]]:
+        """Per assessment, (id, sum, count, percentage, level) of answered columns in first-seen order"""
+        order = np.argsort(first, axis=1, kind="stable")
+        columns = [
+            np.take_along_axis(values, order, axis=1).tolist()
+            for values in (sums, counts, percentages, levels)
+        ]
+        return [
+            [
+                (ids[column], score, count, value, level)
+                for column, score, count, value, level in zip(*row)
+                if count
+            ]
+            for row in zip(order.tolist(), *columns)
+        ]
+
+    def categories(self, row: int) -> List[Tuple[str, int, int, float, int]]:
+        """(category_id, sum, count, percentage, level) in first-seen order"""
+        if self._category_rows is None:
+            self._category_rows = self._ordered_rows(
+                self.category_ids, self.category_first, self.category_sum,
+                self.category_count, self.category_percentage, self.category_level
+            )
+        return self._category_rows[row]
+
+    def channels(self, row: int) -> List[Tuple[str, int, int, float, int]]:
+        """(channel_id, sum, count, percentage, level) in first-seen order"""
+        if self._channel_rows is None:
+            self._channel_rows = self._ordered_rows(
+                self.channel_ids, self.channel_first, self.channel_sum,
+                self.channel_count, self.channel_percentage, self.channel_level
+            )
+        return self._channel_rows[row]
+
+    def totals(self, row: int) -> ScoreTotals:
+        """Running totals equivalent to replaying the assessment's answers"""
+        totals = ScoreTotals()
+        totals.answer_sum = int(self.overall_sum[row])
+        totals.answer_count = int(self.overall_count[row])
+        totals.resolved_count = int(self.resolved_count[row])
+        totals.categories = {cid: [s, c] for cid, s, c, _, _ in self.categories(row)}
+        totals.channels = {cid: [s, c] for cid, s, c, _, _ in self.channels(row)}
+        return totals
+
+
+def score_cohort(assessments: Sequence[Tuple[Sequence[str], Sequence[int]]],
+                 questions: Sequence[Dict]) -> CohortScores:
+    """Score (question_ids, answers) pairs against a question list in one pass"""
+    incidence = QuestionIncidence(questions)
+    return CohortScores(AnswerMatrix(assessments, incidence), incidence)
@@ -0,0 +1,228 @@
+"""
+Precomputed per-question AI comments
+
+The comment on a single answer only depends on the question, the answer
+(1-5) and the language, so instead of calling the LLM while a report is
+generated every combination is written ahead of time by an offline batch
+job into the question_comments table:
+
+    cd backend
+    python comment_catalog.py [--force] [--concurrency N]
+
+Each row carries a version hash of the prompt inputs (question text,
+category, prompt version and model). When an admin edits a question its
+hash changes, the old comments stop matching and reports fall back to the
+generic comment until the job is run again, which regenerates only the
+missing or stale rows.
+"""
+import asyncio
+import functools
+import os
+import sys
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from database import SessionLocal
+from db_models import QuestionComment
+from llm_cache import cache_key, normalize_context
+
+# Bump when the comment prompt changes so every comment is regenerated
+COMMENT_PROMPT_VERSION = "1"
+COMMENT_MODEL = "gpt-4o-mini"
+COMMENT_LANGUAGES = ("tr", "en")
+ANSWERS = range(1, 6)
+
+# generate(question_text, answer, category, language) -> comment
+CommentGenerator = Callable[[str, int, str, str], Awaitable[str]]
+
+
+@functools.lru_cache(maxsize=4096)
+def comment_version(question_text: str, category: str) -> str:
+    """Hash of everything the comment prompt depends on"""
+    return cache_key(COMMENT_PROMPT_VERSION, COMMENT_MODEL, category, normalize_context(question_text))
+
+
+def load_comments() -> Dict[Tuple[str, str, int], Tuple[str, str]]:
+    """{(question_id, language, answer): (version, comment)} for every stored comment"""
+    with SessionLocal() as db:
+        rows = db.query(
+            QuestionComment.question_id, QuestionComment.language, QuestionComment.answer,
+            QuestionComment.version, QuestionComment.comment
+        ).all()
+        return {
+            (question_id, language, answer): (version, comment)
+            for question_id, language, answer, version, comment in rows
+        }
+
+
+class CommentCatalog:
+    """
+    In-memory copy of the question_comments table
+
+    Reloaded every refresh_seconds so comments written by the batch job
+    show up without a restart; invalidate() forces the next lookup to reload.
+    `version` hashes the loaded rows, so stored reports built with older
+    comments can be told apart (see ReportService.report_fingerprint).
+    """
+
+    def __init__(self, loader: Callable[[], Dict] = load_comments, refresh_seconds: float = 300):
+        self.loader = loader
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._comments: Optional[Dict[Tuple[str, str, int], Tuple[str, str]]] = None
+        self._version: Optional[str] = None
+        self._loaded_at = 0.0
+
+    def _ensure_loaded(self) -> Dict[Tuple[str, str, int], Tuple[str, str]]:
+        comments = self._comments
+        if comments is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return comments
+
+        with self._lock:
+            if self._comments is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+                try:
+                    comments = self.loader()
+                except Exception as e:
+                    # Keep serving the previous copy; retry on the next lookup
+                    print(f"[COMMENTS] Could not load question comments: {e}")
+                    return self._comments or {}
+                self._version = cache_key(*(
+                    f"{question_id}|{language}|{answer}|{version}|{comment}"
+                    for (question_id, language, answer), (version, comment) in sorted(comments.items())
+                ))
+                self._comments = comments
+                self._loaded_at = time.monotonic()
+            return self._comments
+
+    def get(self, question_id: str, question_text: str, category: str,
+            answer: int, language: str) -> Optional[str]:
+        """Precomputed comment, or None if missing or written for an older question text"""
+        entry = self._ensure_loaded().get((question_id, language, answer))
+        if entry is None:
+            return None
+        version, comment = entry
+        if version != comment_version(question_text, category):
+            return None
+        return comment
+
+    def __len__(self) -> int:
+        return len(self._ensure_loaded())
+
+    @property
+    def version(self) -> Optional[str]:
+        """Hash of the loaded comments (None until they could be loaded once)"""
+        self._ensure_loaded()
+        return self._version
+
+    def invalidate(self):
+        """Drop the cached comments; the next lookup reloads them"""
+        with self._lock:
+            self._comments = None
+
+
+def _question_text(question: Dict, language: str) -> str:
+    text = question.get("text", {})
+    return text.get(language, text.get("tr", ""))
+
+
+def _store_comments(question_id: str, rows: List[Tuple[str, int, str, str]]):
+    """Replace the comments of one question; rows are (language, answer, version, comment)"""
+    with SessionLocal() as db:
+        for language, answer, version, comment in rows:
+            db.query(QuestionComment).filter(
+                QuestionComment.question_id == question_id,
+                QuestionComment.language == language,
+                QuestionComment.answer == answer
+            ).delete(synchronize_session=False)
+            db.add(QuestionComment(
+                question_id=question_id,
+                language=language,
+                answer=answer,
+                version=version,
+                comment=comment,
+                model=COMMENT_MODEL
+            ))
+        db.commit()
+
+
+async def precompute_comments(
+    generate: CommentGenerator,
+    questions: List[Dict],
+    languages: Sequence[str] = COMMENT_LANGUAGES,
+    concurrency: int = 8,
+    force: bool = False,
+    existing: Optional[Dict[Tuple[str, str, int], Tuple[str, str]]] = None
+) -> Dict[str, int]:
+    """
+    Generate and store a comment for every question x answer x language
+
+    Combinations whose stored comment still matches the question are
+    skipped unless force is set. Returns generated/skipped/failed counts.
+    """
+    if existing is None:
+        existing = {} if force else load_comments()
+    slots = asyncio.Semaphore(concurrency)
+    stats = {"generated": 0, "skipped": 0, "failed": 0}
+
+    async def one(question: Dict, language: str, answer: int):
+        text = _question_text(question, language)
+        category = question["categoryId"]
+        version = comment_version(text, category)
+        stored = existing.get((question["id"], language, answer))
+        if not force and stored is not None and stored[0] == version:
+            stats["skipped"] += 1
+            return None
+
+        async with slots:
+            try:
+                comment = await generate(text, answer, category, language)
+            except Exception as e:
+                print(f"[COMMENTS] {question['id']} {language} A:{answer} failed: {e}")
+                stats["failed"] += 1
+                return None
+        stats["generated"] += 1
+        return language, answer, version, comment
+
+    for question in questions:
+        rows = await asyncio.gather(*(
+            one(question, language, answer)
+            for language in languages
+            for answer in ANSWERS
+        ))
+        rows = [row for row in rows if row is not None]
+        if rows:
+            _store_comments(question["id"], rows)
+            print(f"[COMMENTS] {question['id']}: {len(rows)} comments stored")
+
+    comment_catalog.invalidate()
+    return stats
+
+
+def create_comment_catalog() -> CommentCatalog:
+    """Build the comment catalog from COMMENT_CATALOG_* environment variables"""
+    return CommentCatalog(refresh_seconds=float(os.getenv("COMMENT_CATALOG_REFRESH", "300")))
+
+
+# Global instance
+comment_catalog = create_comment_catalog()
+
+
+if __name__ == "__main__":
+    from database import init_db
+    from question_catalog import question_catalog
+    from report_service import report_service
+
+    if not report_service.llm.configured:
+        sys.exit("OPENAI_API_KEY is not set")
+
+    force = "--force" in sys.argv
+    concurrency = int(sys.argv[sys.argv.index("--concurrency") + 1]) if "--concurrency" in sys.argv else 8
+
+    init_db()
+    questions = question_catalog.questions()
+    print(f"[COMMENTS] Precomputing comments for {len(questions)} questions")
+    stats = asyncio.run(precompute_comments(
+        report_service.generate_question_comment, questions,
+        concurrency=concurrency, force=force
+    ))
+    print(f"[COMMENTS] Done: {stats}")
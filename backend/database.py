@@ -50,8 +50,11 @@ def get_db():
 
 # Initialize database
 def init_db():
-    """Create all tables"""
+    """Create all tables and apply pending schema migrations"""
+    from migrations import run_migrations
+    
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
 # Drop all tables (careful!)
 def drop_db():
@@ -1,37 +1,360 @@
 """
-Simple in-memory database service for storing user responses
-In production, this should be replaced with a real database (PostgreSQL, MongoDB, etc.)
+Database services for storing user responses
+
+DatabaseService keeps responses in process memory (single worker only) and,
+when RESPONSE_WAL_DIR is set, persists them with a write-ahead log.
+SQLDatabaseService stores them in the user_responses / assessments tables so
+several workers can share them, with the /stats counters in response_stats. Both also keep the last generated report of
+an assessment together with the fingerprint it was built from.
+RESPONSE_STORE selects the global instance.
 """
-from typing import Dict, List, Optional
-from datetime import datetime
+import os
+import sys
+import threading
+from array import array
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select
 from models import UserResponse
+from database import SessionLocal
+from response_wal import ResponseLog
+from question_catalog import QuestionCatalog, question_catalog
+from score_aggregates import ScoreTotals, build_totals, is_current, percentage
+from db_models import (
+    Assessment, PlanType, ResponseStat, User,
+    UserResponse as UserResponseRow
+)
 import json
 
-class DatabaseService:
+# Timestamps are stored as microseconds since this (naive) epoch
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_MICROS_PER_DAY = 86400 * 1000000
+
+def _to_micros(timestamp: datetime) -> int:
+    """Naive local datetime -> integer microseconds"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return (timestamp - _EPOCH) // _MICROSECOND
+
+def _from_micros(micros: int) -> datetime:
+    """Integer microseconds -> naive datetime"""
+    return _EPOCH + timedelta(microseconds=micros)
+
+def _day_key(timestamp: datetime) -> str:
+    """ISO date a timestamp is counted under in the by_day stats"""
+    return (_EPOCH + timedelta(days=_to_micros(timestamp) // _MICROS_PER_DAY)).date().isoformat()
+
+class StoreCounters:
+    """Running totals behind /stats, updated on every save and delete"""
+    
     def __init__(self):
-        # In-memory storage: {user_id: {assessment_id: [responses]}}
-        self.user_responses: Dict[str, Dict[str, List[Dict]]] = {}
+        self.assessments = 0
+        self.responses = 0
+        # {package_type: {"assessments": n, "responses": n}}
+        self.by_package: Dict[str, Dict[str, int]] = {}
+        # {days since epoch: stored responses whose latest answer is from that day}
+        self.by_day: Dict[int, int] = {}
+    
+    def _bump(self, counts: Dict, key, delta: int):
+        counts[key] = counts.get(key, 0) + delta
+        if counts[key] == 0:
+            del counts[key]
+    
+    def _package(self, package_type: str) -> Dict[str, int]:
+        return self.by_package.setdefault(package_type, {"assessments": 0, "responses": 0})
+    
+    def add_assessment(self, package_type: str, delta: int = 1):
+        self.assessments += delta
+        self._package(package_type)["assessments"] += delta
+    
+    def add_response(self, package_type: str, timestamp_us: int, delta: int = 1):
+        self.responses += delta
+        self._package(package_type)["responses"] += delta
+        self._bump(self.by_day, timestamp_us // _MICROS_PER_DAY, delta)
+    
+    def move_package(self, old_package: str, new_package: str, responses: int):
+        """Re-file one assessment and its responses under another package"""
+        self._package(old_package)["assessments"] -= 1
+        self._package(old_package)["responses"] -= responses
+        self._package(new_package)["assessments"] += 1
+        self._package(new_package)["responses"] += responses
+    
+    def as_dict(self, days: Optional[int] = None) -> Dict:
+        """Breakdowns for the stats endpoint; by_day limited to the latest `days` dates"""
+        day_keys = sorted(self.by_day)
+        if days is not None:
+            day_keys = day_keys[-days:] if days > 0 else []
+        return {
+            "by_package": {
+                package: dict(counts)
+                for package, counts in self.by_package.items()
+                if counts["assessments"] or counts["responses"]
+            },
+            "by_day": {
+                (_EPOCH + timedelta(days=day)).date().isoformat(): self.by_day[day]
+                for day in day_keys
+            }
+        }
+
+class AssessmentRecord:
+    """
+    Compact storage for one assessment's answers
+    
+    Shared fields live once in the header (ids are interned), answers are
+    one byte each and timestamps are int64 microseconds. Response dicts are
+    only built when they are read.
+    """
+    __slots__ = (
+        "user_id", "user_email", "assessment_id", "package_type",
+        "question_index", "answers", "timestamps", "totals", "report", "revision"
+    )
+    
+    def __init__(self, user_id: str, user_email: str, assessment_id: str, package_type: str):
+        self.user_id = user_id
+        self.user_email = user_email
+        self.assessment_id = assessment_id
+        self.package_type = package_type
+        # {question_id: slot}; insertion order is the order answers were first saved
+        self.question_index: Dict[str, int] = {}
+        self.answers = array("B")
+        self.timestamps = array("q")
+        # Running sums per category / channel for progress and reports
+        self.totals = ScoreTotals()
+        # Last generated report as (fingerprint, report dict)
+        self.report = None
+        # Bumped by every upsert; rescoring only replaces totals of unchanged records
+        self.revision = 0
+    
+    def __len__(self) -> int:
+        return len(self.answers)
+    
+    def upsert(self, question_id: str, answer: int, timestamp_us: int) -> Optional[tuple]:
+        """Store an answer; return (previous_answer, previous_timestamp) on overwrite"""
+        slot = self.question_index.get(question_id)
+        if slot is None:
+            # Append first so an out-of-range answer leaves the record untouched
+            self.answers.append(answer)
+            self.timestamps.append(timestamp_us)
+            self.question_index[question_id] = len(self.answers) - 1
+            self.revision = getattr(self, "revision", 0) + 1
+            return None
         
-    def save_response(self, response: UserResponse) -> bool:
-        """Save a single user response"""
+        previous = (self.answers[slot], self.timestamps[slot])
+        self.answers[slot] = answer
+        self.timestamps[slot] = timestamp_us
+        self.revision = getattr(self, "revision", 0) + 1
+        return previous
+    
+    def to_dicts(self) -> List[Dict]:
+        """Materialize the response dicts returned by the API"""
+        return [
+            {
+                "user_id": self.user_id,
+                "user_email": self.user_email,
+                "assessment_id": self.assessment_id,
+                "question_id": question_id,
+                "answer": self.answers[slot],
+                "timestamp": _from_micros(self.timestamps[slot]).isoformat(),
+                "package_type": self.package_type
+            }
+            for question_id, slot in self.question_index.items()
+        ]
+
+class DatabaseService:
+    def __init__(self, wal_dir: Optional[str] = None, snapshot_every: int = 10000,
+                 fsync: bool = False, catalog: QuestionCatalog = question_catalog):
+        # In-memory storage: {user_id: {assessment_id: AssessmentRecord}}
+        # Records index answers by question_id so upserts are O(1) and keep
+        # them in the order they were first saved.
+        self.user_responses: Dict[str, Dict[str, AssessmentRecord]] = {}
+        self.counters = StoreCounters()
+        
+        # Resolves question_id -> category / channels for the running totals
+        self.catalog = catalog
+        
+        # Serializes record updates with reads/rewrites from rescoring threads
+        self._lock = threading.Lock()
+        
+        # Optional write-ahead log so the store survives restarts
+        self.wal: Optional[ResponseLog] = None
+        if wal_dir:
+            self.wal = ResponseLog(wal_dir, snapshot_every=snapshot_every, fsync=fsync)
+            self._recover()
+    
+    def _recover(self):
+        """Rebuild the store from the latest snapshot plus the log tail"""
+        state, records = self.wal.recover()
+        if state is not None:
+            self._import_state(state)
+        
+        replayed = self._replay(records)
+        
+        print(f"[STORE] Recovered {self.counters.responses} responses ({replayed} replayed from log)")
+    
+    def _replay(self, records) -> int:
+        """Apply logged records (no logging); returns how many were applied"""
+        replayed = 0
+        for record in records:
+            if record["op"] == "save":
+                response = record["response"]
+                self._apply_save(
+                    response["user_id"], response["user_email"], response["assessment_id"],
+                    response["question_id"], response["answer"],
+                    datetime.fromisoformat(response["timestamp"]), response["package_type"]
+                )
+            elif record["op"] == "delete":
+                self._apply_delete(record["user_id"], record["assessment_id"])
+            elif record["op"] == "report":
+                self._apply_report(record["user_id"], record["assessment_id"],
+                                   record["fingerprint"], record["report"])
+            replayed += 1
+        return replayed
+    
+    def _export_state(self):
+        """Snapshot image of the store (records and counters pickle compactly)"""
+        return {"user_responses": self.user_responses, "counters": self.counters}
+    
+    def _checkpoint_state(self, state, records):
+        """
+        Next snapshot image, built on the snapshot thread from the previous
+        image plus the rotated log segment in a scratch store, so the live
+        store is never copied
+        """
+        scratch = DatabaseService(catalog=self.catalog)
+        if state is not None:
+            scratch._import_state(state)
+        scratch._replay(records)
+        return scratch._export_state()
+    
+    def _import_state(self, state):
+        """Load a snapshot image produced by _export_state (or by the older dict layout)"""
+        if isinstance(state, dict) and isinstance(state.get("counters"), StoreCounters):
+            self.user_responses = state["user_responses"]
+            self.counters = state["counters"]
+            return
+        self._import_legacy_state(state)
+    
+    def _import_legacy_state(self, state):
+        """
+        Convert a snapshot from before compact records:
+        {user_id: {assessment_id: {question_id: response dict}}}
+        """
+        self.user_responses = {}
+        self.counters = StoreCounters()
+        converted = 0
         try:
-            user_id = response.user_id
-            assessment_id = response.assessment_id
-            
-            # Initialize user if not exists
-            if user_id not in self.user_responses:
-                self.user_responses[user_id] = {}
-            
-            # Initialize assessment if not exists
-            if assessment_id not in self.user_responses[user_id]:
-                self.user_responses[user_id][assessment_id] = []
-            
-            # Add timestamp if not provided
-            if response.timestamp is None:
-                response.timestamp = datetime.now()
-            
-            # Save response
-            response_dict = {
+            # Re-apply every answer in saved order; this rebuilds records, counters and totals
+            for user_assessments in state.values():
+                for responses in user_assessments.values():
+                    for response in responses.values():
+                        self._apply_save(
+                            response["user_id"], response["user_email"], response["assessment_id"],
+                            response["question_id"], response["answer"],
+                            datetime.fromisoformat(response["timestamp"]), response["package_type"]
+                        )
+                        converted += 1
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(
+                f"Unrecognized response snapshot ({e!r}); move {self.wal.snapshot_path} "
+                f"aside to start without it"
+            ) from e
+        print(f"[STORE] Converted a legacy snapshot ({converted} responses)")
+    
+    def _apply_save(self, user_id: str, user_email: str, assessment_id: str, question_id: str,
+                    answer: int, timestamp: datetime, package_type: str):
+        """Upsert an answer into memory (no logging)"""
+        with self._lock:
+            self._apply_save_locked(user_id, user_email, assessment_id, question_id,
+                                    answer, timestamp, package_type)
+    
+    def _apply_save_locked(self, user_id: str, user_email: str, assessment_id: str, question_id: str,
+                           answer: int, timestamp: datetime, package_type: str):
+        user_assessments = self.user_responses.get(user_id)
+        if user_assessments is None:
+            user_assessments = self.user_responses[sys.intern(user_id)] = {}
+        
+        record = user_assessments.get(assessment_id)
+        if record is None:
+            record = user_assessments[assessment_id] = AssessmentRecord(
+                user_id=sys.intern(user_id),
+                user_email=sys.intern(user_email),
+                assessment_id=assessment_id,
+                package_type=sys.intern(package_type)
+            )
+            self.counters.add_assessment(record.package_type)
+        else:
+            # The header keeps the latest email / package for the assessment
+            if record.user_email != user_email:
+                record.user_email = sys.intern(user_email)
+            if record.package_type != package_type:
+                self.counters.move_package(record.package_type, package_type, len(record))
+                record.package_type = sys.intern(package_type)
+        
+        timestamp_us = _to_micros(timestamp)
+        catalog_version, question_map = self.catalog.snapshot()
+        # Rebuild against the current questions before applying the change
+        totals = self._current_totals(record, catalog_version, question_map)
+        previous = record.upsert(sys.intern(question_id), answer, timestamp_us)
+        if previous is not None:
+            self.counters.add_response(record.package_type, previous[1], -1)
+        self.counters.add_response(record.package_type, timestamp_us)
+        totals.replace(
+            question_map.get(question_id),
+            previous[0] if previous is not None else None,
+            answer
+        )
+    
+    def _current_totals(self, record: AssessmentRecord, catalog_version: Optional[str],
+                        question_map: Dict[str, Dict]) -> ScoreTotals:
+        """The record's running totals, rebuilt from its answers if the questions changed since"""
+        if not is_current(record.totals, catalog_version):
+            record.totals = build_totals(
+                ((question_id, record.answers[slot]) for question_id, slot in record.question_index.items()),
+                question_map, catalog_version
+            )
+        return record.totals
+    
+    def _apply_delete(self, user_id: str, assessment_id: str) -> bool:
+        """Remove an assessment from memory (no logging)"""
+        user_assessments = self.user_responses.get(user_id)
+        if user_assessments is None or assessment_id not in user_assessments:
+            return False
+        
+        record = user_assessments.pop(assessment_id)
+        self.counters.add_assessment(record.package_type, -1)
+        for timestamp_us in record.timestamps:
+            self.counters.add_response(record.package_type, timestamp_us, -1)
+        return True
+    
+    def _apply_report(self, user_id: str, assessment_id: str, fingerprint: str, report: Dict) -> bool:
+        """Attach a generated report to an assessment (no logging)"""
+        record = self.user_responses.get(user_id, {}).get(assessment_id)
+        if record is None:
+            return False
+        record.report = (fingerprint, report)
+        return True
+    
+    def _commit(self):
+        """Make logged mutations durable and compact the log when it has grown"""
+        if self.wal:
+            self.wal.flush()
+            if self.wal.should_snapshot(self.counters.responses) and not self.wal.snapshot_in_progress:
+                # Only the log rotation happens here; the image is built on a background thread
+                self.wal.write_snapshot_async(self._checkpoint_state)
+    
+    def _save(self, response: UserResponse):
+        """Log and apply a single response without flushing the log"""
+        # Add timestamp if not provided
+        if response.timestamp is None:
+            response.timestamp = datetime.now()
+        
+        if not 0 <= response.answer <= 255:
+            raise ValueError(f"Answer out of range: {response.answer}")
+        
+        if self.wal:
+            self.wal.append({"op": "save", "response": {
                 "user_id": response.user_id,
                 "user_email": response.user_email,
                 "assessment_id": response.assessment_id,
@@ -39,20 +362,17 @@ class DatabaseService:
                 "answer": response.answer,
                 "timestamp": response.timestamp.isoformat(),
                 "package_type": response.package_type
-            }
-            
-            # Check if response already exists (update instead of duplicate)
-            existing_idx = None
-            for idx, resp in enumerate(self.user_responses[user_id][assessment_id]):
-                if resp["question_id"] == response.question_id:
-                    existing_idx = idx
-                    break
-            
-            if existing_idx is not None:
-                self.user_responses[user_id][assessment_id][existing_idx] = response_dict
-            else:
-                self.user_responses[user_id][assessment_id].append(response_dict)
-            
+            }})
+        self._apply_save(
+            response.user_id, response.user_email, response.assessment_id,
+            response.question_id, response.answer, response.timestamp, response.package_type
+        )
+    
+    def save_response(self, response: UserResponse) -> bool:
+        """Save a single user response"""
+        try:
+            self._save(response)
+            self._commit()
             return True
         except Exception as e:
             print(f"Error saving response: {e}")
@@ -73,8 +393,14 @@ class DatabaseService:
                     timestamp=datetime.now(),
                     package_type=package_type
                 )
-                if self.save_response(response):
+                try:
+                    self._save(response)
                     saved_count += 1
+                except Exception as e:
+                    print(f"Error saving response: {e}")
+            
+            # One log flush for the whole batch
+            self._commit()
             
             return {
                 "success": True,
@@ -90,10 +416,8 @@ class DatabaseService:
     def get_user_responses(self, user_id: str, assessment_id: str) -> List[Dict]:
         """Get all responses for a specific assessment"""
         try:
-            if user_id in self.user_responses:
-                if assessment_id in self.user_responses[user_id]:
-                    return self.user_responses[user_id][assessment_id]
-            return []
+            record = self.user_responses.get(user_id, {}).get(assessment_id)
+            return record.to_dicts() if record is not None else []
         except Exception as e:
             print(f"Error getting responses: {e}")
             return []
@@ -102,39 +426,626 @@ class DatabaseService:
         """Get all assessments for a user"""
         try:
             if user_id in self.user_responses:
-                return self.user_responses[user_id]
+                return {
+                    assessment_id: record.to_dicts()
+                    for assessment_id, record in self.user_responses[user_id].items()
+                }
             return {}
         except Exception as e:
             print(f"Error getting user assessments: {e}")
             return {}
     
+    def get_progress(self, user_id: str, assessment_id: str) -> Optional[Dict]:
+        """Answer counts and running score totals for an assessment"""
+        record = self.user_responses.get(user_id, {}).get(assessment_id)
+        if record is None:
+            return None
+        catalog_version, question_map = self.catalog.snapshot()
+        return {
+            "package_type": record.package_type,
+            "answered_questions": len(record),
+            "total_questions": self.catalog.count_for_package(record.package_type),
+            "totals": self._current_totals(record, catalog_version, question_map)
+        }
+    
+    def iter_assessments(self) -> Iterator[Dict]:
+        """Every stored assessment with its question ids and answers in save order"""
+        for user_id, assessments in list(self.user_responses.items()):
+            for assessment_id, record in list(assessments.items()):
+                with self._lock:
+                    assessment = {
+                        "user_id": user_id,
+                        "assessment_id": assessment_id,
+                        "package_type": record.package_type,
+                        "question_ids": list(record.question_index),
+                        "answers": record.answers.tolist(),
+                        "revision": getattr(record, "revision", 0)
+                    }
+                yield assessment
+    
+    def replace_totals(self, results: List[Dict]) -> int:
+        """
+        Swap in recomputed running totals (e.g. after questions changed)
+        
+        Each result carries the record revision it was scored from (see
+        iter_assessments); a record saved to since then is skipped. Returns
+        the number replaced.
+        """
+        replaced = 0
+        for result in results:
+            record = self.user_responses.get(result["user_id"], {}).get(result["assessment_id"])
+            if record is None:
+                continue
+            with self._lock:
+                if getattr(record, "revision", 0) != result["revision"]:
+                    continue
+                record.totals = result["totals"]
+            replaced += 1
+        return replaced
+    
+    def get_stored_report(self, user_id: str, assessment_id: str) -> Optional[Dict]:
+        """Last generated report as {"fingerprint", "report"}, or None"""
+        record = self.user_responses.get(user_id, {}).get(assessment_id)
+        # Records from snapshots taken before reports were kept have no slot value
+        stored = getattr(record, "report", None) if record is not None else None
+        if stored is None:
+            return None
+        return {"fingerprint": stored[0], "report": stored[1]}
+    
+    def store_report(self, user_id: str, assessment_id: str, fingerprint: str, report: Dict) -> bool:
+        """Keep a generated report (JSON-serializable dict) with the fingerprint it was built from"""
+        try:
+            if assessment_id not in self.user_responses.get(user_id, {}):
+                return False
+            if self.wal:
+                self.wal.append({
+                    "op": "report", "user_id": user_id, "assessment_id": assessment_id,
+                    "fingerprint": fingerprint, "report": report
+                })
+            self._apply_report(user_id, assessment_id, fingerprint, report)
+            self._commit()
+            return True
+        except Exception as e:
+            print(f"Error storing report: {e}")
+            return False
+    
     def delete_assessment(self, user_id: str, assessment_id: str) -> bool:
         """Delete an assessment"""
         try:
-            if user_id in self.user_responses:
-                if assessment_id in self.user_responses[user_id]:
-                    del self.user_responses[user_id][assessment_id]
-                    return True
-            return False
+            if assessment_id not in self.user_responses.get(user_id, {}):
+                return False
+            if self.wal:
+                self.wal.append({"op": "delete", "user_id": user_id, "assessment_id": assessment_id})
+            self._apply_delete(user_id, assessment_id)
+            self._commit()
+            return True
         except Exception as e:
             print(f"Error deleting assessment: {e}")
             return False
     
-    def get_stats(self) -> Dict:
-        """Get database statistics"""
-        total_users = len(self.user_responses)
-        total_assessments = sum(len(assessments) for assessments in self.user_responses.values())
-        total_responses = sum(
-            len(responses) 
-            for user_assessments in self.user_responses.values()
-            for responses in user_assessments.values()
+    def snapshot(self):
+        """Write a compacted snapshot now (e.g. on shutdown)"""
+        if self.wal:
+            self.wal.write_snapshot(self._export_state())
+    
+    def close(self):
+        """Snapshot and close the write-ahead log"""
+        if self.wal:
+            self.snapshot()
+            self.wal.close()
+    
+    def get_stats(self, days: Optional[int] = None) -> Dict:
+        """Get database statistics from the running counters (no rescans)"""
+        return {
+            "total_users": len(self.user_responses),
+            "total_assessments": self.counters.assessments,
+            "total_responses": self.counters.responses,
+            **self.counters.as_dict(days)
+        }
+
+class SQLDatabaseService:
+    """Response store backed by the user_responses and assessments tables"""
+    
+    # Rows per INSERT statement; keeps SQLite under its bound-parameter limit
+    UPSERT_CHUNK_SIZE = 500
+    
+    def __init__(self, session_factory=SessionLocal, catalog: QuestionCatalog = question_catalog):
+        self.session_factory = session_factory
+        self.catalog = catalog
+    
+    def _insert(self, session, table):
+        """Dialect-specific INSERT that supports ON CONFLICT"""
+        dialect = session.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            raise ValueError(f"Bulk upsert is not supported on {dialect}")
+        return insert(table)
+    
+    def _ensure_assessment(self, session, user_id: str, assessment_id: str,
+                           package_type: str, total_questions: int,
+                           stats: Dict[Tuple[str, str], int]) -> bool:
+        """
+        Create the assessment row if missing; False if it belongs to another user
+        
+        A new assessment (and a user's first) is counted into `stats`, see _bump_stats.
+        """
+        stmt = self._insert(session, Assessment.__table__).values(
+            id=assessment_id,
+            user_id=user_id,
+            package_type=PlanType(package_type),
+            total_questions=total_questions,
+            answered_questions=0
+        ).on_conflict_do_nothing(index_elements=["id"])
+        created = session.execute(stmt).rowcount == 1
+        
+        owner_id = session.execute(
+            select(Assessment.user_id).where(Assessment.id == assessment_id)
+        ).scalar_one()
+        if created:
+            self._count(stats, "total", "assessments", 1)
+            self._count(stats, "package_assessments", package_type, 1)
+            if self._bump_user_assessments(session, user_id, 1) == 1:
+                self._count(stats, "total", "users", 1)
+        return owner_id == user_id
+    
+    @staticmethod
+    def _count(stats: Dict[Tuple[str, str], int], scope: str, name: str, delta: int) -> None:
+        stats[(scope, name)] = stats.get((scope, name), 0) + delta
+    
+    def _bump_stats(self, session, stats: Dict[Tuple[str, str], int]) -> None:
+        """Add the collected deltas to the response_stats counters in the caller's transaction"""
+        table = ResponseStat.__table__
+        # Sorted, so concurrent transactions lock the counter rows in the same order
+        rows = [
+            {"scope": scope, "name": name, "value": delta}
+            for (scope, name), delta in sorted(stats.items()) if delta
+        ]
+        if not rows:
+            return
+        stmt = self._insert(session, table).values(rows)
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=["scope", "name"],
+            set_={"value": table.c.value + stmt.excluded.value}
+        ))
+    
+    def _bump_user_assessments(self, session, user_id: str, delta: int) -> int:
+        """Change a user's assessment count and return the new count"""
+        table = ResponseStat.__table__
+        stmt = self._insert(session, table).values(scope="user_assessments", name=user_id, value=delta)
+        return session.execute(stmt.on_conflict_do_update(
+            index_elements=["scope", "name"],
+            set_={"value": table.c.value + stmt.excluded.value}
+        ).returning(table.c.value)).scalar_one()
+    
+    def _upsert_answers(self, session, rows: List[Dict]) -> None:
+        """Insert or update answers on (assessment_id, question_id)"""
+        table = UserResponseRow.__table__
+        for start in range(0, len(rows), self.UPSERT_CHUNK_SIZE):
+            stmt = self._insert(session, table).values(rows[start:start + self.UPSERT_CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["assessment_id", "question_id"],
+                set_={
+                    "answer": stmt.excluded.answer,
+                    "updated_at": stmt.excluded.updated_at
+                }
+            )
+            session.execute(stmt)
+    
+    def _existing_rows(self, session, assessment_id: str,
+                       question_ids: List[str]) -> Dict[str, Tuple[int, datetime]]:
+        """{question_id: (answer, updated_at)} already stored for question_ids"""
+        query = select(
+            UserResponseRow.question_id, UserResponseRow.answer, UserResponseRow.updated_at
+        ).where(UserResponseRow.assessment_id == assessment_id)
+        existing = {}
+        for start in range(0, len(question_ids), self.UPSERT_CHUNK_SIZE):
+            chunk = question_ids[start:start + self.UPSERT_CHUNK_SIZE]
+            for question_id, answer, updated_at in session.execute(
+                query.where(UserResponseRow.question_id.in_(chunk))
+            ):
+                existing[question_id] = (answer, updated_at)
+        return existing
+    
+    def _existing_answers(self, session, assessment_id: str,
+                          question_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """{question_id: answer} already stored (optionally only for question_ids)"""
+        query = select(UserResponseRow.question_id, UserResponseRow.answer).where(
+            UserResponseRow.assessment_id == assessment_id
         )
+        if question_ids is None:
+            return dict(session.execute(query.order_by(UserResponseRow.id)).all())
+        
+        existing = {}
+        for start in range(0, len(question_ids), self.UPSERT_CHUNK_SIZE):
+            chunk = question_ids[start:start + self.UPSERT_CHUNK_SIZE]
+            existing.update(session.execute(
+                query.where(UserResponseRow.question_id.in_(chunk))
+            ).all())
+        return existing
+    
+    def _load_totals(self, session, assessment: Assessment, catalog=None) -> ScoreTotals:
+        """
+        Running totals of an assessment, rebuilt from its answers when they
+        predate the question catalog (or were never stored). `catalog` is a
+        (version, question_map) pair from question_catalog.snapshot().
+        """
+        catalog_version, question_map = catalog or self.catalog.snapshot()
+        if assessment.score_totals is not None:
+            totals = ScoreTotals.from_dict(assessment.score_totals)
+            if is_current(totals, catalog_version):
+                return totals
+        
+        return build_totals(
+            self._existing_answers(session, assessment.id).items(), question_map, catalog_version
+        )
+    
+    def _store_totals(self, assessment: Assessment, totals: ScoreTotals) -> None:
+        """Write running totals and the score/progress columns derived from them"""
+        total_questions = (
+            self.catalog.count_for_package(assessment.package_type.value)
+            or assessment.total_questions
+        )
+        assessment.score_totals = totals.to_dict()
+        assessment.answered_questions = totals.answer_count
+        assessment.completion_percentage = (
+            round(min(totals.answer_count / total_questions, 1.0) * 100, 2)
+            if total_questions else 0.0
+        )
+        assessment.overall_score = percentage(totals.answer_sum, totals.answer_count)
+        assessment.category_scores = {
+            category: percentage(score, count)
+            for category, (score, count) in totals.categories.items()
+        }
+        assessment.channel_scores = [
+            {"channel": channel, "score": percentage(score, count)}
+            for channel, (score, count) in totals.channels.items()
+        ]
+    
+    def save_response(self, response: UserResponse) -> bool:
+        """Save a single user response"""
+        result = self.save_responses_batch(
+            user_id=response.user_id,
+            user_email=response.user_email,
+            assessment_id=response.assessment_id,
+            responses=[{
+                "question_id": response.question_id,
+                "answer": response.answer,
+                "timestamp": response.timestamp
+            }],
+            package_type=response.package_type
+        )
+        return result["success"]
+    
+    def save_responses_batch(self, user_id: str, user_email: str, assessment_id: str,
+                            responses: List[Dict], package_type: str) -> Dict:
+        """Save multiple responses in one transaction with a bulk upsert"""
+        try:
+            now = datetime.now()
+            
+            # Last answer wins when a batch repeats a question
+            rows_by_question = {}
+            for resp_data in responses:
+                timestamp = resp_data.get("timestamp") or now
+                rows_by_question[resp_data["question_id"]] = {
+                    "user_id": user_id,
+                    "assessment_id": assessment_id,
+                    "question_id": resp_data["question_id"],
+                    "answer": int(resp_data["answer"]),
+                    "created_at": timestamp,
+                    "updated_at": timestamp
+                }
+            rows = list(rows_by_question.values())
+            
+            with self.session_factory() as session:
+                # /stats counter deltas, written with the answers
+                stats: Dict[Tuple[str, str], int] = {}
+                if not self._ensure_assessment(session, user_id, assessment_id,
+                                               package_type, len(rows), stats):
+                    session.rollback()
+                    return {
+                        "success": False,
+                        "error": "Assessment belongs to another user"
+                    }
+                
+                if rows:
+                    # Row lock serializes concurrent batches for the same assessment
+                    assessment = session.execute(
+                        select(Assessment).where(Assessment.id == assessment_id).with_for_update()
+                    ).scalar_one()
+                    catalog = self.catalog.snapshot()
+                    totals = self._load_totals(session, assessment, catalog)
+                    existing = self._existing_rows(session, assessment_id, list(rows_by_question))
+                    previous = {question_id: answer for question_id, (answer, _) in existing.items()}
+                    
+                    self._upsert_answers(session, rows)
+                    # Counted under the assessment's own package, like the memory store
+                    stored_package = assessment.package_type.value
+                    for row in rows:
+                        if row["question_id"] in existing:
+                            updated_at = existing[row["question_id"]][1]
+                            if updated_at is not None:
+                                self._count(stats, "day", _day_key(updated_at), -1)
+                        else:
+                            self._count(stats, "total", "responses", 1)
+                            self._count(stats, "package_responses", stored_package, 1)
+                        self._count(stats, "day", _day_key(row["updated_at"]), 1)
+                    assessment.answers_revision = (assessment.answers_revision or 0) + 1
+                    
+                    question_map = catalog[1]
+                    for row in rows:
+                        totals.replace(
+                            question_map.get(row["question_id"]),
+                            previous.get(row["question_id"]),
+                            row["answer"]
+                        )
+                    self._store_totals(assessment, totals)
+                
+                self._bump_stats(session, stats)
+                session.commit()
+            
+            return {
+                "success": True,
+                "saved_count": len(responses),
+                "total_count": len(responses)
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    def _response_query(self):
+        """Select answers joined with the data needed for the response dict shape"""
+        return (
+            select(
+                UserResponseRow.user_id,
+                User.email,
+                UserResponseRow.assessment_id,
+                UserResponseRow.question_id,
+                UserResponseRow.answer,
+                UserResponseRow.updated_at,
+                Assessment.package_type
+            )
+            .join(User, User.id == UserResponseRow.user_id)
+            .join(Assessment, Assessment.id == UserResponseRow.assessment_id)
+        )
+    
+    def _row_to_dict(self, row) -> Dict:
+        """Convert a joined answer row to the in-memory response dict shape"""
+        return {
+            "user_id": row.user_id,
+            "user_email": row.email,
+            "assessment_id": row.assessment_id,
+            "question_id": row.question_id,
+            "answer": row.answer,
+            "timestamp": row.updated_at.isoformat() if row.updated_at else None,
+            "package_type": row.package_type.value
+        }
+    
+    def get_user_responses(self, user_id: str, assessment_id: str) -> List[Dict]:
+        """Get all responses for a specific assessment"""
+        try:
+            query = (
+                self._response_query()
+                .where(UserResponseRow.user_id == user_id)
+                .where(UserResponseRow.assessment_id == assessment_id)
+                .order_by(UserResponseRow.id)
+            )
+            with self.session_factory() as session:
+                return [self._row_to_dict(row) for row in session.execute(query)]
+        except Exception as e:
+            print(f"Error getting responses: {e}")
+            return []
+    
+    def get_all_user_assessments(self, user_id: str) -> Dict[str, List[Dict]]:
+        """Get all assessments for a user"""
+        try:
+            query = (
+                self._response_query()
+                .where(UserResponseRow.user_id == user_id)
+                .order_by(UserResponseRow.assessment_id, UserResponseRow.id)
+            )
+            assessments: Dict[str, List[Dict]] = {}
+            with self.session_factory() as session:
+                for row in session.execute(query):
+                    assessments.setdefault(row.assessment_id, []).append(self._row_to_dict(row))
+            return assessments
+        except Exception as e:
+            print(f"Error getting user assessments: {e}")
+            return {}
+    
+    def get_progress(self, user_id: str, assessment_id: str) -> Optional[Dict]:
+        """Answer counts and running score totals for an assessment"""
+        with self.session_factory() as session:
+            assessment = session.execute(
+                select(Assessment)
+                .where(Assessment.id == assessment_id)
+                .where(Assessment.user_id == user_id)
+            ).scalar_one_or_none()
+            if assessment is None:
+                return None
+            
+            package_type = assessment.package_type.value
+            return {
+                "package_type": package_type,
+                "answered_questions": assessment.answered_questions or 0,
+                "total_questions": (
+                    self.catalog.count_for_package(package_type) or assessment.total_questions
+                ),
+                "totals": self._load_totals(session, assessment)
+            }
+    
+    def iter_assessments(self) -> Iterator[Dict]:
+        """Every stored assessment with its question ids and answers in save order"""
+        query = (
+            select(
+                UserResponseRow.user_id,
+                UserResponseRow.assessment_id,
+                UserResponseRow.question_id,
+                UserResponseRow.answer,
+                Assessment.package_type,
+                Assessment.answers_revision
+            )
+            .join(Assessment, Assessment.id == UserResponseRow.assessment_id)
+            .order_by(UserResponseRow.assessment_id, UserResponseRow.id)
+        )
+        with self.session_factory() as session:
+            rows = session.execute(query).yield_per(self.UPSERT_CHUNK_SIZE)
+            for assessment_id, group in groupby(rows, key=lambda row: row.assessment_id):
+                group = list(group)
+                yield {
+                    "user_id": group[0].user_id,
+                    "assessment_id": assessment_id,
+                    "package_type": group[0].package_type.value,
+                    "question_ids": [row.question_id for row in group],
+                    "answers": [row.answer for row in group],
+                    "revision": group[0].answers_revision or 0
+                }
+    
+    def replace_totals(self, results: List[Dict]) -> int:
+        """
+        Swap in recomputed running totals and the score columns derived from them
+        
+        Each result carries the answers_revision it was scored from (see
+        iter_assessments); an assessment saved to since then is skipped.
+        Returns the number replaced.
+        """
+        by_id = {result["assessment_id"]: result for result in results}
+        assessment_ids = list(by_id)
+        replaced = 0
+        with self.session_factory() as session:
+            for start in range(0, len(assessment_ids), self.UPSERT_CHUNK_SIZE):
+                chunk = assessment_ids[start:start + self.UPSERT_CHUNK_SIZE]
+                assessments = session.execute(
+                    select(Assessment).where(Assessment.id.in_(chunk)).with_for_update()
+                ).scalars().all()
+                for assessment in assessments:
+                    result = by_id[assessment.id]
+                    if (assessment.answers_revision or 0) != result["revision"]:
+                        continue
+                    self._store_totals(assessment, result["totals"])
+                    replaced += 1
+                session.commit()
+        return replaced
+    
+    def get_stored_report(self, user_id: str, assessment_id: str) -> Optional[Dict]:
+        """Last generated report as {"fingerprint", "report"}, or None"""
+        with self.session_factory() as session:
+            report_data = session.execute(
+                select(Assessment.report_data)
+                .where(Assessment.id == assessment_id)
+                .where(Assessment.user_id == user_id)
+            ).scalar_one_or_none()
+        if not report_data or "fingerprint" not in report_data:
+            return None
+        return {"fingerprint": report_data["fingerprint"], "report": report_data["report"]}
+    
+    def store_report(self, user_id: str, assessment_id: str, fingerprint: str, report: Dict) -> bool:
+        """Keep a generated report in Assessment.report_data with the fingerprint it was built from"""
+        try:
+            with self.session_factory() as session:
+                assessment = session.execute(
+                    select(Assessment)
+                    .where(Assessment.id == assessment_id)
+                    .where(Assessment.user_id == user_id)
+                ).scalar_one_or_none()
+                if assessment is None:
+                    return False
+                assessment.report_data = {"fingerprint": fingerprint, "report": report}
+                assessment.report_generated = True
+                session.commit()
+            return True
+        except Exception as e:
+            print(f"Error storing report: {e}")
+            return False
+    
+    def delete_assessment(self, user_id: str, assessment_id: str) -> bool:
+        """Delete an assessment and its responses (and take them out of the /stats counters)"""
+        try:
+            with self.session_factory() as session:
+                assessment = session.execute(
+                    select(Assessment)
+                    .where(Assessment.id == assessment_id)
+                    .where(Assessment.user_id == user_id)
+                    .with_for_update()
+                ).scalar_one_or_none()
+                if assessment is None:
+                    return False
+                
+                package = assessment.package_type.value
+                stats: Dict[Tuple[str, str], int] = {}
+                for (updated_at,) in session.execute(
+                    select(UserResponseRow.updated_at).where(UserResponseRow.assessment_id == assessment_id)
+                ):
+                    self._count(stats, "total", "responses", -1)
+                    self._count(stats, "package_responses", package, -1)
+                    if updated_at is not None:
+                        self._count(stats, "day", _day_key(updated_at), -1)
+                self._count(stats, "total", "assessments", -1)
+                self._count(stats, "package_assessments", package, -1)
+                if self._bump_user_assessments(session, user_id, -1) <= 0:
+                    self._count(stats, "total", "users", -1)
+                    session.execute(delete(ResponseStat).where(
+                        ResponseStat.scope == "user_assessments", ResponseStat.name == user_id
+                    ))
+                
+                session.execute(
+                    delete(UserResponseRow).where(UserResponseRow.assessment_id == assessment_id)
+                )
+                session.execute(delete(Assessment).where(Assessment.id == assessment_id))
+                self._bump_stats(session, stats)
+                session.commit()
+                return True
+        except Exception as e:
+            print(f"Error deleting assessment: {e}")
+            return False
+    
+    def get_stats(self, days: Optional[int] = None) -> Dict:
+        """Get database statistics from the response_stats counters (no rescans)"""
+        counter = select(ResponseStat.scope, ResponseStat.name, ResponseStat.value).where(ResponseStat.value != 0)
+        with self.session_factory() as session:
+            counters = session.execute(
+                counter.where(ResponseStat.scope.in_(["total", "package_assessments", "package_responses"]))
+            ).all()
+            day_query = counter.where(ResponseStat.scope == "day").order_by(ResponseStat.name.desc())
+            if days is not None:
+                day_query = day_query.limit(max(days, 0))
+            by_day = {name: value for _, name, value in session.execute(day_query)}
+        
+        totals: Dict[str, int] = {}
+        by_package: Dict[str, Dict[str, int]] = {}
+        for scope, name, value in counters:
+            if scope == "total":
+                totals[name] = value
+            else:
+                key = "assessments" if scope == "package_assessments" else "responses"
+                by_package.setdefault(name, {"assessments": 0, "responses": 0})[key] = value
         
         return {
-            "total_users": total_users,
-            "total_assessments": total_assessments,
-            "total_responses": total_responses
+            "total_users": totals.get("users", 0),
+            "total_assessments": totals.get("assessments", 0),
+            "total_responses": totals.get("responses", 0),
+            "by_package": by_package,
+            "by_day": dict(sorted(by_day.items()))
         }
+    
+    def close(self):
+        """Nothing to flush; every write is committed immediately"""
+        pass
+
+def create_db_service():
+    """Build the response store selected by RESPONSE_STORE (memory or sql)"""
+    store = os.getenv("RESPONSE_STORE", "memory").lower()
+    if store == "sql":
+        return SQLDatabaseService()
+    return DatabaseService(
+        wal_dir=os.getenv("RESPONSE_WAL_DIR") or None,
+        snapshot_every=int(os.getenv("RESPONSE_SNAPSHOT_EVERY", "10000")),
+        fsync=os.getenv("RESPONSE_WAL_FSYNC", "false").lower() == "true"
+    )
 
 # Global instance
-db_service = DatabaseService()
+db_service = create_db_service()
@@ -3,7 +3,7 @@ SQLAlchemy ORM Models for ExportIQ 360
 """
 from sqlalchemy import (
     Column, String, Integer, Float, Boolean, DateTime, 
-    Text, ForeignKey, JSON, Enum as SQLEnum
+    Text, ForeignKey, JSON, Index, UniqueConstraint, Enum as SQLEnum
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -33,6 +33,13 @@ class SubscriptionStatus(str, enum.Enum):
     TRIAL = "trial"
 
 
+class ReportJobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
 # Models
 class User(Base):
     """User model"""
@@ -101,12 +108,40 @@ class Question(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
     # Relationships
-    responses = relationship("UserResponse", back_populates="question")
+    responses = relationship(
+        "UserResponse", back_populates="question",
+        primaryjoin="foreign(UserResponse.question_id) == Question.id"
+    )
+    # Indexed copy of channels for filtering in SQL; written by set_channels()
+    channel_links = relationship("QuestionChannel", cascade="all, delete-orphan")
+    
+    def set_channels(self, channels):
+        """Set channels and keep the question_channels rows in step"""
+        existing = {link.channel: link for link in self.channel_links}
+        self.channels = channels
+        self.channel_links = [
+            existing.get(channel) or QuestionChannel(channel=channel)
+            for channel in dict.fromkeys(channels or [])
+        ]
     
     def __repr__(self):
         return f"<Question {self.id}>"
 
 
+class QuestionChannel(Base):
+    """One row per (question, channel); lets package filters run as an indexed lookup"""
+    __tablename__ = "question_channels"
+    __table_args__ = (
+        Index("ix_question_channels_channel", "channel", "question_id"),
+    )
+    
+    question_id = Column(String(36), ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    channel = Column(String(50), primary_key=True)
+    
+    def __repr__(self):
+        return f"<QuestionChannel {self.question_id} {self.channel}>"
+
+
 class Assessment(Base):
     """Assessment model - tracks user's assessment sessions"""
     __tablename__ = "assessments"
@@ -132,6 +167,8 @@ class Assessment(Base):
     overall_score = Column(Float)
     category_scores = Column(JSON)  # {"strategy": 85, "tech": 72, ...}
     channel_scores = Column(JSON)  # [{"channel": "ecommerce", "score": 80}, ...]
+    score_totals = Column(JSON)  # Running sums/counts, see score_aggregates.ScoreTotals
+    answers_revision = Column(Integer, default=0, nullable=False)  # Bumped by every answer save
     
     # AI Report
     report_generated = Column(Boolean, default=False)
@@ -152,11 +189,17 @@ class Assessment(Base):
 class UserResponse(Base):
     """User's answer to a specific question"""
     __tablename__ = "user_responses"
+    __table_args__ = (
+        # One answer per question per assessment; backs the bulk upsert
+        Index("uq_user_responses_assessment_question", "assessment_id", "question_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
     assessment_id = Column(String(36), ForeignKey("assessments.id"), nullable=False, index=True)
-    question_id = Column(String(36), ForeignKey("questions.id"), nullable=False, index=True)
+    # Not a foreign key: the frontend's built-in assessment (assessmentData.ts)
+    # answers with ids such as "s1" / "t1" that have no row in questions
+    question_id = Column(String(36), nullable=False, index=True)
     
     answer = Column(Integer, nullable=False)  # 1-5 rating
     
@@ -170,12 +213,83 @@ class UserResponse(Base):
     # Relationships
     user = relationship("User", back_populates="responses")
     assessment = relationship("Assessment", back_populates="responses")
-    question = relationship("Question", back_populates="responses")
+    question = relationship(
+        "Question", back_populates="responses",
+        primaryjoin="foreign(UserResponse.question_id) == Question.id"
+    )
     
     def __repr__(self):
         return f"<Response {self.id} - Q:{self.question_id} A:{self.answer}>"
 
 
+class ResponseStat(Base):
+    """
+    Running counters behind /stats for the SQL response store
+    
+    scope/name pairs: ("total", "users" | "assessments" | "responses"),
+    ("package_assessments" | "package_responses", package), ("day", "YYYY-MM-DD")
+    and ("user_assessments", user_id). Updated in the same transaction as the
+    responses they count.
+    """
+    __tablename__ = "response_stats"
+    
+    scope = Column(String(30), primary_key=True)
+    name = Column(String(64), primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f"<ResponseStat {self.scope}/{self.name}={self.value}>"
+
+
+class QuestionComment(Base):
+    """Precomputed AI comment for one question/answer/language (see comment_catalog)"""
+    __tablename__ = "question_comments"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    question_id = Column(String(36), ForeignKey("questions.id"), nullable=False, index=True)
+    language = Column(String(5), nullable=False)
+    answer = Column(Integer, nullable=False)  # 1-5 rating
+    
+    # Hash of the prompt inputs; a comment is only used while it matches the question
+    version = Column(String(64), nullable=False)
+    comment = Column(Text, nullable=False)
+    model = Column(String(50))
+    
+    created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint("question_id", "language", "answer", name="uq_question_comment"),
+    )
+    
+    def __repr__(self):
+        return f"<QuestionComment {self.question_id} {self.language} A:{self.answer}>"
+
+
+class ReportJob(Base):
+    """Queued report generation request (see report_jobs.ReportJobQueue)"""
+    __tablename__ = "report_jobs"
+    
+    id = Column(String(36), primary_key=True)
+    # Not a foreign key: the in-memory response store has no user rows
+    user_id = Column(String(36), nullable=False, index=True)
+    assessment_id = Column(String(36), nullable=False, index=True)
+    
+    status = Column(SQLEnum(ReportJobStatus), default=ReportJobStatus.QUEUED, nullable=False, index=True)
+    request = Column(JSON, nullable=False)  # AIAnalysisRequest fields
+    fingerprint = Column(String(64))  # Report inputs of an instant-report AI upgrade
+    result = Column(JSON)  # Same payload /report/generate returns
+    error = Column(Text)
+    attempts = Column(Integer, default=0)
+    
+    # Timing
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f"<ReportJob {self.id} - {self.status}>"
+
+
 class Subscription(Base):
     """Subscription and payment tracking"""
     __tablename__ = "subscriptions"
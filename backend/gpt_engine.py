@@ -1,28 +1,107 @@
-from openai import OpenAI
+import copy
 import os
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
+from llm_cache import InsightsCache, SingleFlight, cache_key, create_cache
+from llm_gateway import LLMGateway, llm_gateway
 
 load_dotenv()
 
+# Bump when the analysis prompt changes so cached analyses are not reused
+ANALYSIS_PROMPT_VERSION = "1"
+ANALYSIS_MODEL = "gpt-3.5-turbo"
+
+def quantize_scores(scores: Dict[str, float], step: float) -> Dict[str, float]:
+    """Round every score to the nearest multiple of step (e.g. 3.42 -> 3.4 for step 0.1)"""
+    return {name: round(round(value / step) * step, 4) for name, value in scores.items()}
+
+def competence_level(avg_score: float, language: str) -> str:
+    """Competence level for an average score on the 1-5 scale"""
+    if avg_score < 2.6:
+        return "Temel" if language == "tr" else "Basic"
+    if avg_score < 4.0:
+        return "Orta" if language == "tr" else "Intermediate"
+    return "İleri" if language == "tr" else "Advanced"
+
+def with_own_scores(analysis: Dict[str, Any], scores: Dict[str, float], language: str) -> Dict[str, Any]:
+    """
+    Put the caller's scores into a (possibly shared) analysis
+    
+    A cached or coalesced analysis was written for another score vector in
+    the same quantization bucket; only its narrative is meant to be shared,
+    so the level, overall score and category scores are rebuilt from scores.
+    """
+    avg_score = sum(scores.values()) / len(scores)
+    analysis["competence_level"] = competence_level(avg_score, language)
+    report = analysis.get("competence_report")
+    if not isinstance(report, dict):
+        report = analysis["competence_report"] = {}
+    report["overall_score"] = round(avg_score, 1)
+    report["category_scores"] = dict(scores)
+    return analysis
+
 class GPTAnalyzer:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(
+        self,
+        cache: Optional[InsightsCache] = None,
+        score_step: Optional[float] = None,
+        llm: LLMGateway = llm_gateway
+    ):
+        # Shared pooled client with retries and a circuit breaker
+        self.llm = llm
+        
+        # Analyses are cached by the quantized score vector and language;
+        # concurrent identical requests share one completion
+        self.cache = cache if cache is not None else create_cache("ANALYSIS", size=2048)
+        self.score_step = score_step or float(os.getenv("ANALYSIS_SCORE_STEP", "0.1"))
+        self.inflight = SingleFlight()
     
-    def analyze_competence(self, scores: Dict[str, float], language: str = "tr") -> Dict[str, Any]:
+    async def analyze_competence(self, scores: Dict[str, float], language: str = "tr") -> Dict[str, Any]:
         """
         Analyze e-export competence using GPT as E-İhracat Botu
+        
+        The cache key uses the scores quantized to score_step (plus the
+        level of the raw average), so nearby score vectors share one cached
+        analysis narrative; level and scores always come from the caller's
+        raw scores.
         """
+        return (await self.analyze_checked(scores, language))[0]
+    
+    async def analyze_checked(self, scores: Dict[str, float], language: str = "tr") -> Tuple[Dict[str, Any], bool]:
+        """analyze_competence plus whether the result is a real AI analysis (not a fallback)"""
+        # Only the key is quantized; a vector rounding across a level boundary still keys its own level
+        level = competence_level(sum(scores.values()) / len(scores), language)
+        key = cache_key(
+            ANALYSIS_PROMPT_VERSION, ANALYSIS_MODEL, str(language), level,
+            json.dumps(sorted(quantize_scores(scores, self.score_step).items()))
+        )
+        cached = await self.cache.get_async(key)
+        if cached is not None:
+            return with_own_scores(cached, scores, language), True
+        
+        result, complete = await self.inflight.do(key, lambda: self._analyze_and_cache(key, scores, language))
+        # Coalesced callers share the result; each gets its own copy with its own scores
+        return with_own_scores(copy.deepcopy(result), scores, language), complete
+    
+    async def _analyze_and_cache(
+        self, key: str, scores: Dict[str, float], language: str
+    ) -> Tuple[Dict[str, Any], bool]:
+        result, complete = await self._analyze(scores, language)
+        # Fallback answers are not cached so the next request retries the API
+        if complete:
+            await self.cache.put_async(key, result)
+        return result, complete
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "coalesced": self.inflight.coalesced, "in_flight": len(self.inflight)}
+    
+    async def _analyze(self, scores: Dict[str, float], language: str) -> Tuple[Dict[str, Any], bool]:
+        """Call the API; returns the analysis and whether it is a real (cacheable) one"""
         avg_score = sum(scores.values()) / len(scores)
         
         # Determine competence level
-        if avg_score < 2.6:
-            level = "Temel" if language == "tr" else "Basic"
-        elif avg_score < 4.0:
-            level = "Orta" if language == "tr" else "Intermediate"
-        else:
-            level = "İleri" if language == "tr" else "Advanced"
+        level = competence_level(avg_score, language)
         
         # Create prompt in the appropriate language
         if language == "tr":
@@ -125,8 +204,8 @@ Respond in English and provide specific, actionable recommendations for each cat
             """
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            response = await self.llm.chat(
+                model=ANALYSIS_MODEL,
                 messages=[
                     {"role": "system", "content": "You are E-İhracat Botu, an expert AI assistant for e-export competence analysis. Always respond with valid JSON only."},
                     {"role": "user", "content": prompt}
@@ -139,7 +218,7 @@ Respond in English and provide specific, actionable recommendations for each cat
             
             # Try to parse as JSON
             try:
-                return json.loads(result)
+                return json.loads(result), True
             except json.JSONDecodeError:
                 # If parsing fails, return a fallback structure
                 return {
@@ -165,7 +244,7 @@ Respond in English and provide specific, actionable recommendations for each cat
                         "long_term": ["Full service restoration"]
                     },
                     "training_recommendations": ["Please contact support for recommendations"]
-                }
+                }, False
                 
         except Exception as e:
             # Fallback response if OpenAI fails
@@ -192,4 +271,4 @@ Respond in English and provide specific, actionable recommendations for each cat
                     "long_term": ["Enable full AI analysis"]
                 },
                 "training_recommendations": ["Configure OpenAI API to access recommendations"]
-            }
\ No newline at end of file
+            }, False
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Write-behind buffer for users.last_login
+
+A successful login used to UPDATE and commit users.last_login right away,
+so a login storm queued up on the row locks and the SQLite WAL. The buffer
+keeps the newest timestamp per user in memory and a background task writes
+them every LAST_LOGIN_FLUSH_SECONDS as one executemany UPDATE in a single
+transaction; stop() flushes whatever is left on shutdown. The UPDATE only
+moves last_login forward, so several workers flushing in any order agree.
+"""
+import asyncio
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import bindparam, or_, update
+from database import SessionLocal
+from db_models import User
+from principal_cache import principal_cache
+
+LAST_LOGIN_UPDATE = (
+    update(User.__table__)
+    .where(User.__table__.c.id == bindparam("user_id"))
+    .where(or_(User.__table__.c.last_login.is_(None), User.__table__.c.last_login < bindparam("seen_at")))
+    .values(last_login=bindparam("seen_at"))
+)
+
+
+class LastLoginBuffer:
+    """Coalesces last_login timestamps per user and flushes them in bulk"""
+
+    def __init__(self, flush_seconds: float = 5.0, session_factory=SessionLocal):
+        self.flush_seconds = flush_seconds
+        self.session_factory = session_factory
+        self._pending: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.flush_seconds > 0
+
+    def record(self, user_id: str, seen_at: datetime) -> None:
+        """Remember a login; only the newest timestamp per user is kept"""
+        with self._lock:
+            current = self._pending.get(user_id)
+            if current is None or seen_at > current:
+                self._pending[user_id] = seen_at
+            self.recorded += 1
+
+    def flush(self) -> int:
+        """Write the buffered timestamps in one transaction; returns the number of users"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        try:
+            with self.session_factory() as db:
+                db.execute(LAST_LOGIN_UPDATE, [
+                    {"user_id": user_id, "seen_at": seen_at} for user_id, seen_at in batch.items()
+                ])
+                db.commit()
+        except Exception as e:
+            # Put them back (unless a newer login came in meanwhile) and retry next round
+            with self._lock:
+                for user_id, seen_at in batch.items():
+                    current = self._pending.get(user_id)
+                    if current is None or seen_at > current:
+                        self._pending[user_id] = seen_at
+            self.failures += 1
+            print(f"[AUTH] last_login flush failed ({len(batch)} users): {e}")
+            return 0
+
+        for user_id in batch:
+            principal_cache.invalidate(user_id)
+        self.flushes += 1
+        self.written += len(batch)
+        return len(batch)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await asyncio.to_thread(self.flush)
+
+    async def start(self):
+        """Start the periodic flush (call from the app's startup event)"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write what is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "flush_seconds": self.flush_seconds,
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "written": self.written,
+            "failures": self.failures
+        }
+
+
+def create_last_login_buffer() -> LastLoginBuffer:
+    """Build the buffer from LAST_LOGIN_FLUSH_SECONDS (0 writes each login immediately)"""
+    return LastLoginBuffer(flush_seconds=float(os.getenv("LAST_LOGIN_FLUSH_SECONDS", "5")))
+
+
+# Global instance
+last_login_buffer = create_last_login_buffer()
@@ -0,0 +1,282 @@
+"""
+Content-addressed cache for LLM results
+
+Entries are keyed by a SHA-256 of the normalized prompt input, the language
+and a prompt version, so identical report contexts reuse one completion.
+A bounded in-process LRU (with TTL) sits in front of an optional on-disk
+store that several workers can share (INSIGHTS_CACHE_DIR); coroutines use
+get_async/put_async so disk reads, writes and prunes stay off the event
+loop. SingleFlight lets concurrent identical requests share one in-flight
+completion.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+def normalize_context(text: str) -> str:
+    """Drop blank lines and collapse whitespace so formatting noise doesn't change the key"""
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def cache_key(*parts: str) -> str:
+    """SHA-256 hex digest of the given parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class LRUTTLCache:
+    """Thread-safe LRU map whose entries also expire after ttl_seconds"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    One JSON file per key under a shared directory
+
+    Writes go to a temporary file and are renamed into place, so concurrent
+    workers only ever see complete entries. Expired files are removed when
+    read and by a periodic prune.
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, directory: str, ttl_seconds: float = 86400):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self._puts = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - entry["stored_at"] > self.ttl_seconds:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry["value"]
+
+    def put(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"stored_at": time.time(), "value": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        self._puts += 1
+        if self._puts % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete expired entries; returns how many were removed"""
+        removed = 0
+        cutoff = time.time() - self.ttl_seconds
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+class InsightsCache:
+    """Memory LRU in front of an optional shared disk cache, with hit/miss counters"""
+
+    def __init__(self, memory: LRUTTLCache, disk: Optional[DiskCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value (a copy the caller may modify) or None"""
+        value = self.memory.get(key)
+        if value is None and self.disk:
+            value = self._disk_get(key)
+        return self._found(value)
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        """get() for coroutines: a memory miss reads the disk store in a worker thread"""
+        value = self.memory.get(key)
+        if value is None and self.disk:
+            value = await asyncio.to_thread(self._disk_get, key)
+        return self._found(value)
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value"""
+        value = self._remember(key, value)
+        if self.disk:
+            self._disk_put(key, value)
+
+    async def put_async(self, key: str, value: Any) -> None:
+        """put() for coroutines: the disk write (and its periodic prune) runs in a worker thread"""
+        value = self._remember(key, value)
+        if self.disk:
+            await asyncio.to_thread(self._disk_put, key, value)
+
+    def _disk_get(self, key: str) -> Optional[Any]:
+        try:
+            value = self.disk.get(key)
+        except Exception as e:
+            print(f"[CACHE] Disk read failed: {e}")
+            return None
+        if value is not None:
+            self.disk_hits += 1
+            self.memory.put(key, value)
+        return value
+
+    def _disk_put(self, key: str, value: Any) -> None:
+        try:
+            self.disk.put(key, value)
+        except Exception as e:
+            print(f"[CACHE] Disk write failed: {e}")
+
+    def _found(self, value: Optional[Any]) -> Optional[Any]:
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(value)
+
+    def _remember(self, key: str, value: Any) -> Any:
+        value = copy.deepcopy(value)
+        self.memory.put(key, value)
+        self.stores += 1
+        return value
+
+    def clear(self) -> None:
+        """Drop the in-memory entries (the disk store is left to its TTL)"""
+        self.memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "entries": len(self.memory),
+            "evictions": self.memory.evictions,
+            "disk_enabled": self.disk is not None
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution
+
+    The first caller starts the work as its own task; callers arriving while
+    it runs await the same task. A caller that gives up (e.g. the client
+    disconnected) does not cancel the work for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of fn(), shared with every concurrent call for the same key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Nobody may be left awaiting it; mark the exception as retrieved
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+def create_cache(prefix: str, size: int = 1024, ttl_seconds: float = 86400) -> InsightsCache:
+    """Build a cache from <prefix>_CACHE_SIZE / _TTL / _DIR environment variables"""
+    ttl_seconds = float(os.getenv(f"{prefix}_CACHE_TTL", str(ttl_seconds)))
+    memory = LRUTTLCache(
+        max_entries=int(os.getenv(f"{prefix}_CACHE_SIZE", str(size))),
+        ttl_seconds=ttl_seconds
+    )
+    directory = os.getenv(f"{prefix}_CACHE_DIR")
+    disk = DiskCache(directory, ttl_seconds=ttl_seconds) if directory else None
+    return InsightsCache(memory, disk)
+
+
+def create_insights_cache() -> InsightsCache:
+    """Build the insights cache from INSIGHTS_CACHE_* environment variables"""
+    return create_cache("INSIGHTS")
+
+
+# Global instance
+insights_cache = create_insights_cache()
@@ -0,0 +1,368 @@
+"""
+Shared gateway for every LLM call
+
+ReportService, GPTAnalyzer and the comment batch job all go through one
+LLMGateway, which provides:
+- one AsyncOpenAI client over a pooled keep-alive HTTP connection pool
+- a global limit on concurrent LLM calls (LLM_MAX_CONCURRENCY)
+- retries with full-jitter exponential backoff on connection errors,
+  timeouts, 429 and 5xx responses
+- a circuit breaker: after LLM_BREAKER_FAILURES consecutive failures calls
+  fail immediately with CircuitOpenError for LLM_BREAKER_RESET seconds, so
+  callers drop straight to their fallback instead of waiting out timeouts
+- opt-in hedging (LLM_HEDGE_ENABLED) for calls that pass hedge=<name>: if
+  the completion has not returned by the LLM_HEDGE_PERCENTILE latency of
+  earlier calls with that name, an identical second request is sent, the
+  first to finish wins and the other is cancelled; at most
+  LLM_HEDGE_MAX_RATIO of those calls are hedged
+- latency / failure / breaker / hedge metrics for /health
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+# Errors worth retrying; anything else (bad request, auth...) fails at once
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker
+
+    closed -> open after failure_threshold failures in a row; open ->
+    half_open after reset_timeout seconds, letting a single probe through;
+    the probe's outcome closes or re-opens it. A probe that never reports
+    back (e.g. cancelled) is replaced after another reset_timeout.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_started: Optional[float] = None
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+            self._probe_started = None
+        if self.state == "half_open":
+            now = time.monotonic()
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                return False
+            self._probe_started = now
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                print(f"[LLM] Circuit breaker opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+
+
+class LLMGateway:
+    """Pooled, rate-limited, retrying and circuit-broken access to the chat completions API"""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_concurrency: int = 16,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        timeout: float = 30.0,
+        breaker: Optional[CircuitBreaker] = None,
+        hedging: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_max_ratio: float = 0.05
+    ):
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_max_ratio = hedge_max_ratio
+
+        self.client: Optional[AsyncOpenAI] = None
+        if api_key:
+            try:
+                http_client = openai.DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=max_concurrency,
+                        max_keepalive_connections=max_concurrency,
+                        keepalive_expiry=60
+                    ),
+                    timeout=timeout
+                )
+                # Retries are ours (with jitter and the breaker), not the SDK's
+                self.client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+            except Exception as e:
+                print(f"Warning: Could not initialize OpenAI client: {e}")
+                self.client = None
+
+        # Metrics
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self._latencies_ms: deque = deque(maxlen=1024)
+        # Per hedge name: single-request latencies (seconds), calls seen, hedges sent/won
+        self._hedge_latencies: Dict[str, deque] = {}
+        self.hedge_calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def configured(self) -> bool:
+        return self.client is not None
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2^attempt)]"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _admit(self):
+        if not self.client:
+            raise RuntimeError("OpenAI client is not configured")
+        self.requests += 1
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError("LLM provider marked unhealthy; failing fast")
+
+    def _record(self, started: float, error: Optional[Exception] = None):
+        self._latencies_ms.append((time.perf_counter() - started) * 1000)
+        if error is None:
+            self.successes += 1
+            self.breaker.record_success()
+        else:
+            self.failures += 1
+            # Only provider trouble counts towards the breaker; a 4xx means it answered
+            if isinstance(error, RETRYABLE_ERRORS):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+    async def chat(self, hedge: Optional[str] = None, **kwargs) -> Any:
+        """
+        chat.completions.create(**kwargs) with the gateway's limits, retries and breaker
+
+        hedge names the kind of call (e.g. "insights") whose latencies set
+        the hedging deadline; it has no effect unless hedging is enabled.
+        """
+        self._admit()
+        if hedge and self.hedging:
+            return await self._hedged_call(hedge, kwargs)
+        return await self._call(kwargs)
+
+    # Hedging needs this many latency samples before it sets a deadline
+    HEDGE_MIN_SAMPLES = 20
+
+    def _hedge_deadline(self, name: str) -> Optional[float]:
+        """Seconds after which a call named `name` gets hedged (None until enough samples)"""
+        latencies = self._hedge_latencies.get(name)
+        if not latencies or len(latencies) < self.HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))]
+
+    def _hedge_allowed(self) -> bool:
+        """Hedges stay below hedge_max_ratio of the hedgeable calls"""
+        return self.hedges + 1 <= self.hedge_max_ratio * self.hedge_calls
+
+    async def _hedged_call(self, name: str, kwargs: Dict[str, Any]) -> Any:
+        self.hedge_calls += 1
+        latencies = self._hedge_latencies.setdefault(name, deque(maxlen=512))
+        started = time.perf_counter()
+
+        def record(task: asyncio.Task):
+            # Only completed successes: fast failures and primaries cancelled
+            # after losing a hedge would pull the percentile down
+            if not task.cancelled() and task.exception() is None:
+                latencies.append(time.perf_counter() - started)
+
+        primary = asyncio.ensure_future(self._call(kwargs))
+        primary.add_done_callback(record)
+        backup = None
+        try:
+            deadline = self._hedge_deadline(name)
+            if deadline is None:
+                return await asyncio.shield(primary)
+
+            done, _ = await asyncio.wait({primary}, timeout=deadline)
+            if done or not self._hedge_allowed() or self.breaker.state != "closed":
+                return await asyncio.shield(primary)
+
+            self.hedges += 1
+            backup = asyncio.ensure_future(self._call(kwargs))
+            pending = {primary, backup}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    if succeeded[0] is backup:
+                        self.hedge_wins += 1
+                    return succeeded[0].result()
+                # A failed request loses to one that may still succeed
+                if not pending:
+                    return done.pop().result()
+        finally:
+            for task in (primary, backup):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _call(self, kwargs: Dict[str, Any]) -> Any:
+        """One logical request: retries with backoff, recorded in the metrics"""
+        attempt = 0
+        # Latency covers the whole call, retries and backoff included
+        started = time.perf_counter()
+        while True:
+            try:
+                async with self._slots:
+                    self.in_flight += 1
+                    try:
+                        response = await self.client.chat.completions.create(**kwargs)
+                    finally:
+                        self.in_flight -= 1
+            except RETRYABLE_ERRORS as e:
+                if attempt < self.max_retries and self.breaker.state == "closed":
+                    attempt += 1
+                    self.retries += 1
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+                self._record(started, e)
+                raise
+            except Exception as e:
+                self._record(started, e)
+                raise
+            self._record(started)
+            return response
+
+    async def stream_chat(self, **kwargs) -> AsyncIterator[Any]:
+        """
+        Streamed completion chunks
+
+        Retries only happen before the first chunk arrives; a stream that
+        breaks midway raises to the caller.
+        """
+        self._admit()
+        attempt = 0
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                started = time.perf_counter()
+                while True:
+                    try:
+                        stream = await self.client.chat.completions.create(**kwargs, stream=True)
+                        break
+                    except RETRYABLE_ERRORS as e:
+                        if attempt < self.max_retries and self.breaker.state == "closed":
+                            attempt += 1
+                            self.retries += 1
+                            await asyncio.sleep(self._backoff(attempt))
+                            continue
+                        self._record(started, e)
+                        raise
+                    except Exception as e:
+                        self._record(started, e)
+                        raise
+
+                try:
+                    async for chunk in stream:
+                        yield chunk
+                except Exception as e:
+                    self._record(started, e)
+                    raise
+                self._record(started)
+            finally:
+                self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies_ms)
+
+        def pct(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))], 1)
+
+        hedging = {
+            "enabled": self.hedging,
+            "calls": self.hedge_calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "deadline_ms": {
+                name: round(deadline * 1000, 1) if deadline is not None else None
+                for name, deadline in ((name, self._hedge_deadline(name)) for name in self._hedge_latencies)
+            }
+        }
+        return {
+            "configured": self.configured,
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rejected_by_breaker": self.rejected,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "latency_ms": {"p50": pct(50), "p95": pct(95), "max": pct(100)},
+            "breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.failures,
+                "times_opened": self.breaker.times_opened
+            },
+            "hedging": hedging
+        }
+
+
+def create_llm_gateway() -> LLMGateway:
+    """Build the gateway from OPENAI_API_KEY and LLM_* environment variables"""
+    return LLMGateway(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30"))
+        ),
+        hedging=os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true",
+        hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+        hedge_max_ratio=float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.05"))
+    )
+
+
+# Global instance
+llm_gateway = create_llm_gateway()
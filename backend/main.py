@@ -1,7 +1,7 @@
-from fastapi import FastAPI, HTTPException, Header, Depends, UploadFile, File
+from fastapi import FastAPI, HTTPException, Header, Depends, UploadFile, File, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from models import (
@@ -9,12 +9,24 @@ from models import (
     SaveResponseRequest, AIAnalysisRequest, ComprehensiveReport
 )
 from gpt_engine import GPTAnalyzer
+from analysis_engine import analysis_engine, merge_ai_narrative
 from parasut_service import ParasutService
 from database_service import db_service
 from report_service import report_service
+from question_catalog import question_catalog
+from llm_cache import insights_cache
+from llm_gateway import llm_gateway
+from report_jobs import report_jobs
 from database import get_db, init_db
 from auth_service import auth_service
+from principal_cache import principal_cache
+from last_login_buffer import last_login_buffer
+from password_hasher import PasswordHasherBusy, password_hasher
 import os
+import json
+import time
+import asyncio
+import contextlib
 from dotenv import load_dotenv
 from typing import Optional, List, Dict
 import pandas as pd
@@ -40,6 +52,20 @@ async def startup_event():
         print("[STARTUP] Database initialized successfully")
     except Exception as e:
         print(f"[STARTUP] Database initialization failed: {e}")
+    
+    try:
+        await report_jobs.start(_run_report_job)
+    except Exception as e:
+        print(f"[STARTUP] Report job workers failed to start: {e}")
+    
+    await last_login_buffer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop report workers, write buffered last_login times and flush the response store (snapshots the WAL if enabled)"""
+    await report_jobs.stop()
+    await last_login_buffer.stop()
+    db_service.close()
 
 # Configure CORS
 app.add_middleware(
@@ -58,6 +84,11 @@ app.add_middleware(
 # Initialize GPT analyzer
 gpt_analyzer = GPTAnalyzer()
 
+# How long mode=hybrid waits for the AI narrative before answering with the local analysis
+ANALYZE_HYBRID_BUDGET = float(os.getenv("ANALYZE_HYBRID_BUDGET", "0.3"))
+# AI analyses that outlived the hybrid budget; referenced until they finish
+_background_analyses = set()
+
 # Initialize Paraşüt service
 parasut_service = ParasutService()
 
@@ -75,6 +106,13 @@ async def root():
 async def analyze_competence(scores: AssessmentScores):
     """
     Analyze e-export competence based on provided scores
+    
+    mode:
+    - ai (default): GPT analysis
+    - local: rule-based analysis, no LLM call
+    - hybrid: the local analysis, with the AI narrative merged in if it
+      arrives within ANALYZE_HYBRID_BUDGET; otherwise the AI call finishes
+      in the background and its cached result is used on the next request
     """
     try:
         # Extract scores and language
@@ -86,8 +124,13 @@ async def analyze_competence(scores: AssessmentScores):
             "analytics": scores.analytics
         }
         
+        if scores.mode == "local":
+            return {**analysis_engine.analyze(score_dict, scores.language), "source": "local"}
+        if scores.mode == "hybrid":
+            return await _hybrid_analysis(score_dict, scores.language)
+        
         # Get analysis from GPT
-        result = gpt_analyzer.analyze_competence(score_dict, scores.language)
+        result = await gpt_analyzer.analyze_competence(score_dict, scores.language)
         
         return result
         
@@ -97,6 +140,25 @@ async def analyze_competence(scores: AssessmentScores):
             detail=f"Analysis failed: {str(e)}"
         )
 
+async def _hybrid_analysis(score_dict: Dict[str, float], language: str) -> Dict:
+    """Local analysis, with the AI narrative merged in if it is ready within the budget"""
+    local = analysis_engine.analyze(score_dict, language)
+    task = asyncio.ensure_future(gpt_analyzer.analyze_checked(score_dict, language))
+    try:
+        ai, complete = await asyncio.wait_for(asyncio.shield(task), ANALYZE_HYBRID_BUDGET)
+    except asyncio.TimeoutError:
+        # Keep it running so the cached analysis is there for the next request
+        _background_analyses.add(task)
+        task.add_done_callback(_background_analyses.discard)
+        return {**local, "source": "local", "ai_pending": True}
+    except Exception as e:
+        print(f"[ANALYZE] AI analysis failed: {e}")
+        return {**local, "source": "local", "ai_pending": False}
+    
+    if not complete:
+        return {**local, "source": "local", "ai_pending": False}
+    return {**merge_ai_narrative(local, ai), "source": "hybrid", "ai_pending": False}
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
@@ -104,7 +166,13 @@ async def health_check():
         "api_status": "running",
         "openai_key_configured": bool(os.getenv("OPENAI_API_KEY")),
         "parasut_configured": bool(os.getenv("PARASUT_CLIENT_ID")),
-        "environment": os.getenv("ENV", "development")
+        "environment": os.getenv("ENV", "development"),
+        "insights_cache": insights_cache.stats(),
+        "analysis_cache": gpt_analyzer.stats(),
+        "llm_gateway": llm_gateway.stats(),
+        "password_hasher": password_hasher.stats(),
+        "principal_cache": principal_cache.stats(),
+        "last_login_buffer": last_login_buffer.stats()
     }
 
 @app.post("/invoice/create", response_model=InvoiceResponse)
@@ -234,10 +302,14 @@ async def get_current_user(
     if not user_id:
         raise HTTPException(status_code=401, detail="Geçersiz token")
     
-    user = auth_service.get_user_by_id(db, user_id)
+    # Cached snapshot of the user row; no query unless it expired or the user changed
+    user = principal_cache.get(user_id, lambda uid: auth_service.get_user_by_id(db, uid))
     if not user:
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
     
+    if user.is_active is False:
+        raise HTTPException(status_code=403, detail="Hesap devre dışı bırakılmış")
+    
     return user
 
 # ==================== Assessment Response Endpoints ====================
@@ -337,61 +409,302 @@ async def get_all_user_responses(
             detail=f"Failed to get user responses: {str(e)}"
         )
 
-# ==================== AI Report Generation Endpoints ====================
-
-@app.post("/report/generate", response_model=Dict)
-async def generate_report(request: AIAnalysisRequest):
+@app.get("/responses/{user_id}/{assessment_id}/progress")
+async def get_assessment_progress(
+    user_id: str,
+    assessment_id: str,
+    current_user = Depends(get_current_user)
+):
     """
-    Kullanıcının yanıtlarını analiz edip AI destekli kapsamlı rapor üret
+    Assessment ilerlemesi ve anlık skorlar (authentication gerekli)
     
-    Request body should include:
-    - user_id: User identifier
-    - assessment_id: Assessment identifier
-    - language: "tr" or "en"
-    - questions: Array of question objects from frontend
+    Skorlar yanıt kaydedilirken güncellenen toplamlardan okunur; yanıtlar yeniden taranmaz
     """
+    if user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Sadece kendi değerlendirmelerinizi görebilirsiniz")
+    
     try:
-        print(f"[REPORT] Starting report generation for user {request.user_id}, assessment {request.assessment_id}")
+        progress = db_service.get_progress(user_id, assessment_id)
+        if progress is None:
+            raise HTTPException(status_code=404, detail="Değerlendirme bulunamadı")
         
-        # Get user responses from database
-        user_responses = db_service.get_user_responses(
-            request.user_id, 
-            request.assessment_id
+        return {
+            "status": "success",
+            "user_id": user_id,
+            "assessment_id": assessment_id,
+            "progress": report_service.build_progress(progress)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get progress: {str(e)}"
         )
-        
-        if not user_responses:
-            print(f"[REPORT] No responses found for user {request.user_id}, assessment {request.assessment_id}")
+
+# ==================== AI Report Generation Endpoints ====================
+
+def _load_report_inputs(request: AIAnalysisRequest) -> Dict:
+    """
+    Responses, package, questions, running totals and fingerprint for a report request
+    
+    404 if there are no answers; 409 if the client's catalog_version is not
+    the server's current one; 503 if the question catalog could not be loaded.
+    """
+    # Questions come from the in-memory catalog unless the client still sends them
+    catalog_version, question_map = None, None
+    if not request.questions:
+        catalog_version, question_map = question_catalog.snapshot()
+        if catalog_version is None:
+            # Without the catalog no answer can be scored; the load is retried shortly
             raise HTTPException(
-                status_code=404,
-                detail="Bu değerlendirme için yanıt bulunamadı. Lütfen önce değerlendirmeyi tamamlayın."
+                status_code=503,
+                detail="Soru listesi şu anda yüklenemiyor. Lütfen biraz sonra tekrar deneyin."
             )
-        
-        print(f"[REPORT] Found {len(user_responses)} responses")
-        
-        # Determine package type from responses
-        package_type = user_responses[0].get("package_type", "combined")
-        print(f"[REPORT] Package type: {package_type}")
-        
-        # Generate comprehensive report
-        print(f"[REPORT] Generating AI report...")
-        report = report_service.generate_comprehensive_report(
+        if request.catalog_version and request.catalog_version != catalog_version:
+            raise HTTPException(
+                status_code=409,
+                detail={
+                    "message": "Soru listesi güncellendi. Lütfen soruları yeniden yükleyin.",
+                    "catalog_version": catalog_version
+                }
+            )
+    
+    # Get user responses from database
+    user_responses = db_service.get_user_responses(
+        request.user_id, 
+        request.assessment_id
+    )
+    
+    if not user_responses:
+        print(f"[REPORT] No responses found for user {request.user_id}, assessment {request.assessment_id}")
+        raise HTTPException(
+            status_code=404,
+            detail="Bu değerlendirme için yanıt bulunamadı. Lütfen önce değerlendirmeyi tamamlayın."
+        )
+    
+    print(f"[REPORT] Found {len(user_responses)} responses")
+    
+    # Determine package type from responses
+    package_type = user_responses[0].get("package_type", "combined")
+    print(f"[REPORT] Package type: {package_type}")
+    
+    # Without client-side questions, scores come from the running totals
+    score_totals = None
+    if not request.questions:
+        progress = db_service.get_progress(request.user_id, request.assessment_id)
+        # Totals built against another catalog load would split scores by stale categories
+        if progress and progress["totals"].catalog_version == catalog_version:
+            score_totals = progress["totals"]
+    
+    return {
+        "user_responses": user_responses,
+        "package_type": package_type,
+        "score_totals": score_totals,
+        "question_map": question_map,
+        "catalog_version": catalog_version,
+        # Same answers and question set as the stored report -> it can be reused
+        "fingerprint": report_service.report_fingerprint(
+            user_responses, request.questions or [], package_type, request.language,
+            score_totals, catalog_version
+        )
+    }
+
+def _stored_report(request: AIAnalysisRequest, fingerprint: str) -> Optional[Dict]:
+    """Stored report for the request if it was built from the same inputs (and force is off)"""
+    if request.force:
+        return None
+    stored = db_service.get_stored_report(request.user_id, request.assessment_id)
+    if stored and stored["fingerprint"] == fingerprint:
+        print(f"[REPORT] Returning stored report")
+        return stored["report"]
+    return None
+
+def _keep_report(request: AIAnalysisRequest, fingerprint: str, report: ComprehensiveReport) -> Dict:
+    """Serialize a generated report and store it for reuse"""
+    # Convert to dict for JSON serialization
+    report_dict = report.model_dump(mode='json')
+    
+    # Reports with fallback insights are not kept so the next request retries the AI
+    if not report.insights_fallback:
+        db_service.store_report(request.user_id, request.assessment_id, fingerprint, report_dict)
+    return report_dict
+
+async def _build_report_response(
+    request: AIAnalysisRequest,
+    llm_slots: Optional[asyncio.Semaphore] = None
+) -> Dict:
+    """Stored or freshly generated report payload; llm_slots caps concurrent generations"""
+    inputs = _load_report_inputs(request)
+    stored = _stored_report(request, inputs["fingerprint"])
+    if stored is not None:
+        return {
+            "status": "success",
+            "report": stored,
+            "cached": True,
+            "catalog_version": inputs["catalog_version"]
+        }
+    
+    # Generate comprehensive report
+    print(f"[REPORT] Generating AI report...")
+    async with llm_slots or contextlib.nullcontext():
+        report = await report_service.generate_comprehensive_report(
             user_id=request.user_id,
             assessment_id=request.assessment_id,
-            user_responses=user_responses,
+            user_responses=inputs["user_responses"],
             questions_data=request.questions or [],
-            package_type=package_type,
-            language=request.language
+            package_type=inputs["package_type"],
+            language=request.language,
+            score_totals=inputs["score_totals"],
+            question_map=inputs["question_map"]
         )
-        
-        print(f"[REPORT] Report generated successfully")
-        
-        # Convert to dict for JSON serialization
-        report_dict = report.model_dump(mode='json')
-        
+    
+    print(f"[REPORT] Report generated successfully")
+    
+    return {
+        "status": "success",
+        "report": _keep_report(request, inputs["fingerprint"], report),
+        "cached": False,
+        "catalog_version": inputs["catalog_version"]
+    }
+
+def _upgrade_failure(job: Optional[Dict]) -> Optional[str]:
+    """Why a finished report job left no AI report (failed or fallback insights), else None"""
+    if job is None:
+        return None
+    if job["status"] == "failed":
+        return job["error"] or "AI raporu üretilemedi"
+    report = (job["result"] or {}).get("report") or {}
+    if report.get("insights_fallback"):
+        return "AI içgörüleri üretilemedi; hazır içgörüler kullanıldı"
+    return None
+
+async def _instant_report_response(request: AIAnalysisRequest) -> Dict:
+    """
+    Report without waiting for the LLM
+    
+    Uses cached AI insights when there are some; otherwise the report
+    carries the fallback insights, is marked ai_pending and a background
+    job generates and stores the AI version. If that job already failed
+    for the same inputs within report_jobs.failed_retry_after, the report
+    comes back with ai_pending false and ai_error instead of a new job.
+    """
+    inputs = _load_report_inputs(request)
+    stored = _stored_report(request, inputs["fingerprint"])
+    if stored is not None:
         return {
             "status": "success",
-            "report": report_dict
+            "report": stored,
+            "cached": True,
+            "ai_pending": False,
+            "catalog_version": inputs["catalog_version"]
         }
+    
+    sections = report_service.compute_report_sections(
+        inputs["user_responses"],
+        request.questions or [],
+        request.language,
+        inputs["score_totals"],
+        inputs["question_map"]
+    )
+    insights, ai_pending = await report_service.instant_strategic_insights(
+        sections["low_scores"],
+        sections["channel_scores"],
+        sections["category_scores"],
+        request.language
+    )
+    job_id, ai_error = None, None
+    if ai_pending:
+        # One upgrade per assessment, however often the page is reloaded
+        job_id = report_jobs.find_active(request.user_id, request.assessment_id)
+        if job_id is None:
+            # A recent failed upgrade of the same inputs is reported, not queued again
+            ai_error = _upgrade_failure(report_jobs.last_finished(
+                request.user_id, request.assessment_id, inputs["fingerprint"],
+                within=report_jobs.failed_retry_after
+            ))
+            if ai_error:
+                ai_pending = False
+            else:
+                job_id = report_jobs.enqueue(request.user_id, request.assessment_id, request.model_dump(),
+                                             fingerprint=inputs["fingerprint"])
+                print(f"[REPORT] Instant report served, AI upgrade queued as job {job_id}")
+    
+    report = report_service.build_report(
+        request.user_id, request.assessment_id, inputs["package_type"], sections, insights, ai_pending
+    )
+    response = {
+        "status": "success",
+        # Only stored when the insights came from the cache (fallback reports never are)
+        "report": _keep_report(request, inputs["fingerprint"], report),
+        "cached": False,
+        "ai_pending": ai_pending,
+        "catalog_version": inputs["catalog_version"]
+    }
+    if job_id is not None:
+        response["job_id"] = job_id
+        response["status_url"] = f"/report/jobs/{job_id}"
+    if ai_error:
+        response["ai_error"] = ai_error
+    
+    return response
+
+async def _run_report_job(payload: Dict, llm_slots: asyncio.Semaphore) -> Dict:
+    """Body of a queued report job (see report_jobs)"""
+    request = AIAnalysisRequest(**payload)
+    print(f"[REPORT] Running report job for user {request.user_id}, assessment {request.assessment_id}")
+    return await _build_report_response(request, llm_slots)
+
+@app.post("/report/generate", response_model=Dict)
+async def generate_report(
+    request: AIAnalysisRequest,
+    run_async: bool = Query(False, alias="async"),
+    instant: bool = Query(False)
+):
+    """
+    Kullanıcının yanıtlarını analiz edip AI destekli kapsamlı rapor üret
+    
+    Request body should include:
+    - user_id: User identifier
+    - assessment_id: Assessment identifier
+    - language: "tr" or "en"
+    - questions: (eski) soru listesi; gönderilmezse sorular sunucudaki katalogdan okunur
+    - catalog_version: istemcinin gösterdiği katalog sürümü (GET /questions);
+      güncel değilse 409 döner
+    - force: true ise kayıtlı rapor yok sayılıp yeniden üretilir
+    
+    Yanıtlar ve soru seti son rapordan beri değişmediyse kayıtlı rapor döner
+    ("cached": true).
+    
+    ?async=1 ile rapor arka planda üretilir: yanıt hemen bir job_id döner,
+    sonuç GET /report/jobs/{job_id} ile alınır.
+    
+    ?instant=1 ile rapor LLM beklenmeden hemen döner. AI içgörüleri henüz
+    yoksa rapor hazır (fallback) içgörülerle "ai_pending": true olarak gelir;
+    AI sürümü arka planda üretilip kaydedilir ve GET /report/{user_id}/{assessment_id}
+    veya job_id üzerinden alınır.
+    Aynı yanıtlar için AI sürümü yakın zamanda üretilemediyse yeni iş
+    kuyruğa alınmaz; rapor "ai_pending": false ve ai_error ile döner.
+    """
+    if run_async:
+        try:
+            job_id = report_jobs.enqueue(request.user_id, request.assessment_id, request.model_dump())
+        except Exception as e:
+            print(f"[REPORT] Could not enqueue report job: {e}")
+            raise HTTPException(status_code=500, detail=f"Rapor işi oluşturulamadı: {str(e)}")
+        
+        print(f"[REPORT] Queued report job {job_id}")
+        return JSONResponse(status_code=202, content={
+            "status": "queued",
+            "job_id": job_id,
+            "status_url": f"/report/jobs/{job_id}"
+        })
+    
+    try:
+        print(f"[REPORT] Starting report generation for user {request.user_id}, assessment {request.assessment_id}")
+        if instant:
+            return await _instant_report_response(request)
+        return await _build_report_response(request)
         
     except HTTPException as he:
         print(f"[REPORT] HTTP Exception: {he.detail}")
@@ -405,6 +718,144 @@ async def generate_report(request: AIAnalysisRequest):
             detail=f"Rapor oluşturulurken hata: {str(e)}"
         )
 
+@app.get("/report/jobs/{job_id}")
+async def get_report_job(job_id: str):
+    """
+    Arka plan rapor işinin durumu
+    
+    status: queued | running | succeeded | failed. succeeded olduğunda
+    result alanı /report/generate yanıtının aynısıdır.
+    """
+    job = report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Rapor işi bulunamadı")
+    return {
+        "status": "success",
+        "job": job
+    }
+
+@app.get("/report/{user_id}/{assessment_id}")
+async def get_stored_report(user_id: str, assessment_id: str):
+    """
+    Değerlendirme için kaydedilmiş son AI raporu
+    
+    ai_pending: true ise AI raporu hâlâ arka planda üretiliyor; report alanı
+    varsa bir önceki kayıtlı rapordur.
+    
+    Son AI işi başarısız olduysa (ya da yalnızca hazır içgörüler üretebildiyse)
+    ai_pending false döner, ai_error nedeni içerir; kayıtlı rapor yoksa report
+    alanı işin ürettiği fallback rapordur.
+    """
+    stored = db_service.get_stored_report(user_id, assessment_id)
+    job_id = report_jobs.find_active(user_id, assessment_id)
+    
+    report, ai_error = stored["report"] if stored else None, None
+    if job_id is None:
+        last_job = report_jobs.last_finished(user_id, assessment_id)
+        # A job whose report was stored afterwards did not fail the client
+        if last_job and (stored is None or last_job["fingerprint"] != stored["fingerprint"]):
+            ai_error = _upgrade_failure(last_job)
+            if ai_error and report is None:
+                report = (last_job["result"] or {}).get("report")
+    
+    if stored is None and job_id is None and ai_error is None:
+        raise HTTPException(status_code=404, detail="Bu değerlendirme için kayıtlı rapor bulunamadı")
+    response = {
+        "status": "success",
+        "report": report,
+        "ai_pending": job_id is not None,
+        "job_id": job_id
+    }
+    if ai_error:
+        response["ai_error"] = ai_error
+    return response
+
+def _sse(event: str, data) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/report/generate/stream")
+async def generate_report_stream(request: AIAnalysisRequest):
+    """
+    /report/generate ile aynı rapor, Server-Sent Events olarak akış halinde
+    
+    Olaylar sırasıyla:
+    - scores: genel, kanal ve kategori skorları (hemen)
+    - question_analyses: soru bazlı yorumlar
+    - insights_delta: LLM metni geldikçe parça parça ({"text": ...})
+    - report: ayrıştırılmış içgörülerle tam rapor (/report/generate yanıtıyla aynı)
+    - error: üretim sırasında hata olursa
+    
+    Kayıtlı rapor kullanılabiliyorsa doğrudan report olayı gönderilir.
+    """
+    print(f"[REPORT] Starting streamed report for user {request.user_id}, assessment {request.assessment_id}")
+    
+    # Missing answers are reported as a normal 404 before the stream starts
+    inputs = _load_report_inputs(request)
+    stored = _stored_report(request, inputs["fingerprint"])
+    
+    async def events():
+        if stored is not None:
+            yield _sse("report", {
+                "status": "success",
+                "report": stored,
+                "cached": True,
+                "catalog_version": inputs["catalog_version"]
+            })
+            return
+        
+        try:
+            sections = report_service.compute_report_sections(
+                inputs["user_responses"],
+                request.questions or [],
+                request.language,
+                inputs["score_totals"],
+                inputs["question_map"]
+            )
+            yield _sse("scores", {
+                "user_id": request.user_id,
+                "assessment_id": request.assessment_id,
+                "package_type": inputs["package_type"],
+                "overall_score": sections["overall_score"],
+                "channel_scores": [cs.model_dump() for cs in sections["channel_scores"]],
+                "category_scores": sections["category_scores"]
+            })
+            yield _sse("question_analyses", [
+                qa.model_dump() for qa in sections["question_analyses"]
+            ])
+            
+            insights = None
+            async for kind, value in report_service.stream_strategic_insights(
+                sections["low_scores"],
+                sections["channel_scores"],
+                sections["category_scores"],
+                request.language
+            ):
+                if kind == "delta":
+                    yield _sse("insights_delta", {"text": value})
+                else:
+                    insights = value
+            
+            report = report_service.build_report(
+                request.user_id, request.assessment_id, inputs["package_type"], sections, insights
+            )
+            yield _sse("report", {
+                "status": "success",
+                "report": _keep_report(request, inputs["fingerprint"], report),
+                "cached": False,
+                "catalog_version": inputs["catalog_version"]
+            })
+            print(f"[REPORT] Streamed report generated successfully")
+        except Exception as e:
+            print(f"[REPORT] Error streaming report: {str(e)}")
+            yield _sse("error", {"detail": f"Rapor oluşturulurken hata: {str(e)}"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ==================== Authentication Endpoints ====================
 
 # Request/Response Models
@@ -424,6 +875,15 @@ class LoginResponse(BaseModel):
     token: str
     message: str
 
+def _auth_busy() -> HTTPException:
+    """503 for when the password hashing queue is full"""
+    print(f"[AUTH] Password hashing queue full, rejecting request")
+    return HTTPException(
+        status_code=503,
+        detail="Sunucu şu anda yoğun, lütfen birkaç saniye sonra tekrar deneyin",
+        headers={"Retry-After": "1"}
+    )
+
 @app.post("/auth/register")
 async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     """
@@ -432,6 +892,14 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     try:
         print(f"[AUTH] Registration attempt for {request.email}")
         
+        # Reject duplicates before spending a bcrypt hash on them
+        # (create_user checks again for a concurrent registration)
+        if auth_service.get_user_by_email(db, request.email):
+            raise ValueError("User with this email already exists")
+        
+        # bcrypt runs on the hashing pool, not the event loop
+        password_hash = await auth_service.hash_password_async(request.password)
+        
         # Create user
         user = auth_service.create_user(
             db=db,
@@ -439,7 +907,8 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
             password=request.password,
             name=request.name,
             company_name=request.company,
-            phone=request.phone
+            phone=request.phone,
+            password_hash=password_hash
         )
         
         # Create JWT token
@@ -457,6 +926,8 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except PasswordHasherBusy:
+        raise _auth_busy()
     except Exception as e:
         print(f"[AUTH] Registration error: {e}")
         raise HTTPException(status_code=500, detail=f"Kayıt sırasında hata: {str(e)}")
@@ -469,8 +940,8 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
     try:
         print(f"[AUTH] Login attempt for {request.email}")
         
-        # Authenticate user
-        user = auth_service.authenticate_user(db, request.email, request.password)
+        # Authenticate user (bcrypt check on the hashing pool)
+        user = await auth_service.authenticate_user_async(db, request.email, request.password)
         
         if not user:
             raise HTTPException(status_code=401, detail="Email veya şifre yanlış")
@@ -490,6 +961,8 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
         
     except HTTPException as he:
         raise he
+    except PasswordHasherBusy:
+        raise _auth_busy()
     except Exception as e:
         print(f"[AUTH] Login error: {e}")
         raise HTTPException(status_code=500, detail=f"Giriş sırasında hata: {str(e)}")
@@ -599,13 +1072,47 @@ async def upgrade_user_package(
         print(f"[ADMIN] Upgrade error: {e}")
         raise HTTPException(status_code=500, detail=f"Paket güncelleme hatası: {str(e)}")
 
+@app.post("/admin/deactivate-user")
+async def deactivate_user(
+    email: str,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Admin: Kullanıcı hesabını devre dışı bırak
+    Requires: email
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Sadece admin kullanıcılar hesap kapatabilir")
+    
+    user = auth_service.get_user_by_email(db, email)
+    if not user:
+        raise HTTPException(status_code=404, detail=f"Kullanıcı bulunamadı: {email}")
+    if user.id == current_user.id:
+        raise HTTPException(status_code=400, detail="Kendi hesabınızı devre dışı bırakamazsınız")
+    
+    try:
+        updated_user = auth_service.deactivate_user(db, user.id)
+    except Exception as e:
+        print(f"[ADMIN] Deactivate error: {e}")
+        raise HTTPException(status_code=500, detail=f"Hesap kapatma hatası: {str(e)}")
+    
+    print(f"[ADMIN] User {email} deactivated")
+    
+    return {
+        "message": f"Kullanıcı {email} devre dışı bırakıldı",
+        "user": auth_service.user_to_dict(updated_user)
+    }
+
 @app.get("/stats")
-async def get_stats():
+async def get_stats(days: int = 30):
     """
     Genel istatistikler - admin için
+    
+    Paket ve gün bazlı kırılımlar dahil; `days` son kaç günün gösterileceğini belirler
     """
     try:
-        stats = db_service.get_stats()
+        stats = db_service.get_stats(days=days)
         return {
             "status": "success",
             "stats": stats
@@ -616,9 +1123,67 @@ async def get_stats():
             detail=f"Failed to get stats: {str(e)}"
         )
 
+@app.post("/admin/assessments/rescore")
+def rescore_assessments(
+    completed_only: bool = True,
+    include_results: bool = False,
+    current_user = Depends(get_current_user)
+):
+    """
+    Admin: Kayıtlı tüm değerlendirmeleri güncel soru setiyle yeniden puanla
+    
+    Tüm değerlendirmeler tek bir vektörel geçişte puanlanır (cohort_scoring)
+    ve saklanan skor toplamları güncellenir. Puanlama ve tüm kayıtların
+    okunup yazılması uzun sürdüğünden endpoint senkron tanımlıdır; FastAPI
+    onu thread pool'da çalıştırır, event loop bloklanmaz.
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Sadece admin erişebilir")
+    
+    try:
+        started = time.perf_counter()
+        catalog_version, question_map = question_catalog.snapshot()
+        assessments = [
+            assessment for assessment in db_service.iter_assessments()
+            if not completed_only or len(assessment["question_ids"]) >= (
+                question_catalog.count_for_package(assessment["package_type"]) or 1
+            )
+        ]
+        results = report_service.score_assessments(
+            assessments, list(question_map.values()), details=include_results
+        )
+        for result in results:
+            result["totals"].catalog_version = catalog_version
+        updated = db_service.replace_totals(results)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        print(f"[ADMIN] Rescored {len(results)} assessments in {elapsed_ms} ms ({updated} updated)")
+        
+        response = {
+            "status": "success",
+            "rescored": len(results),
+            "updated": updated,
+            "elapsed_ms": elapsed_ms
+        }
+        if include_results:
+            response["results"] = [
+                {
+                    "user_id": result["user_id"],
+                    "assessment_id": result["assessment_id"],
+                    "package_type": result["package_type"],
+                    "overall_score": result["overall_score"],
+                    "channel_scores": [cs.model_dump() for cs in result["channel_scores"]],
+                    "category_scores": result["category_scores"]
+                }
+                for result in results
+            ]
+        return response
+    except Exception as e:
+        print(f"[ADMIN] Rescore error: {e}")
+        raise HTTPException(status_code=500, detail=f"Yeniden puanlama hatası: {str(e)}")
+
 # ==================== Question Management Endpoints ====================
 
-from db_models import Question, UserRole, PlanType
+from db_models import Question, QuestionChannel, UserRole, PlanType
 import uuid
 
 class QuestionCreate(BaseModel):
@@ -663,11 +1228,10 @@ async def get_all_questions(
         if category:
             query = query.filter(Question.category == category)
         
-        questions = query.order_by(Question.order).all()
-        
-        # Filter by package type if specified
         if package_type:
-            questions = [q for q in questions if package_type in (q.channels or [])]
+            query = query.join(QuestionChannel).filter(QuestionChannel.channel == package_type)
+        
+        questions = query.order_by(Question.order).all()
         
         return {
             "status": "success",
@@ -708,15 +1272,16 @@ async def create_question(
             question_text_tr=question_data.question_text_tr,
             question_text_en=question_data.question_text_en,
             category=question_data.category,
-            channels=question_data.channels,
             is_free_trial_question=question_data.is_free_trial_question,
             order=question_data.order,
             is_active=True
         )
+        question.set_channels(question_data.channels)
         
         db.add(question)
         db.commit()
         db.refresh(question)
+        question_catalog.invalidate()
         
         return {
             "status": "success",
@@ -760,7 +1325,7 @@ async def update_question(
         if question_data.category is not None:
             question.category = question_data.category
         if question_data.channels is not None:
-            question.channels = question_data.channels
+            question.set_channels(question_data.channels)
         if question_data.is_free_trial_question is not None:
             question.is_free_trial_question = question_data.is_free_trial_question
         if question_data.order is not None:
@@ -770,6 +1335,7 @@ async def update_question(
         
         db.commit()
         db.refresh(question)
+        question_catalog.invalidate()
         
         return {
             "status": "success",
@@ -810,6 +1376,7 @@ async def delete_question(
         # Soft delete
         question.is_active = False
         db.commit()
+        question_catalog.invalidate()
         
         return {
             "status": "success",
@@ -953,11 +1520,11 @@ async def bulk_import_questions(
                     question_text_tr=str(row['question_text_tr']),
                     question_text_en=str(row['question_text_en']),
                     category=str(row['category']),
-                    channels=channels,
                     is_free_trial_question=is_free_trial,
                     order=int(row['order']),
                     is_active=True
                 )
+                question.set_channels(channels)
                 
                 db.add(question)
                 success_count += 1
@@ -969,6 +1536,7 @@ async def bulk_import_questions(
         # Commit all successful insertions
         try:
             db.commit()
+            question_catalog.invalidate()
         except Exception as e:
             db.rollback()
             raise HTTPException(status_code=500, detail=f"Veritabanı hatası: {str(e)}")
@@ -990,41 +1558,25 @@ async def bulk_import_questions(
 async def get_questions_for_package(
     package_type: str,
     language: str = "tr",
-    db: Session = Depends(get_db)
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Public: Belirli bir paket için soruları getir
+    
+    Gövde soru kataloğunda paket başına bir kez üretilir (her iki dil de içinde);
+    If-None-Match ETag ile eşleşirse 304 döner
     """
-    try:
-        questions = db.query(Question).filter(
-            Question.is_active == True
-        ).order_by(Question.order).all()
-        
-        # Filter by package type
-        filtered_questions = [
-            q for q in questions 
-            if package_type in (q.channels or [])
-        ]
-        
-        return {
-            "status": "success",
-            "questions": [
-                {
-                    "id": q.id,
-                    "text": {
-                        "tr": q.question_text_tr,
-                        "en": q.question_text_en
-                    },
-                    "categoryId": q.category,
-                    "channels": q.channels,
-                    "order": q.order
-                }
-                for q in filtered_questions
-            ],
-            "count": len(filtered_questions)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Sorular getirilemedi: {str(e)}")
+    etag, body = question_catalog.package_questions(package_type)
+    if etag is None:
+        raise HTTPException(status_code=500, detail="Sorular getirilemedi")
+    
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
 
 if __name__ == "__main__":
     import uvicorn
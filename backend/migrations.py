@@ -0,0 +1,177 @@
+"""
+Idempotent schema migrations applied on startup
+
+Base.metadata.create_all() only creates missing tables; it never adds
+indexes or columns to tables that already exist. Each migration below runs
+once per database and is recorded in the schema_migrations table.
+"""
+import json
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("id", String(100), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _index_names(conn: Connection, table_name: str) -> set:
+    """Names of the indexes currently defined on a table"""
+    return {ix["name"] for ix in inspect(conn).get_indexes(table_name)}
+
+
+def _user_responses_unique_answer(conn: Connection) -> None:
+    """Keep one answer per (assessment_id, question_id) and enforce it with a unique index"""
+    if "uq_user_responses_assessment_question" in _index_names(conn, "user_responses"):
+        return
+
+    # Older rows may contain duplicates; keep the most recent one
+    conn.execute(text(
+        "DELETE FROM user_responses WHERE id NOT IN ("
+        "SELECT max_id FROM (SELECT MAX(id) AS max_id FROM user_responses "
+        "GROUP BY assessment_id, question_id) AS latest)"
+    ))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX uq_user_responses_assessment_question "
+        "ON user_responses (assessment_id, question_id)"
+    ))
+
+
+def _assessments_score_totals(conn: Connection) -> None:
+    """Add the running score totals column to assessments"""
+    columns = {column["name"] for column in inspect(conn).get_columns("assessments")}
+    if "score_totals" not in columns:
+        conn.execute(text("ALTER TABLE assessments ADD COLUMN score_totals JSON"))
+
+
+def _question_channels(conn: Connection) -> None:
+    """Create the question_channels mapping and fill it from questions.channels"""
+    if "question_channels" not in inspect(conn).get_table_names():
+        conn.execute(text(
+            "CREATE TABLE question_channels ("
+            "question_id VARCHAR(36) NOT NULL REFERENCES questions (id) ON DELETE CASCADE, "
+            "channel VARCHAR(50) NOT NULL, "
+            "PRIMARY KEY (question_id, channel))"
+        ))
+    if "ix_question_channels_channel" not in _index_names(conn, "question_channels"):
+        conn.execute(text(
+            "CREATE INDEX ix_question_channels_channel ON question_channels (channel, question_id)"
+        ))
+
+    # JSON comes back as text on SQLite and decoded on Postgres
+    rows = []
+    for question_id, channels in conn.execute(text("SELECT id, channels FROM questions")):
+        if isinstance(channels, str):
+            channels = json.loads(channels)
+        for channel in dict.fromkeys(channels or []):
+            rows.append({"question_id": question_id, "channel": channel})
+
+    conn.execute(text("DELETE FROM question_channels"))
+    if rows:
+        conn.execute(text(
+            "INSERT INTO question_channels (question_id, channel) VALUES (:question_id, :channel)"
+        ), rows)
+
+
+def _assessments_answers_revision(conn: Connection) -> None:
+    """Add the per-assessment answer revision that guards score rewrites"""
+    columns = {column["name"] for column in inspect(conn).get_columns("assessments")}
+    if "answers_revision" not in columns:
+        conn.execute(text("ALTER TABLE assessments ADD COLUMN answers_revision INTEGER NOT NULL DEFAULT 0"))
+
+
+def _report_jobs_fingerprint(conn: Connection) -> None:
+    """Add the report fingerprint that ties AI upgrade jobs to their inputs"""
+    columns = {column["name"] for column in inspect(conn).get_columns("report_jobs")}
+    if "fingerprint" not in columns:
+        conn.execute(text("ALTER TABLE report_jobs ADD COLUMN fingerprint VARCHAR(64)"))
+
+
+def _response_stats(conn: Connection) -> None:
+    """Create the /stats counters of the SQL response store and fill them from the current rows"""
+    if "response_stats" not in inspect(conn).get_table_names():
+        conn.execute(text(
+            "CREATE TABLE response_stats ("
+            "scope VARCHAR(30) NOT NULL, "
+            "name VARCHAR(64) NOT NULL, "
+            "value INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (scope, name))"
+        ))
+
+    rows = []
+    for name, query in (
+        ("users", "SELECT COUNT(DISTINCT user_id) FROM assessments"),
+        ("assessments", "SELECT COUNT(*) FROM assessments"),
+        ("responses", "SELECT COUNT(*) FROM user_responses"),
+    ):
+        rows.append({"scope": "total", "name": name, "value": conn.execute(text(query)).scalar() or 0})
+    # package_type holds the PlanType member name; its value is the lower-case name
+    for scope, query in (
+        ("package_assessments", "SELECT package_type, COUNT(*) FROM assessments GROUP BY package_type"),
+        ("package_responses", "SELECT a.package_type, COUNT(*) FROM user_responses r "
+                              "JOIN assessments a ON a.id = r.assessment_id GROUP BY a.package_type"),
+    ):
+        rows.extend({"scope": scope, "name": package.lower(), "value": count}
+                    for package, count in conn.execute(text(query)))
+    rows.extend({"scope": "day", "name": str(day), "value": count} for day, count in conn.execute(text(
+        "SELECT DATE(updated_at), COUNT(*) FROM user_responses WHERE updated_at IS NOT NULL GROUP BY DATE(updated_at)"
+    )))
+    rows.extend({"scope": "user_assessments", "name": user_id, "value": count} for user_id, count in conn.execute(
+        text("SELECT user_id, COUNT(*) FROM assessments GROUP BY user_id")
+    ))
+
+    conn.execute(text("DELETE FROM response_stats"))
+    conn.execute(text("INSERT INTO response_stats (scope, name, value) VALUES (:scope, :name, :value)"), rows)
+
+
+def _user_responses_drop_question_fk(conn: Connection) -> None:
+    """Let responses reference question ids that are not in the questions table"""
+    # SQLite never enforced it (foreign_keys pragma is off) and can't drop it in place
+    if conn.dialect.name == "sqlite":
+        return
+    for foreign_key in inspect(conn).get_foreign_keys("user_responses"):
+        if foreign_key["referred_table"] == "questions" and foreign_key["name"]:
+            conn.execute(text(f'ALTER TABLE user_responses DROP CONSTRAINT "{foreign_key["name"]}"'))
+
+
+# Ordered list of (migration_id, migration_function)
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_user_responses_unique_answer", _user_responses_unique_answer),
+    ("0002_assessments_score_totals", _assessments_score_totals),
+    ("0003_question_channels", _question_channels),
+    ("0004_assessments_answers_revision", _assessments_answers_revision),
+    ("0005_report_jobs_fingerprint", _report_jobs_fingerprint),
+    ("0006_response_stats", _response_stats),
+    ("0007_user_responses_drop_question_fk", _user_responses_drop_question_fk),
+]
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """Apply pending migrations and return the ids that were applied"""
+    schema_migrations.create(bind=engine, checkfirst=True)
+
+    with engine.connect() as conn:
+        applied = {row[0] for row in conn.execute(schema_migrations.select())}
+
+    newly_applied = []
+    for migration_id, migration in MIGRATIONS:
+        if migration_id in applied:
+            continue
+
+        with engine.begin() as conn:
+            migration(conn)
+            conn.execute(schema_migrations.insert().values(
+                id=migration_id,
+                applied_at=datetime.utcnow()
+            ))
+
+        print(f"[MIGRATION] Applied {migration_id}")
+        newly_applied.append(migration_id)
+
+    return newly_applied
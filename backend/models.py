@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Literal, Optional, List
 from datetime import datetime
 
 class AssessmentScores(BaseModel):
@@ -9,6 +9,8 @@ class AssessmentScores(BaseModel):
     logistics: float
     analytics: float
     language: Optional[str] = "tr"
+    # local: rule-based only; ai: LLM only; hybrid: local now, AI narrative merged if it arrives in time
+    mode: Literal["local", "ai", "hybrid"] = "ai"
 
 class CompetenceReport(BaseModel):
     overall_score: float
@@ -83,7 +85,9 @@ class AIAnalysisRequest(BaseModel):
     user_id: str
     assessment_id: str
     language: str = "tr"
-    questions: Optional[List[Dict[str, Any]]] = None  # Frontend sends questions data
+    questions: Optional[List[Dict[str, Any]]] = None  # Legacy: omit to use the server's question catalog
+    catalog_version: Optional[str] = None  # Catalog version the client shows; 409 if it is stale
+    force: bool = False  # Regenerate even if a stored report matches the answers
 
 class QuestionAnalysis(BaseModel):
     question_id: str
@@ -111,4 +115,6 @@ class ComprehensiveReport(BaseModel):
     weaknesses: List[str]
     recommendations: List[str]
     action_plan: Dict[str, List[str]]
+    insights_fallback: bool = False  # True when strengths/weaknesses are the non-AI defaults
+    ai_pending: bool = False  # Fallback insights served while the AI ones are generated in the background
     generated_at: datetime
@@ -0,0 +1,78 @@
+"""
+Bounded thread pool for bcrypt
+
+A bcrypt hash or verify costs ~250 ms of CPU. Run inline in an async
+endpoint it blocks the event loop, so a burst of logins stalls every other
+request on the worker. PasswordHasher runs them on a fixed pool of threads
+(bcrypt releases the GIL, so they use separate cores) and rejects new work
+with PasswordHasherBusy once too many calls are waiting, so a login flood
+gets fast 503s instead of an ever-growing queue.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from passlib.context import CryptContext
+
+# Password hashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full; the caller should answer 503"""
+
+
+class PasswordHasher:
+    """bcrypt hash/verify on a fixed thread pool with a limit on queued calls"""
+
+    def __init__(self, workers: int = 4, max_pending: int = 64, context: CryptContext = pwd_context):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.context = context
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy("Password hashing queue is full")
+            self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self.context.verify, password, hashed)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+
+def create_password_hasher() -> PasswordHasher:
+    """Build the hasher from PASSWORD_HASH_* environment variables"""
+    workers = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+    return PasswordHasher(
+        workers=workers,
+        max_pending=int(os.getenv("PASSWORD_HASH_QUEUE", str(workers * 16)))
+    )
+
+
+# Global instance
+password_hasher = create_password_hasher()
@@ -0,0 +1,103 @@
+"""
+In-process cache of authenticated principals
+
+get_current_user used to SELECT the user row on every authenticated
+request. PrincipalCache keeps a detached snapshot of the row (without the
+password hash and tokens) per token subject for a short TTL, so those
+requests only touch the database for their own work. AuthService drops the
+entry whenever it changes a user (plan update, admin promotion,
+deactivation, login); the TTL bounds how stale another worker's copy can be.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+from llm_cache import LRUTTLCache
+from db_models import User
+
+# Columns that never leave the database row
+PRIVATE_COLUMNS = {"password_hash", "verification_token", "reset_token", "reset_token_expires"}
+
+
+class Principal:
+    """Read-only copy of a User's public columns; works with auth_service.user_to_dict"""
+
+    __slots__ = tuple(column.key for column in User.__table__.columns if column.key not in PRIVATE_COLUMNS)
+
+    def __init__(self, user: User):
+        for name in self.__slots__:
+            object.__setattr__(self, name, getattr(user, name))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Principal is read-only; update the User row through auth_service")
+
+    def __repr__(self) -> str:
+        return f"Principal(id={self.id!r}, email={self.email!r}, role={self.role!r})"
+
+
+class PrincipalCache:
+    """Bounded LRU of Principals keyed by user id, with explicit invalidation"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 30):
+        self.enabled = max_entries > 0 and ttl_seconds > 0
+        self._cache = LRUTTLCache(max_entries=max(max_entries, 1), ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a load that overlapped one is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str, load: Callable[[str], Optional[User]]) -> Optional[Principal]:
+        """Cached principal for user_id, calling load(user_id) on a miss"""
+        if self.enabled:
+            principal = self._cache.get(user_id)
+            if principal is not None:
+                self.hits += 1
+                return principal
+        self.misses += 1
+
+        generation = self._generation
+        user = load(user_id)
+        if user is None:
+            return None
+        principal = Principal(user)
+        if self.enabled:
+            with self._lock:
+                if generation == self._generation:
+                    self._cache.put(user_id, principal)
+        return principal
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cache.pop(user_id)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._cache),
+            "max_entries": self._cache.max_entries,
+            "ttl_seconds": self._cache.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self._cache.evictions
+        }
+
+
+def create_principal_cache() -> PrincipalCache:
+    """Build the cache from PRINCIPAL_CACHE_* environment variables (size or TTL 0 disables it)"""
+    return PrincipalCache(
+        max_entries=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+        ttl_seconds=float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+    )
+
+
+# Global instance
+principal_cache = create_principal_cache()
@@ -0,0 +1,194 @@
+"""
+In-memory catalog of active questions
+
+Loaded from the questions table and reused by the response stores and
+report generation to resolve a question_id to its text, category and
+channels. Admin endpoints call invalidate() after changing questions so the
+next lookup reloads; other worker processes pick the change up when their
+copy is reloaded, every refresh_seconds (QUESTION_CATALOG_REFRESH).
+
+Every load is stamped with a version (a hash of the loaded questions), so
+clients can tell whether the questions they show match the server's. The
+public GET /questions body of each package is encoded once per load, with
+a strong ETag, so that endpoint only writes out bytes.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from database import SessionLocal
+from db_models import Question
+
+
+def load_active_questions() -> List[Dict]:
+    """Read active questions from the database in display order"""
+    with SessionLocal() as db:
+        questions = db.query(Question).filter(
+            Question.is_active == True
+        ).order_by(Question.order).all()
+        return [
+            {
+                "id": q.id,
+                "text": {
+                    "tr": q.question_text_tr,
+                    "en": q.question_text_en
+                },
+                "categoryId": q.category,
+                "channels": q.channels or [],
+                "order": q.order
+            }
+            for q in questions
+        ]
+
+
+def catalog_version(questions: List[Dict]) -> str:
+    """Short content hash of a question list; equal lists give equal versions on every worker"""
+    payload = json.dumps(questions, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_package_questions(questions: List[Dict], package_type: str,
+                             version: Optional[str]) -> Tuple[str, bytes]:
+    """(etag, JSON body) of GET /questions for one package"""
+    selected = [q for q in questions if package_type in q["channels"]]
+    body = json.dumps({
+        "status": "success",
+        "questions": selected,
+        "count": len(selected),
+        # Send back as catalog_version with /report/generate
+        "catalog_version": version
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"', body
+
+
+class QuestionCatalog:
+    """Lazily loaded {question_id: question} map with per-package counts and encoded lists"""
+
+    def __init__(self, loader: Callable[[], List[Dict]] = load_active_questions, retry_seconds: float = 5.0,
+                 refresh_seconds: float = 60):
+        self.loader = loader
+        self.retry_seconds = retry_seconds
+        # Changes made through another worker's admin endpoints show up after this long (0: never)
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        # After a failed load, lookups return nothing until this monotonic time
+        self._retry_at = 0.0
+        # The loaded questions are read again from the database after this monotonic time
+        self._refresh_at = 0.0
+        self._questions: Optional[Dict[str, Dict]] = None
+        self._package_counts: Dict[str, int] = {}
+        self._packages: Dict[str, Tuple[str, bytes]] = {}
+        self._version: Optional[str] = None
+
+    def _ensure_loaded(self) -> Dict[str, Dict]:
+        questions = self._questions
+        if questions is not None and time.monotonic() < self._refresh_at:
+            return questions
+
+        with self._lock:
+            if self._questions is not None and time.monotonic() < self._refresh_at:
+                return self._questions
+            if self._questions is None and time.monotonic() < self._retry_at:
+                return {}
+            try:
+                loaded = self.loader()
+            except Exception as e:
+                if self._questions is not None:
+                    # A failed refresh keeps serving the previous load
+                    self._refresh_at = time.monotonic() + self.retry_seconds
+                    print(f"[CATALOG] Could not refresh questions (retrying in {self.retry_seconds:g}s): {e}")
+                    return self._questions
+                # Back off so saves (and WAL replay before init_db) don't hit the DB every time
+                self._retry_at = time.monotonic() + self.retry_seconds
+                print(f"[CATALOG] Could not load questions (retrying in {self.retry_seconds:g}s): {e}")
+                return {}
+
+            self._refresh_at = (
+                time.monotonic() + self.refresh_seconds if self.refresh_seconds > 0 else float("inf")
+            )
+            version = catalog_version(loaded)
+            if self._questions is not None and version == self._version:
+                # Unchanged: keep the map (and the encoded bodies and ETags built from it)
+                return self._questions
+
+            package_counts: Dict[str, int] = {}
+            for question in loaded:
+                for channel in question["channels"]:
+                    package_counts[channel] = package_counts.get(channel, 0) + 1
+
+            self._package_counts = package_counts
+            self._version = version
+            self._packages = {
+                package_type: encode_package_questions(loaded, package_type, version)
+                for package_type in package_counts
+            }
+            self._questions = {q["id"]: q for q in loaded}
+            return self._questions
+
+    def _current(self) -> Optional[Tuple[str, Dict[str, Dict], Dict[str, Tuple[str, bytes]]]]:
+        """(version, question_map, encoded packages) of one load, or None if loading failed"""
+        # invalidate() can land between the load and taking the lock; load again then
+        for _ in range(3):
+            questions = self._ensure_loaded()
+            with self._lock:
+                if self._questions is questions:
+                    return self._version, questions, self._packages
+        return None
+
+    def get(self, question_id: str) -> Optional[Dict]:
+        """Question dict (frontend shape) or None if unknown"""
+        return self._ensure_loaded().get(question_id)
+
+    def questions(self) -> List[Dict]:
+        """All active questions in display order"""
+        return list(self._ensure_loaded().values())
+
+    def question_map(self) -> Dict[str, Dict]:
+        """The cached {question_id: question} map itself; callers must not modify it"""
+        return self._ensure_loaded()
+
+    def version(self) -> Optional[str]:
+        """Version stamp of the loaded questions (None if they could not be loaded)"""
+        return self.snapshot()[0]
+
+    def snapshot(self) -> Tuple[Optional[str], Dict[str, Dict]]:
+        """(version, question_map) of the same load; (None, {}) if the load failed"""
+        current = self._current()
+        if current is None:
+            return None, {}
+        return current[0], current[1]
+
+    def package_questions(self, package_type: str) -> Tuple[Optional[str], bytes]:
+        """(etag, encoded GET /questions body) for a package; etag is None if the load failed"""
+        current = self._current()
+        if current is None:
+            return None, b""
+        version, _, packages = current
+        encoded = packages.get(package_type)
+        if encoded is not None:
+            return encoded
+        # Package without questions; package_type comes from the client, so it isn't kept
+        return encode_package_questions([], package_type, version)
+
+    def count_for_package(self, package_type: str) -> int:
+        """Number of active questions in a package"""
+        self._ensure_loaded()
+        return self._package_counts.get(package_type, 0)
+
+    def invalidate(self):
+        """Drop the cached questions and encoded lists; the next lookup reloads them"""
+        with self._lock:
+            self._questions = None
+            self._package_counts = {}
+            self._packages = {}
+            self._version = None
+            self._retry_at = 0.0
+
+
+# Global instance
+question_catalog = QuestionCatalog(
+    retry_seconds=float(os.getenv("QUESTION_CATALOG_RETRY_SECONDS", "5")),
+    refresh_seconds=float(os.getenv("QUESTION_CATALOG_REFRESH", "60"))
+)
@@ -0,0 +1,271 @@
+"""
+Background job queue for report generation
+
+POST /report/generate?async=1 stores a ReportJob row and returns its id
+right away. A fixed pool of asyncio workers runs the jobs, with a separate
+cap on how many may wait on the LLM at once; GET /report/jobs/{id} reports
+the status and, once finished, the result.
+
+Jobs live in the report_jobs table, so queued jobs - and running jobs whose
+worker died - are picked up again after a restart or by another worker
+process polling the table. A conditional UPDATE claims each job, so only
+one worker runs it.
+
+Instant-report AI upgrades carry the report fingerprint. When one fails or
+only produces fallback insights, last_finished() lets the API report that
+instead of queuing the same upgrade again on every reload, until
+failed_retry_after has passed.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import and_, or_, select, update
+from database import SessionLocal
+from db_models import ReportJob, ReportJobStatus
+
+# runner(request_fields, llm_slots) -> result payload
+JobRunner = Callable[[Dict, asyncio.Semaphore], Awaitable[Dict]]
+
+
+class ReportJobQueue:
+    """SQL-backed report jobs executed by a fixed pool of asyncio workers"""
+
+    def __init__(self, session_factory=SessionLocal, workers: int = 4, max_llm_calls: int = 4,
+                 stale_after: float = 300, poll_interval: float = 5.0, max_attempts: int = 3,
+                 failed_retry_after: float = 300):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.max_llm_calls = max_llm_calls
+        # A running job not finished after this long is assumed abandoned
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        # An upgrade that failed is not queued again for the same inputs before this
+        self.failed_retry_after = failed_retry_after
+
+        self.runner: Optional[JobRunner] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._llm_slots: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _abandoned(self):
+        """Running jobs whose worker stopped before finishing them"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        return and_(ReportJob.status == ReportJobStatus.RUNNING, ReportJob.started_at < cutoff)
+
+    def enqueue(self, user_id: str, assessment_id: str, request: Dict,
+                fingerprint: Optional[str] = None) -> str:
+        """Persist a job and hand it to the local workers; returns the job id"""
+        job_id = str(uuid.uuid4())
+        with self.session_factory() as session:
+            session.add(ReportJob(
+                id=job_id,
+                user_id=user_id,
+                assessment_id=assessment_id,
+                status=ReportJobStatus.QUEUED,
+                request=request,
+                fingerprint=fingerprint,
+                attempts=0,
+                created_at=datetime.utcnow()
+            ))
+            session.commit()
+
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+        return job_id
+
+    def find_active(self, user_id: str, assessment_id: str) -> Optional[str]:
+        """Id of a queued or running job for the assessment, if any"""
+        with self.session_factory() as session:
+            return session.execute(
+                select(ReportJob.id)
+                .where(ReportJob.user_id == user_id)
+                .where(ReportJob.assessment_id == assessment_id)
+                .where(ReportJob.status.in_([ReportJobStatus.QUEUED, ReportJobStatus.RUNNING]))
+                .order_by(ReportJob.created_at.desc())
+                .limit(1)
+            ).scalar()
+
+    def last_finished(self, user_id: str, assessment_id: str, fingerprint: Optional[str] = None,
+                      within: Optional[float] = None) -> Optional[Dict]:
+        """
+        Most recently finished job for the assessment (see get), or None
+
+        fingerprint limits it to upgrades of those report inputs, within to
+        jobs finished in the last `within` seconds.
+        """
+        query = (
+            select(ReportJob)
+            .where(ReportJob.user_id == user_id)
+            .where(ReportJob.assessment_id == assessment_id)
+            .where(ReportJob.status.in_([ReportJobStatus.SUCCEEDED, ReportJobStatus.FAILED]))
+        )
+        if fingerprint is not None:
+            query = query.where(ReportJob.fingerprint == fingerprint)
+        if within is not None:
+            query = query.where(ReportJob.finished_at >= datetime.utcnow() - timedelta(seconds=within))
+        with self.session_factory() as session:
+            job = session.execute(query.order_by(ReportJob.finished_at.desc()).limit(1)).scalar()
+            return self._to_dict(job) if job is not None else None
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job status (and result once finished) or None if unknown"""
+        with self.session_factory() as session:
+            job = session.get(ReportJob, job_id)
+            if job is None:
+                return None
+            return self._to_dict(job)
+
+    @staticmethod
+    def _to_dict(job: ReportJob) -> Dict:
+        return {
+            "id": job.id,
+            "user_id": job.user_id,
+            "assessment_id": job.assessment_id,
+            "status": job.status.value,
+            "attempts": job.attempts,
+            "fingerprint": job.fingerprint,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+            "error": job.error,
+            "result": job.result
+        }
+
+    def _pending_ids(self) -> List[str]:
+        """Queued jobs plus abandoned running ones, oldest first"""
+        with self.session_factory() as session:
+            # Give up on jobs that keep dying with their worker
+            session.execute(
+                update(ReportJob)
+                .where(self._abandoned())
+                .where(ReportJob.attempts >= self.max_attempts)
+                .values(status=ReportJobStatus.FAILED, finished_at=datetime.utcnow(),
+                        error="Job abandoned too many times")
+            )
+            session.commit()
+            return list(session.execute(
+                select(ReportJob.id)
+                .where(or_(ReportJob.status == ReportJobStatus.QUEUED, self._abandoned()))
+                .order_by(ReportJob.created_at)
+            ).scalars())
+
+    def _claim(self, job_id: str) -> Optional[Dict]:
+        """Mark a job running and return its request, or None if another worker has it"""
+        with self.session_factory() as session:
+            result = session.execute(
+                update(ReportJob)
+                .where(ReportJob.id == job_id)
+                .where(or_(ReportJob.status == ReportJobStatus.QUEUED, self._abandoned()))
+                .values(status=ReportJobStatus.RUNNING, started_at=datetime.utcnow(),
+                        attempts=ReportJob.attempts + 1)
+            )
+            session.commit()
+            if result.rowcount != 1:
+                return None
+            return session.execute(
+                select(ReportJob.request).where(ReportJob.id == job_id)
+            ).scalar_one()
+
+    def _finish(self, job_id: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        with self.session_factory() as session:
+            session.execute(
+                update(ReportJob)
+                .where(ReportJob.id == job_id)
+                .values(
+                    status=ReportJobStatus.FAILED if error else ReportJobStatus.SUCCEEDED,
+                    result=result,
+                    error=error,
+                    finished_at=datetime.utcnow()
+                )
+            )
+            session.commit()
+
+    def _requeue(self, job_id: str):
+        """Hand an interrupted job back to the queue (e.g. on shutdown)"""
+        with self.session_factory() as session:
+            session.execute(
+                update(ReportJob)
+                .where(ReportJob.id == job_id)
+                .where(ReportJob.status == ReportJobStatus.RUNNING)
+                .values(status=ReportJobStatus.QUEUED, started_at=None)
+            )
+            session.commit()
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                request = self._claim(job_id)
+                if request is None:
+                    continue
+
+                try:
+                    result = await self.runner(request, self._llm_slots)
+                except asyncio.CancelledError:
+                    self._requeue(job_id)
+                    raise
+                except Exception as e:
+                    print(f"[JOBS] Job {job_id} failed: {e}")
+                    self._finish(job_id, error=str(e))
+                else:
+                    self._finish(job_id, result=result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Database trouble; the job stays queued/running and is retried later
+                print(f"[JOBS] Worker error on job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _poll(self):
+        """Pick up jobs enqueued by other processes or abandoned by a dead worker"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._queue.empty():
+                continue
+            try:
+                for job_id in self._pending_ids():
+                    self._queue.put_nowait(job_id)
+            except Exception as e:
+                print(f"[JOBS] Poll failed: {e}")
+
+    async def start(self, runner: JobRunner):
+        """Start the workers (call from the app's startup event)"""
+        self.runner = runner
+        self._queue = asyncio.Queue()
+        self._llm_slots = asyncio.Semaphore(self.max_llm_calls)
+
+        pending = self._pending_ids()
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._poll()))
+        print(f"[JOBS] {self.workers} report workers started ({len(pending)} pending jobs)")
+
+    async def stop(self):
+        """Cancel the workers; jobs they were running go back to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+
+def create_report_job_queue() -> ReportJobQueue:
+    """Build the job queue from REPORT_JOB_* environment variables"""
+    workers = int(os.getenv("REPORT_JOB_WORKERS", "4"))
+    return ReportJobQueue(
+        workers=workers,
+        max_llm_calls=int(os.getenv("REPORT_JOB_MAX_LLM_CALLS", str(workers))),
+        stale_after=float(os.getenv("REPORT_JOB_STALE_SECONDS", "300")),
+        poll_interval=float(os.getenv("REPORT_JOB_POLL_SECONDS", "5")),
+        failed_retry_after=float(os.getenv("REPORT_JOB_FAILED_RETRY_SECONDS", "300"))
+    )
+
+
+# Global instance
+report_jobs = create_report_job_queue()
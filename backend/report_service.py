@@ -2,22 +2,37 @@
 AI-Powered Comprehensive Report Generation Service
 Generates detailed analysis with AI comments for each question
 """
-import os
-from typing import Dict, List, Any
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from datetime import datetime
-from openai import OpenAI
 from models import ComprehensiveReport, QuestionAnalysis, ChannelScore
+from score_aggregates import ScoreTotals, percentage, question_category, question_channels
+from cohort_scoring import score_cohort
+from llm_cache import InsightsCache, cache_key, insights_cache, normalize_context
+from comment_catalog import COMMENT_MODEL, CommentCatalog, comment_catalog
+from llm_gateway import LLMGateway, llm_gateway
+
+# Bump when the insights prompts or parsing change so cached results are not reused
+INSIGHTS_PROMPT_VERSION = "1"
+INSIGHTS_MODEL = "gpt-4o-mini"
+# Bump when the report layout or scoring changes so stored reports are regenerated
+REPORT_FORMAT_VERSION = "1"
 
 class ReportService:
-    def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.client = None
-        if self.api_key:
-            try:
-                self.client = OpenAI(api_key=self.api_key)
-            except Exception as e:
-                print(f"Warning: Could not initialize OpenAI client: {e}")
-                self.client = None
+    def __init__(
+        self,
+        cache: Optional[InsightsCache] = insights_cache,
+        comments: Optional[CommentCatalog] = comment_catalog,
+        llm: LLMGateway = llm_gateway
+    ):
+        # Shared async client with pooling, retries and a circuit breaker;
+        # while the breaker is open calls fail fast to the fallback insights
+        self.llm = llm
+        
+        # Identical insight contexts reuse one completion (see llm_cache)
+        self.insights_cache = cache
+        # Per-answer comments are precomputed offline (see comment_catalog)
+        self.comments = comments
         
         # Channel and category mappings
         self.channel_names = {
@@ -33,68 +48,210 @@ class ReportService:
             "logistics": "Lojistik ve Operasyon",
             "analytics": "Analitik ve Veri Yönetimi"
         }
+        
+        # Indexed by cohort_scoring level (lowest first), names as in _score_level
+        self.level_names = ["Başlangıç", "Orta", "İleri", "Uzman"]
     
-    def generate_comprehensive_report(
+    async def generate_comprehensive_report(
         self, 
         user_id: str,
         assessment_id: str,
         user_responses: List[Dict],
         questions_data: List[Dict],
         package_type: str,
-        language: str = "tr"
+        language: str = "tr",
+        score_totals: Optional[ScoreTotals] = None,
+        question_map: Optional[Dict[str, Dict]] = None
     ) -> ComprehensiveReport:
-        """Generate a comprehensive AI-powered report"""
-        
-        # Create question map for easy lookup
-        question_map = {q["id"]: q for q in questions_data}
+        """
+        Generate a comprehensive AI-powered report
         
-        # Calculate scores
-        channel_scores = self._calculate_channel_scores(user_responses, questions_data, package_type)
-        category_scores = self._calculate_category_scores(user_responses, questions_data)
-        overall_score = self._calculate_overall_score(user_responses)
-        
-        # Generate AI analysis for each question
-        question_analyses = self._generate_question_analyses(
-            user_responses, 
-            question_map, 
-            language
+        When complete running totals are passed (see score_aggregates), the
+        overall, channel and category scores are read from them instead of
+        being recomputed from the responses. A prebuilt question_map (e.g.
+        the server-side question catalog) replaces questions_data.
+        """
+        sections = self.compute_report_sections(
+            user_responses, questions_data, language, score_totals, question_map
         )
         
         # Generate strategic insights
-        insights = self._generate_strategic_insights(
-            user_responses,
-            question_map,
-            channel_scores,
-            category_scores,
+        insights = await self._generate_strategic_insights(
+            sections["low_scores"],
+            sections["channel_scores"],
+            sections["category_scores"],
             language
         )
         
-        # Create comprehensive report
-        report = ComprehensiveReport(
+        return self.build_report(user_id, assessment_id, package_type, sections, insights)
+    
+    def compute_report_sections(
+        self,
+        user_responses: List[Dict],
+        questions_data: List[Dict],
+        language: str = "tr",
+        score_totals: Optional[ScoreTotals] = None,
+        question_map: Optional[Dict[str, Dict]] = None
+    ) -> Dict[str, Any]:
+        """Scores and per-question analyses, i.e. every part of the report but the LLM insights"""
+        
+        # Create question map for easy lookup (unless the catalog's is passed in)
+        if question_map is None:
+            question_map = {q["id"]: q for q in questions_data}
+        
+        # One pass resolves every response to its question; it also scores
+        # them unless complete running totals already hold the scores
+        use_totals = score_totals is not None and score_totals.is_complete
+        scoring = self._score_responses(user_responses, question_map, with_totals=not use_totals)
+        if not use_totals:
+            score_totals = scoring["totals"]
+        
+        return {
+            "overall_score": self._overall_score_from_totals(score_totals),
+            "channel_scores": self.channel_scores_from_totals(score_totals),
+            "category_scores": self.category_scores_from_totals(score_totals),
+            # Generate AI analysis for each question
+            "question_analyses": self._generate_question_analyses(scoring["resolved"], language),
+            # Input for the strategic insights prompt
+            "low_scores": scoring["low_scores"]
+        }
+    
+    def build_report(
+        self,
+        user_id: str,
+        assessment_id: str,
+        package_type: str,
+        sections: Dict[str, Any],
+        insights: Dict[str, Any],
+        ai_pending: bool = False
+    ) -> ComprehensiveReport:
+        """Assemble the report from compute_report_sections() output and the insights"""
+        return ComprehensiveReport(
             user_id=user_id,
             assessment_id=assessment_id,
             package_type=package_type,
-            overall_score=overall_score,
-            channel_scores=channel_scores,
-            category_scores=category_scores,
-            question_analyses=question_analyses,
+            overall_score=sections["overall_score"],
+            channel_scores=sections["channel_scores"],
+            category_scores=sections["category_scores"],
+            question_analyses=sections["question_analyses"],
             strengths=insights["strengths"],
             weaknesses=insights["weaknesses"],
             recommendations=insights["recommendations"],
             action_plan=insights["action_plan"],
+            insights_fallback=insights.get("fallback", False),
+            ai_pending=ai_pending,
             generated_at=datetime.now()
         )
+    
+    def report_fingerprint(
+        self,
+        user_responses: List[Dict],
+        questions_data: List[Dict],
+        package_type: str,
+        language: str,
+        score_totals: Optional[ScoreTotals] = None,
+        catalog_version: Optional[str] = None
+    ) -> str:
+        """
+        Hash of everything a report is built from
         
-        return report
+        Answers are taken in question order so save order doesn't matter. When
+        no question set is sent the questions come from the server catalog
+        (identified by its version) and the scores from the store's running
+        totals, so those stand in for it. The comment catalog version is
+        included so reports are rebuilt once the offline job rewrites the
+        per-answer comments.
+        """
+        answers = sorted((resp["question_id"], resp["answer"]) for resp in user_responses)
+        if questions_data:
+            question_set = json.dumps(questions_data, sort_keys=True, ensure_ascii=False)
+        else:
+            question_set = json.dumps({
+                "catalog_version": catalog_version,
+                "totals": score_totals.to_dict() if score_totals is not None else None
+            }, sort_keys=True)
+        comments_version = self.comments.version if self.comments is not None else None
+        return cache_key(
+            REPORT_FORMAT_VERSION, INSIGHTS_PROMPT_VERSION, package_type, language,
+            json.dumps(answers, ensure_ascii=False), question_set, comments_version or ""
+        )
+    
+    def _score_responses(
+        self,
+        responses: List[Dict],
+        question_map: Dict[str, Dict],
+        with_totals: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Single scoring pass over the responses
+        
+        Returns the score totals, the (response, question) pairs that resolved
+        to a known question and the low-scoring (question, answer) pairs used
+        for the insights prompt. with_totals=False skips the score sums
+        ("totals" is None) when the caller already has them.
+        """
+        if not with_totals:
+            resolved = []
+            low_scores = []
+            for resp in responses:
+                question = question_map.get(resp["question_id"])
+                if not question:
+                    continue
+                resolved.append((resp, question))
+                if resp["answer"] <= 2:
+                    low_scores.append((question, resp["answer"]))
+            return {"totals": None, "resolved": resolved, "low_scores": low_scores}
+        
+        totals = ScoreTotals()
+        categories = totals.categories
+        channels = totals.channels
+        answer_sum = 0
+        resolved = []
+        low_scores = []
+        
+        # Accumulators are inlined (rather than ScoreTotals.add) to keep the loop tight
+        for resp in responses:
+            answer = resp["answer"]
+            answer_sum += answer
+            question = question_map.get(resp["question_id"])
+            if not question:
+                continue
+            
+            resolved.append((resp, question))
+            if answer <= 2:
+                low_scores.append((question, answer))
+            
+            category = categories.get(question_category(question))
+            if category is None:
+                category = categories[question_category(question)] = [0, 0]
+            category[0] += answer
+            category[1] += 1
+            for channel_id in question_channels(question):
+                channel = channels.get(channel_id)
+                if channel is None:
+                    channel = channels[channel_id] = [0, 0]
+                channel[0] += answer
+                channel[1] += 1
+        
+        totals.answer_sum = answer_sum
+        totals.answer_count = len(responses)
+        totals.resolved_count = len(resolved)
+        
+        return {
+            "totals": totals,
+            "resolved": resolved,
+            "low_scores": low_scores
+        }
+    
+    def _overall_score_from_totals(self, totals: ScoreTotals) -> float:
+        """Overall score over all responses, including unresolved ones"""
+        if not totals.answer_count:
+            return 0.0
+        return percentage(totals.answer_sum, totals.answer_count)
     
     def _calculate_overall_score(self, responses: List[Dict]) -> float:
         """Calculate overall score from all responses"""
-        if not responses:
-            return 0.0
-        
-        total_score = sum(resp["answer"] for resp in responses)
-        max_score = len(responses) * 5
-        return round((total_score / max_score) * 100, 2)
+        return self._overall_score_from_totals(self._score_responses(responses, {})["totals"])
     
     def _calculate_channel_scores(
         self, 
@@ -104,47 +261,116 @@ class ReportService:
     ) -> List[ChannelScore]:
         """Calculate scores for each channel"""
         question_map = {q["id"]: q for q in questions}
-        channel_scores_dict = {}
+        return self.channel_scores_from_totals(
+            self._score_responses(responses, question_map)["totals"]
+        )
+    
+    def _score_level(self, percentage: float) -> str:
+        """Competence level for a percentage score"""
+        if percentage >= 80:
+            return "Uzman"
+        elif percentage >= 60:
+            return "İleri"
+        elif percentage >= 40:
+            return "Orta"
+        return "Başlangıç"
+    
+    def _make_channel_score(self, channel: str, score: float, count: int) -> ChannelScore:
+        """Build a ChannelScore from an answer sum and count"""
+        channel_percentage = percentage(score, count)
+        return ChannelScore(
+            channel=self.channel_names.get(channel, channel.title()),
+            score=score,
+            max_score=count * 5,
+            percentage=channel_percentage,
+            level=self._score_level(channel_percentage)
+        )
+    
+    def channel_scores_from_totals(self, totals: ScoreTotals) -> List[ChannelScore]:
+        """Channel scores from running totals in O(channels)"""
+        return [
+            self._make_channel_score(channel, score, count)
+            for channel, (score, count) in totals.channels.items()
+        ]
+    
+    def category_scores_from_totals(self, totals: ScoreTotals) -> Dict[str, float]:
+        """Category percentages (display names) from running totals in O(categories)"""
+        return {
+            self.category_names.get(category, category.title()): percentage(score, count)
+            for category, (score, count) in totals.categories.items()
+        }
+    
+    def score_assessments(
+        self,
+        assessments: List[Dict],
+        questions_data: List[Dict],
+        details: bool = True
+    ) -> List[Dict]:
+        """
+        Score many assessments in one vectorized pass (see cohort_scoring)
         
-        for resp in responses:
-            question = question_map.get(resp["question_id"])
-            if not question:
+        Each assessment needs 'question_ids' and 'answers' in the order the
+        answers were saved; its other keys are copied to the result. Scores
+        and levels are identical to generate_comprehensive_report's. With
+        details=False only overall_score and the running totals are built.
+        """
+        scores = score_cohort(
+            [(a["question_ids"], a["answers"]) for a in assessments],
+            questions_data
+        )
+        
+        overall_scores = scores.overall_percentage.tolist()
+        overall_counts = scores.overall_count.tolist()
+        
+        results = []
+        for row, assessment in enumerate(assessments):
+            result = {
+                key: value for key, value in assessment.items()
+                if key not in ("question_ids", "answers")
+            }
+            result["overall_score"] = (
+                round(overall_scores[row], 2) if overall_counts[row] else 0.0
+            )
+            result["totals"] = scores.totals(row)
+            if not details:
+                results.append(result)
                 continue
             
-            channels = question.get("channels", ["general"])
-            for channel in channels:
-                if channel not in channel_scores_dict:
-                    channel_scores_dict[channel] = {"score": 0, "count": 0}
-                
-                channel_scores_dict[channel]["score"] += resp["answer"]
-                channel_scores_dict[channel]["count"] += 1
-        
-        # Convert to ChannelScore objects
-        channel_scores = []
-        for channel, data in channel_scores_dict.items():
-            max_score = data["count"] * 5
-            score = data["score"]
-            percentage = round((score / max_score) * 100, 2) if max_score > 0 else 0
-            
-            # Determine level
-            if percentage >= 80:
-                level = "Uzman"
-            elif percentage >= 60:
-                level = "İleri"
-            elif percentage >= 40:
-                level = "Orta"
-            else:
-                level = "Başlangıç"
-            
-            channel_scores.append(ChannelScore(
-                channel=self.channel_names.get(channel, channel.title()),
-                score=score,
-                max_score=max_score,
-                percentage=percentage,
-                level=level
-            ))
+            result["channel_scores"] = [
+                ChannelScore(
+                    channel=self.channel_names.get(channel, channel.title()),
+                    score=score,
+                    max_score=count * 5,
+                    percentage=round(channel_percentage, 2),
+                    level=self.level_names[level]
+                )
+                for channel, score, count, channel_percentage, level in scores.channels(row)
+            ]
+            result["category_scores"] = {
+                self.category_names.get(category, category.title()): round(category_percentage, 2)
+                for category, _, _, category_percentage, _ in scores.categories(row)
+            }
+            results.append(result)
         
-        return channel_scores
+        return results
+    
+    def build_progress(self, progress: Dict) -> Dict[str, Any]:
+        """Live progress view of an assessment from a store's get_progress() result"""
+        totals: ScoreTotals = progress["totals"]
+        answered = progress["answered_questions"]
+        total_questions = progress["total_questions"]
+        return {
+            "package_type": progress["package_type"],
+            "answered_questions": answered,
+            "total_questions": total_questions,
+            "completion_percentage": (
+                round(min(answered / total_questions, 1.0) * 100, 2) if total_questions else 0.0
+            ),
+            "overall_score": self._overall_score_from_totals(totals),
+            "channel_scores": [cs.model_dump() for cs in self.channel_scores_from_totals(totals)],
+            "category_scores": self.category_scores_from_totals(totals),
+            "scores_complete": totals.is_complete
+        }
     
     def _calculate_category_scores(
         self, 
@@ -153,58 +379,33 @@ class ReportService:
     ) -> Dict[str, float]:
         """Calculate scores for each category"""
         question_map = {q["id"]: q for q in questions}
-        category_scores = {}
-        category_counts = {}
-        
-        for resp in responses:
-            question = question_map.get(resp["question_id"])
-            if not question:
-                continue
-            
-            # Frontend uses 'categoryId' not 'category'
-            category = question.get("categoryId", question.get("category", "general"))
-            if category not in category_scores:
-                category_scores[category] = 0
-                category_counts[category] = 0
-            
-            category_scores[category] += resp["answer"]
-            category_counts[category] += 1
-        
-        # Calculate percentages
-        result = {}
-        for category, score in category_scores.items():
-            max_score = category_counts[category] * 5
-            percentage = round((score / max_score) * 100, 2) if max_score > 0 else 0
-            category_name = self.category_names.get(category, category.title())
-            result[category_name] = percentage
-        
-        return result
+        return self.category_scores_from_totals(
+            self._score_responses(responses, question_map)["totals"]
+        )
+    
+    def _question_text(self, question: Dict, language: str) -> str:
+        """Question text in the requested language (falls back to Turkish)"""
+        # Frontend uses 'text' not 'question'
+        question_text_dict = question.get("text", question.get("question", {}))
+        return question_text_dict.get(language, question_text_dict.get("tr", ""))
     
     def _generate_question_analyses(
         self, 
-        responses: List[Dict], 
-        question_map: Dict[str, Dict],
+        resolved: List[tuple],
         language: str
     ) -> List[QuestionAnalysis]:
-        """Generate AI analysis for each question - optimized but includes all questions"""
+        """Generate AI analysis for each resolved (response, question) pair"""
         analyses = []
         
-        # Process ALL questions but use faster method
-        for resp in responses:
-            question = question_map.get(resp["question_id"])
-            if not question:
-                continue
-            
-            # Frontend uses 'text' not 'question'
-            question_text_dict = question.get("text", question.get("question", {}))
-            question_text = question_text_dict.get(language, question_text_dict.get("tr", ""))
+        for resp, question in resolved:
+            question_text = self._question_text(question, language)
             user_answer = resp["answer"]
-            # Frontend uses 'categoryId' not 'category'
-            category = question.get("categoryId", question.get("category", "general"))
+            category = question_category(question)
             
             # Generate AI comment with fallback
             try:
                 ai_comment = self._generate_ai_comment(
+                    resp["question_id"],
                     question_text, 
                     user_answer, 
                     category,
@@ -226,17 +427,40 @@ class ReportService:
     
     def _generate_ai_comment(
         self, 
+        question_id: str,
         question: str, 
         answer: int,
         category: str,
         language: str
     ) -> str:
-        """Generate AI comment - fast fallback for reliability"""
-        
-        # Use fallback for speed and reliability
-        # AI comments can be added later as optional premium feature
+        """Precomputed AI comment, or the generic one if none matches this question text"""
+        # No LLM call here: live per-answer comments would be far too slow
+        if self.comments is not None:
+            comment = self.comments.get(question_id, question, category, answer, language)
+            if comment:
+                return comment
         return self._get_fallback_comment(answer, language)
     
+    async def generate_question_comment(
+        self,
+        question: str,
+        answer: int,
+        category: str,
+        language: str
+    ) -> str:
+        """Ask the LLM for one answer's comment (used by the comment_catalog batch job)"""
+        response = await self.llm.chat(
+            model=COMMENT_MODEL,
+            messages=[
+                {"role": "system", "content": self._get_system_prompt(language)},
+                {"role": "user", "content": self._create_comment_prompt(question, answer, category, language)}
+            ],
+            temperature=0.7,
+            max_tokens=200,
+            timeout=30
+        )
+        return response.choices[0].message.content.strip()
+    
     def _create_comment_prompt(self, question: str, answer: int, category: str, language: str) -> str:
         """Create prompt for AI comment generation"""
         if language == "tr":
@@ -296,44 +520,65 @@ Your comments should be brief, constructive, and motivating."""
         
         return comments.get(answer, comments[3])
     
-    def _generate_strategic_insights(
+    def _insights_cache_key(self, context: str, language: str) -> str:
+        """Content address of an insights completion"""
+        return cache_key(INSIGHTS_PROMPT_VERSION, INSIGHTS_MODEL, language, normalize_context(context))
+    
+    async def _cached_insights(self, key: str) -> Optional[Dict[str, Any]]:
+        return await self.insights_cache.get_async(key) if self.insights_cache else None
+    
+    async def _remember_insights(self, key: str, insights: Dict[str, Any]):
+        """Cache parsed insights (not a completion we couldn't parse into any section)"""
+        if self.insights_cache and (
+            insights["strengths"] or insights["weaknesses"] or insights["recommendations"]
+        ):
+            await self.insights_cache.put_async(key, insights)
+    
+    def _insights_request(self, context: str, language: str) -> Dict[str, Any]:
+        """Chat completion arguments for the insights prompt"""
+        return {
+            "model": INSIGHTS_MODEL,  # Use mini for faster response
+            "messages": [
+                {"role": "system", "content": self._get_insights_system_prompt(language)},
+                {"role": "user", "content": self._create_insights_prompt(context, language)}
+            ],
+            "temperature": 0.5,  # Lower temperature for faster, focused response
+            "max_tokens": 800,  # Reduced tokens for faster generation
+            "timeout": 15  # 15 second timeout
+        }
+    
+    async def _generate_strategic_insights(
         self,
-        responses: List[Dict],
-        question_map: Dict[str, Dict],
+        low_scores: List[tuple],
         channel_scores: List[ChannelScore],
         category_scores: Dict[str, float],
         language: str
     ) -> Dict[str, Any]:
         """Generate strategic insights using AI"""
         
-        if not self.client:
+        if not self.llm.configured:
             return self._get_fallback_insights(channel_scores, category_scores, language)
         
         try:
             # Prepare comprehensive context
             context = self._prepare_insights_context(
-                responses, 
-                question_map, 
+                low_scores,
                 channel_scores, 
                 category_scores
             )
             
-            prompt = self._create_insights_prompt(context, language)
+            key = self._insights_cache_key(context, language)
+            cached = await self._cached_insights(key)
+            if cached is not None:
+                return cached
             
             # Call OpenAI API with timeout and optimized settings
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",  # Use mini for faster response
-                messages=[
-                    {"role": "system", "content": self._get_insights_system_prompt(language)},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.5,  # Lower temperature for faster, focused response
-                max_tokens=800,  # Reduced tokens for faster generation
-                timeout=15  # 15 second timeout
-            )
+            # Slow completions may be hedged (LLM_HEDGE_ENABLED, see llm_gateway)
+            response = await self.llm.chat(hedge="insights", **self._insights_request(context, language))
             
             insights_text = response.choices[0].message.content.strip()
             insights = self._parse_insights_response(insights_text)
+            await self._remember_insights(key, insights)
             
             return insights
             
@@ -341,10 +586,70 @@ Your comments should be brief, constructive, and motivating."""
             print(f"Error generating strategic insights: {e}")
             return self._get_fallback_insights(channel_scores, category_scores, language)
     
+    async def instant_strategic_insights(
+        self,
+        low_scores: List[tuple],
+        channel_scores: List[ChannelScore],
+        category_scores: Dict[str, float],
+        language: str
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Insights available without waiting for the LLM
+        
+        Returns (cached AI insights, False) or, on a cache miss, (fallback
+        insights, True) meaning the AI insights are still to be generated.
+        """
+        if self.llm.configured:
+            context = self._prepare_insights_context(low_scores, channel_scores, category_scores)
+            cached = await self._cached_insights(self._insights_cache_key(context, language))
+            if cached is not None:
+                return cached, False
+        return self._get_fallback_insights(channel_scores, category_scores, language), self.llm.configured
+    
+    async def stream_strategic_insights(
+        self,
+        low_scores: List[tuple],
+        channel_scores: List[ChannelScore],
+        category_scores: Dict[str, float],
+        language: str
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of _generate_strategic_insights
+        
+        Yields ("delta", text) as completion tokens arrive, then one
+        ("insights", parsed_dict). Cache hits and fallbacks yield only the
+        final item.
+        """
+        if not self.llm.configured:
+            yield "insights", self._get_fallback_insights(channel_scores, category_scores, language)
+            return
+        
+        try:
+            context = self._prepare_insights_context(low_scores, channel_scores, category_scores)
+            key = self._insights_cache_key(context, language)
+            insights = await self._cached_insights(key)
+            
+            if insights is None:
+                text_parts = []
+                async for chunk in self.llm.stream_chat(**self._insights_request(context, language)):
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        text_parts.append(delta)
+                        yield "delta", delta
+                
+                insights = self._parse_insights_response("".join(text_parts).strip())
+                await self._remember_insights(key, insights)
+        except Exception as e:
+            print(f"Error streaming strategic insights: {e}")
+            insights = self._get_fallback_insights(channel_scores, category_scores, language)
+        
+        yield "insights", insights
+    
     def _prepare_insights_context(
         self,
-        responses: List[Dict],
-        question_map: Dict[str, Dict],
+        low_scores: List[tuple],
         channel_scores: List[ChannelScore],
         category_scores: Dict[str, float]
     ) -> str:
@@ -363,11 +668,8 @@ Your comments should be brief, constructive, and motivating."""
         
         # Low scoring questions
         context_parts.append("\nDüşük Puanlı Sorular:")
-        for resp in responses:
-            if resp["answer"] <= 2:
-                q = question_map.get(resp["question_id"])
-                if q:
-                    context_parts.append(f"- {q['question'].get('tr', '')}: {resp['answer']}/5")
+        for question, answer in low_scores:
+            context_parts.append(f"- {self._question_text(question, 'tr')}: {answer}/5")
         
         return "\n".join(context_parts)
     
@@ -493,30 +795,32 @@ Your suggestions should be specific, actionable, and prioritized."""
     ) -> Dict[str, Any]:
         """Fallback insights when AI is not available"""
         
-        # Find strongest and weakest
+        # Find strongest and weakest; either list is empty when no category was scored
+        # (e.g. the question catalog could not be loaded), leaving the generic lines
         sorted_categories = sorted(category_scores.items(), key=lambda x: x[1], reverse=True)
+        strongest, weakest = sorted_categories[:1], sorted_categories[-1:]
         
         if language == "tr":
-            return {
+            insights = {
                 "strengths": [
-                    f"{sorted_categories[0][0]} alanında güçlü performans ({sorted_categories[0][1]}%)",
+                    *(f"{name} alanında güçlü performans ({score}%)" for name, score in strongest),
                     "Genel olarak dijital dönüşüme açık bir yapı",
                     "İyileştirmeye istekli bir organizasyon"
                 ],
                 "weaknesses": [
-                    f"{sorted_categories[-1][0]} alanında gelişim gerekiyor ({sorted_categories[-1][1]}%)",
+                    *(f"{name} alanında gelişim gerekiyor ({score}%)" for name, score in weakest),
                     "Bazı alanlarda sistematik yaklaşım eksikliği",
                     "Dijital araçların etkin kullanımında boşluklar"
                 ],
                 "recommendations": [
-                    f"{sorted_categories[-1][0]} alanına öncelik verin",
+                    *(f"{name} alanına öncelik verin" for name, _ in weakest),
                     "Ekip eğitimlerine yatırım yapın",
                     "Dijital araçları sistematik kullanmaya başlayın",
                     "Veri odaklı karar alma süreçleri oluşturun"
                 ],
                 "action_plan": {
                     "Kısa Vadeli (0-3 ay)": [
-                        f"{sorted_categories[-1][0]} için hızlı kazanımlar sağlayın",
+                        *(f"{name} için hızlı kazanımlar sağlayın" for name, _ in weakest),
                         "Mevcut araçların kullanımını optimize edin"
                     ],
                     "Orta Vadeli (3-6 ay)": [
@@ -530,26 +834,26 @@ Your suggestions should be specific, actionable, and prioritized."""
                 }
             }
         else:
-            return {
+            insights = {
                 "strengths": [
-                    f"Strong performance in {sorted_categories[0][0]} ({sorted_categories[0][1]}%)",
+                    *(f"Strong performance in {name} ({score}%)" for name, score in strongest),
                     "Generally open to digital transformation",
                     "Organization willing to improve"
                 ],
                 "weaknesses": [
-                    f"Need development in {sorted_categories[-1][0]} ({sorted_categories[-1][1]}%)",
+                    *(f"Need development in {name} ({score}%)" for name, score in weakest),
                     "Lack of systematic approach in some areas",
                     "Gaps in effective use of digital tools"
                 ],
                 "recommendations": [
-                    f"Prioritize {sorted_categories[-1][0]}",
+                    *(f"Prioritize {name}" for name, _ in weakest),
                     "Invest in team training",
                     "Start systematic use of digital tools",
                     "Create data-driven decision processes"
                 ],
                 "action_plan": {
                     "Kısa Vadeli (0-3 ay)": [
-                        f"Achieve quick wins in {sorted_categories[-1][0]}",
+                        *(f"Achieve quick wins in {name}" for name, _ in weakest),
                         "Optimize use of existing tools"
                     ],
                     "Orta Vadeli (3-6 ay)": [
@@ -562,6 +866,10 @@ Your suggestions should be specific, actionable, and prioritized."""
                     ]
                 }
             }
+        
+        # Marks the report as not carrying AI insights (it is not stored for reuse)
+        insights["fallback"] = True
+        return insights
 
 # Global instance
 report_service = ReportService()
@@ -0,0 +1,228 @@
+"""
+Write-ahead log and snapshot persistence for the in-memory response store
+
+Every mutation is appended to `responses.wal` as one JSON line tagged with a
+log sequence number (LSN) before it is applied in memory. From time to time
+the whole store is written to `responses.snapshot` (a compacted image that
+records the last LSN it contains) and the log is truncated.
+
+Recovery loads the snapshot and replays only the log records newer than it,
+so restart time depends on the log tail rather than on the full history.
+
+write_snapshot_async() only rotates the log (`responses.wal` becomes
+`responses.wal.old`) in the caller. A background thread then builds the new
+image from the previous snapshot plus the old segment (the live store is
+never copied), pickles and fsyncs it, and removes the old segment once the
+snapshot is in place. Recovery reads both segments, so a crash at any point
+loses nothing.
+"""
+import json
+import os
+import pickle
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+SNAPSHOT_FILE = "responses.snapshot"
+WAL_FILE = "responses.wal"
+# Log segment covered by the snapshot being written
+OLD_WAL_FILE = "responses.wal.old"
+
+
+class ResponseLog:
+    """Append-only JSON-lines log with periodic compacted snapshots"""
+
+    def __init__(self, directory: str, snapshot_every: int = 10000, fsync: bool = False):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.wal_path = os.path.join(directory, WAL_FILE)
+        self.old_wal_path = os.path.join(directory, OLD_WAL_FILE)
+
+        self.lsn = 0
+        self.tail_records = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self.snapshot_failures = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _load_snapshot(self) -> Tuple[Optional[Any], int]:
+        """Return (snapshot_state, snapshot_lsn); (None, 0) when there is no snapshot yet"""
+        if not os.path.exists(self.snapshot_path):
+            return None, 0
+        with open(self.snapshot_path, "rb") as f:
+            snapshot = pickle.load(f)
+        return snapshot["state"], snapshot["lsn"]
+
+    @staticmethod
+    def _read_segment(path: str) -> Iterator[Optional[Dict]]:
+        """Yield the segment's records; a final None marks a torn last line"""
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write at the end of the segment (crash mid-append)
+                    yield None
+                    return
+
+    def recover(self) -> Tuple[Optional[Any], Iterator[Dict]]:
+        """Return (snapshot_state, records_after_snapshot) and open the log for appends"""
+        state, snapshot_lsn = self._load_snapshot()
+
+        records = []
+        torn = False
+        # A leftover old segment means a background snapshot did not finish
+        rotated = os.path.exists(self.old_wal_path)
+        for path in (self.old_wal_path, self.wal_path):
+            if not os.path.exists(path):
+                continue
+            for record in self._read_segment(path):
+                if record is None:
+                    torn = True
+                elif record["lsn"] > snapshot_lsn:
+                    records.append(record)
+        self.lsn = records[-1]["lsn"] if records else snapshot_lsn
+        self.tail_records = len(records)
+
+        if torn or rotated:
+            # Drop torn lines and merge the segments so appends start on a clean log
+            self._rewrite_log(records)
+            if rotated:
+                os.remove(self.old_wal_path)
+        else:
+            self._file = open(self.wal_path, "a", encoding="utf-8")
+        return state, iter(records)
+
+    def _rewrite_log(self, records) -> None:
+        """Replace the log file with the given records and reopen it for appends"""
+        if self._file:
+            self._file.close()
+        tmp_path = self.wal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.wal_path)
+        self._file = open(self.wal_path, "a", encoding="utf-8")
+
+    def append(self, record: Dict) -> None:
+        """Buffer a record in the log; call flush() to make it durable"""
+        with self._lock:
+            self.lsn += 1
+            record["lsn"] = self.lsn
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.tail_records += 1
+
+    def flush(self) -> None:
+        """Push buffered records to the OS (and to disk when fsync is enabled)"""
+        with self._lock:
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def should_snapshot(self, stored_records: int) -> bool:
+        """Snapshot once the tail outgrows both the threshold and the live data"""
+        return self.tail_records >= max(self.snapshot_every, stored_records)
+
+    @property
+    def snapshot_in_progress(self) -> bool:
+        thread = self._snapshot_thread
+        return thread is not None and thread.is_alive()
+
+    def _rotate(self) -> int:
+        """Move the current log to the old segment and start a new one; returns its last LSN"""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self.wal_path, self.old_wal_path)
+            self._file = open(self.wal_path, "a", encoding="utf-8")
+            self.tail_records = 0
+            return self.lsn
+
+    def _write_snapshot_file(self, lsn: int, state: Any) -> None:
+        """Atomically write the image of everything up to lsn and drop the old segment"""
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"lsn": lsn, "state": state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # Records up to lsn are in the snapshot; recovery skips them even if
+        # we crash before the old segment is removed.
+        os.remove(self.old_wal_path)
+
+    def _snapshot_worker(self, lsn: int, build_state: Callable) -> None:
+        try:
+            # Previous image + the rotated segment = the store as of lsn
+            state, snapshot_lsn = self._load_snapshot()
+            # Streamed, so the segment is never held in memory at once
+            records = (
+                record for record in self._read_segment(self.old_wal_path)
+                if record is not None and record["lsn"] > snapshot_lsn
+            )
+            self._write_snapshot_file(lsn, build_state(state, records))
+        except Exception as e:
+            # The old segment stays; recovery (or the next snapshot) still has its records
+            self.snapshot_failures += 1
+            print(f"[WAL] Background snapshot failed: {e}")
+
+    def _merge_old_segment(self) -> None:
+        """Fold an old segment left by a failed snapshot back into the log"""
+        with self._lock:
+            self._file.flush()
+            self._file.close()
+            with open(self.old_wal_path, "a", encoding="utf-8") as old, \
+                    open(self.wal_path, "r", encoding="utf-8") as current:
+                for line in current:
+                    old.write(line)
+                old.flush()
+                os.fsync(old.fileno())
+            os.replace(self.old_wal_path, self.wal_path)
+            self._file = open(self.wal_path, "a", encoding="utf-8")
+
+    def wait_for_snapshot(self) -> None:
+        """Block until a background snapshot (if any) has finished"""
+        thread = self._snapshot_thread
+        if thread is not None:
+            thread.join()
+            self._snapshot_thread = None
+        if os.path.exists(self.old_wal_path):
+            self._merge_old_segment()
+
+    def write_snapshot_async(self, build_state: Callable[[Optional[Any], Iterator[Dict]], Any]) -> bool:
+        """
+        Rotate the log and write the snapshot on a background thread
+
+        The thread calls `build_state(snapshot_state, records)` with the
+        previous snapshot image (None if there is none) and the records of
+        the rotated segment; it must return the new image without touching
+        the live store. Returns False if a snapshot is still being written.
+        """
+        if self.snapshot_in_progress:
+            return False
+        self.wait_for_snapshot()
+        lsn = self._rotate()
+        self._snapshot_thread = threading.Thread(
+            target=self._snapshot_worker, args=(lsn, build_state), name="wal-snapshot", daemon=True
+        )
+        self._snapshot_thread.start()
+        return True
+
+    def write_snapshot(self, state: Any) -> None:
+        """Atomically write a compacted snapshot and truncate the log (blocking)"""
+        self.wait_for_snapshot()
+        lsn = self._rotate()
+        self._write_snapshot_file(lsn, state)
+
+    def close(self) -> None:
+        """Wait for a background snapshot, then flush and close the log"""
+        self.wait_for_snapshot()
+        if self._file:
+            self.flush()
+            self._file.close()
+            self._file = None
@@ -0,0 +1,115 @@
+"""
+Running score totals for an assessment
+
+ScoreTotals keeps answer sums and counts overall, per category and per
+channel. Stores update it as answers are saved or overwritten (the old
+answer is subtracted first), so progress and report scores can be read in
+O(categories + channels) instead of rescanning every response.
+
+The category / channel split depends on the questions, so totals carry the
+question catalog version they were built with; stores rebuild them from the
+answers when an admin change has moved the catalog on.
+"""
+from typing import Dict, List, Optional
+
+
+def question_category(question: Dict) -> str:
+    """Category id of a question (frontend uses 'categoryId', the DB 'category')"""
+    return question.get("categoryId", question.get("category", "general"))
+
+
+def question_channels(question: Dict) -> List[str]:
+    """Channels a question belongs to"""
+    return question.get("channels", ["general"])
+
+
+class ScoreTotals:
+    """Answer sums and counts, overall and per category / channel"""
+    __slots__ = ("answer_sum", "answer_count", "resolved_count", "categories", "channels", "catalog_version")
+
+    def __init__(self):
+        # Every answer counts towards the overall score...
+        self.answer_sum = 0
+        self.answer_count = 0
+        # ...but only answers whose question is known feed categories/channels
+        self.resolved_count = 0
+        # {category_id: [sum, count]} / {channel: [sum, count]}, first-seen order
+        self.categories: Dict[str, List[int]] = {}
+        self.channels: Dict[str, List[int]] = {}
+        # question_catalog.version() the category / channel mapping came from
+        self.catalog_version: Optional[str] = None
+
+    def _add(self, question: Optional[Dict], answer: int, sign: int):
+        self.answer_sum += sign * answer
+        self.answer_count += sign
+        if question is None:
+            return
+
+        self.resolved_count += sign
+        category = self.categories.setdefault(question_category(question), [0, 0])
+        category[0] += sign * answer
+        category[1] += sign
+        for channel_id in question_channels(question):
+            channel = self.channels.setdefault(channel_id, [0, 0])
+            channel[0] += sign * answer
+            channel[1] += sign
+
+    def add(self, question: Optional[Dict], answer: int):
+        """Count a new answer"""
+        self._add(question, answer, 1)
+
+    def replace(self, question: Optional[Dict], old_answer: Optional[int], new_answer: int):
+        """Apply an answer that may overwrite an earlier one"""
+        if old_answer is not None:
+            self._add(question, old_answer, -1)
+        self._add(question, new_answer, 1)
+
+    @property
+    def is_complete(self) -> bool:
+        """True when every answer was resolved to a question"""
+        return self.resolved_count == self.answer_count
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable form (stored in Assessment.score_totals)"""
+        return {
+            "answer_sum": self.answer_sum,
+            "answer_count": self.answer_count,
+            "resolved_count": self.resolved_count,
+            "categories": self.categories,
+            "channels": self.channels,
+            "catalog_version": self.catalog_version
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> "ScoreTotals":
+        """Inverse of to_dict; an empty/missing value gives empty totals"""
+        totals = cls()
+        if data:
+            totals.answer_sum = data["answer_sum"]
+            totals.answer_count = data["answer_count"]
+            totals.resolved_count = data["resolved_count"]
+            totals.categories = {k: list(v) for k, v in data["categories"].items()}
+            totals.channels = {k: list(v) for k, v in data["channels"].items()}
+            # Rows written before totals were versioned get None and are rebuilt
+            totals.catalog_version = data.get("catalog_version")
+        return totals
+
+
+def build_totals(answers, question_map: Dict[str, Dict], catalog_version: Optional[str]) -> ScoreTotals:
+    """Totals of (question_id, answer) pairs against one catalog load"""
+    totals = ScoreTotals()
+    for question_id, answer in answers:
+        totals.add(question_map.get(question_id), answer)
+    totals.catalog_version = catalog_version
+    return totals
+
+
+def is_current(totals: ScoreTotals, catalog_version: Optional[str]) -> bool:
+    """True if totals were built with this catalog version (snapshots from before versions have none)"""
+    return getattr(totals, "catalog_version", None) == catalog_version
+
+
+def percentage(score: float, count: int) -> float:
+    """Score as a percentage of count * 5, rounded like the report service"""
+    max_score = count * 5
+    return round((score / max_score) * 100, 2) if max_score > 0 else 0